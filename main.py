@@ -1,16 +1,35 @@
+import time
+_IMPORT_START = time.perf_counter()
+import atexit
 import cv2
 import argparse
 import sys
 import numpy as np
-from src.court_detection import CourtDetector
-from src.calibration import CalibrationManager
+from src import startup
+from src.calibration import Calibration
+from src.distortion import calibrate_lens
 from src.radar import RadarView
-from src.tracker import PlayerTracker
+from src.pipeline import VolleyPipeline, PipelineSettings
+from src.track_log import load_track_log, save_track_log, get_track_log_path
+from src.stitching import stitch_tracks, save_relabel, load_relabel, apply_relabel
+from src.smoothing import smooth_track_log
+from src.actions import save_events
+from src.rally import scan_video, save_segments, load_segments
+from src.tracker import TrackerLoader
+from src.replay import render_replay
+from src.clips import query_clips, parse_query, pad_clips, extract_clips
+from src.multicam import CameraSource, MultiCameraFusion
+from src.detectors import write_synthetic_video, get_truth_path
+from src.publisher import PositionPublisher
+
+# Only light modules are imported at startup (torch/ultralytics load with the tracker)
+startup.record("main (cv2, numpy, src)", time.perf_counter() - _IMPORT_START)
 
 # Global context holder for trackbar to ensure scope for callback
 trackbar_context = {
-    'cap': None,
-    'total_frames': 0
+    'pipeline': None,
+    'total_frames': 0,
+    'position': 0 # Last position set by the playback loop (not a user seek)
 }
 
 def on_trackbar_change(frame_pos):
@@ -18,8 +37,10 @@ def on_trackbar_change(frame_pos):
     Callback function for the seek trackbar.
     Sets the video position to the frame indicated by the trackbar.
     """
-    if trackbar_context['cap'] is not None:
-        trackbar_context['cap'].set(cv2.CAP_PROP_POS_FRAMES, frame_pos)
+    if frame_pos == trackbar_context['position']:
+        return # Programmatic update from the playback loop
+    if trackbar_context['pipeline'] is not None:
+        trackbar_context['pipeline'].seek(frame_pos)
 
 def radar_mouse_callback(event, x, y, flags, param):
     """
@@ -347,246 +368,474 @@ def select_court_structure(frame, radar_view=None):
         
     return all_points
 
-def main():
-    parser = argparse.ArgumentParser(description="Volley_CV: Court Detection")
-    parser.add_argument("--input", type=str, help="Path to input video or image")
-    args = parser.parse_args()
+def load_radar_from_calibration(input_path):
+    """
+    Builds a calibrated RadarView from the saved calibration, without any UI.
+    Used by the offline tools. Returns None if no calibration exists.
+    """
+    calibration = Calibration.load(input_path)
+    if calibration is None:
+        return None
 
-    if not args.input:
-        print("Error: Please provide an input file using --input")
+    radar_view = RadarView()
+    radar_view.set_orientation(calibration.orientation)
+    radar_view.set_active_zone(calibration.zone)
+    radar_view.lens = calibration.lens
+    radar_view.update_homography(calibration.points)
+    return radar_view
+
+def calibrate_interactively(input_path, frame, radar_view):
+    """
+    Loads the saved calibration or asks for a new one (court points, orientation, zone)
+    and saves the result. Returns a Calibration, or None if the selection was cancelled.
+    """
+    manual_points = None
+    saved = Calibration.load(input_path)
+
+    # 1. Try to load existing calibration
+    if saved is not None:
+        print("Found existing calibration data.")
+        if ask_user_choice_cv("Use saved calibration?", window_name="Load Calibration"):
+            manual_points = saved.points
+        else:
+            print("Starting manual calibration...")
+            saved = None
+
+    # 2. If no points loaded or rejected, run manual selection
+    if manual_points is None:
+        if frame is not None:
+            manual_points = select_court_structure(frame, radar_view)
+        if not manual_points:
+            print("Manual selection cancelled or skipped.")
+            return None
+
+    # 3. Configure Orientation and Zone
+    if saved is not None and ask_user_choice_cv("Use saved settings (Orientation/Zone)?", window_name="Load Settings"):
+        calibration = saved
+    else:
+        orientation = ask_video_orientation()
+        # Ask user for tracking zone preference
+        selected_zone = ask_court_side_selection()
+        calibration = Calibration(manual_points, orientation, selected_zone)
+
+        # Radial distortion from the straightness and spacing of all clicked lines
+        if frame is not None:
+            calibration.lens = calibrate_lens(manual_points, orientation, (frame.shape[1], frame.shape[0]))
+
+    # Save/Update Calibration with settings
+    calibration.save(input_path)
+    return calibration
+
+def run_stitching(input_path):
+    """
+    Offline pass: repairs fragmented track ids in the saved track log and saves the relabelling map.
+    """
+    log = load_track_log(get_track_log_path(input_path))
+    if log is None or len(log) == 0:
+        print(f"Error: No track log found for {input_path}. Run with --save-tracks first.")
         sys.exit(1)
 
-    detector = CourtDetector()
-    radar_view = RadarView()
-    tracker = PlayerTracker()
+    cap = cv2.VideoCapture(input_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+    cap.release()
 
-    # Check if input is image or video
-    is_video = args.input.lower().endswith(('.mp4', '.avi', '.mov', '.mkv'))
+    radar_view = load_radar_from_calibration(input_path)
+    relabel = stitch_tracks(log, fps, radar_view)
 
-    if is_video:
-        cap = cv2.VideoCapture(args.input)
-        if not cap.isOpened():
-            print(f"Error: Could not open video {args.input}")
+    merged = len(relabel) - len(set(relabel.values()))
+    print(f"Stitching: {len(relabel)} track ids, {merged} joined.")
+    save_relabel(input_path, relabel)
+
+def run_offline_smoothing(input_path):
+    """
+    Offline pass: RTS-smooths the full trajectories of the saved track log
+    (stitched ids if a relabelling map exists) and saves <input>.tracks.smooth.csv.
+    """
+    log = load_track_log(get_track_log_path(input_path))
+    if log is None or len(log) == 0:
+        print(f"Error: No track log found for {input_path}. Run with --save-tracks first.")
+        sys.exit(1)
+
+    relabel = load_relabel(input_path)
+    if relabel:
+        log = apply_relabel(log, relabel)
+
+    cap = cv2.VideoCapture(input_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+    cap.release()
+
+    smoothed = smooth_track_log(log, fps)
+    save_track_log(input_path + ".tracks.smooth.csv", smoothed)
+
+def load_positions_log(input_path):
+    """
+    Stored court positions of a video: the smoothed log if present, else the raw
+    log (stitched ids). Exits if there is no track log.
+    """
+    smooth_path = input_path + ".tracks.smooth.csv"
+    log = load_track_log(smooth_path)
+    if log is None:
+        log = load_track_log(get_track_log_path(input_path))
+        if log is None or len(log) == 0:
+            print(f"Error: No track log found for {input_path}. Run with --save-tracks first.")
             sys.exit(1)
+        relabel = load_relabel(input_path)
+        if relabel:
+            log = apply_relabel(log, relabel)
+    else:
+        print(f"Using smoothed tracks from {smooth_path}")
+    return log
 
-        # Manual Calibration Step
-        manual_points = None
-        loaded_settings = None
-        
-        # 1. Try to load existing calibration
-        saved_points, saved_settings = CalibrationManager.load_calibration(args.input)
-        
-        if saved_points:
-            print("Found existing calibration data.")
-            use_saved = ask_user_choice_cv("Use saved calibration?", window_name="Load Calibration")
-            if use_saved:
-                manual_points = saved_points
-                loaded_settings = saved_settings
-            else:
-                print("Starting manual calibration...")
-
-        # 2. If no points loaded or rejected, run manual selection
-        if manual_points is None:
-            ret, first_frame = cap.read()
-            if ret:
-                manual_points = select_court_structure(first_frame, radar_view)
-                
-                if manual_points:
-                    # We don't save here immediately anymore, wait until settings are defined
-                    pass
-                else:
-                    print("Manual selection cancelled or skipped.")
-                
-                # Rewind video to start
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        
-        # 3. Set points to detector and Configure Settings
-        if manual_points:
-            detector.set_manual_points(manual_points)
-            
-            # Calculate homography immediately
-            radar_view.update_homography(manual_points)
+def run_replay(args):
+    """
+    Offline pass: re-renders the radar from stored court positions with the requested
+    display settings. Uses the smoothed log if present, else the raw log (stitched ids).
+    """
+    log = load_positions_log(args.input)
 
-            # Configure Orientation and Zone
-            orientation = 'vertical'
-            selected_zone = 'all'
-            
-            settings_applied = False
-            if loaded_settings:
-                 use_settings = ask_user_choice_cv("Use saved settings (Orientation/Zone)?", window_name="Load Settings")
-                 if use_settings:
-                     orientation = loaded_settings.get("orientation", "vertical")
-                     selected_zone = loaded_settings.get("zone", "all")
-                     radar_view.set_orientation(orientation)
-                     radar_view.set_active_zone(selected_zone)
-                     settings_applied = True
-            
-            if not settings_applied:
-                # Ask orientation
-                orientation = ask_video_orientation()
-                radar_view.set_orientation(orientation)
-                
-                # Ask user for tracking zone preference
-                selected_zone = ask_court_side_selection()
-                radar_view.set_active_zone(selected_zone)
-            
-            # Save/Update Calibration with settings
-            current_settings = {
-                "orientation": radar_view.orientation,
-                "zone": radar_view.active_zone
-            }
-            CalibrationManager.save_calibration(args.input, manual_points, current_settings)
-            
-            # Set the ROI filter for the tracker
-            tracker.set_roi_filter(radar_view.is_in_bounds)
+    cap = cv2.VideoCapture(args.input)
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0
+    cap.release()
 
-        cv2.destroyAllWindows() # Ensure clean state
-        window_name = "Volley_CV - Court Detection"
-        radar_window = "Volley_CV - Radar View"
+    render_replay(log, fps, args.replay, workers=args.replay_workers, pixels_per_meter=args.radar_scale,
+                  invert_sides=args.invert_sides, mirror_lr=args.mirror_lr)
 
-        # Get video properties for trackbar
-        trackbar_context['cap'] = cap # Assign cap to global context
-        trackbar_context['total_frames'] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
+def run_clips(args):
+    """
+    Offline pass: cuts the clips selected by --clip-query (rallies, action events or
+    time spent in a zone) into the --clips directory, optionally with overlays.
+    """
+    cap = cv2.VideoCapture(args.input)
+    if not cap.isOpened():
+        print(f"Error: Could not open video {args.input}")
+        sys.exit(1)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    try:
+        clips = query_clips(args.input, fps, parse_query(args.clip_query))
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    clips = pad_clips(clips, fps, args.clip_pad, num_frames)
 
-        cv2.namedWindow(window_name)
-        cv2.namedWindow(radar_window)
-        cv2.setMouseCallback(radar_window, radar_mouse_callback, radar_view)
+    log = load_positions_log(args.input) if args.clip_overlay else None
+    extract_clips(args.input, clips, args.clips, workers=args.clip_workers, log=log,
+                  pixels_per_meter=args.radar_scale, invert_sides=args.invert_sides, mirror_lr=args.mirror_lr)
 
-        # Aggiungi un imshow "dummy" per assicurarti che la finestra sia renderizzata prima del trackbar
-        cv2.imshow(window_name, np.zeros((10, 10, 3), dtype=np.uint8)) 
-        cv2.waitKey(1) # Rendi la finestra visibile per un istante
-        # Create trackbar, mapping frames to current position
-        cv2.createTrackbar("Seek (frames)", window_name, 0, trackbar_context['total_frames'] - 1, on_trackbar_change)
-        
-        while True:
-            # Update trackbar position to current frame
-            current_frame_pos = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
-            cv2.setTrackbarPos("Seek (frames)", window_name, current_frame_pos)
+def start_publisher(args):
+    """
+    Starts the --serve position publisher (None if not requested).
+    """
+    if args.serve is None:
+        return None
+    publisher = PositionPublisher(port=args.serve, max_rate=args.serve_rate)
+    print(f"Publishing court positions on http://<this host>:{publisher.port}/")
+    return publisher
 
-            ret, frame = cap.read()
-            if not ret:
-                break
+def run_multicam(args):
+    """
+    Merges several calibrated cameras onto one radar (one worker process per camera).
+    """
+    offsets = list(args.camera_offsets or [])
+    offsets += [0.0] * (len(args.cameras) - len(offsets))
+    rotated = set(args.rotated_cameras or [])
+    cameras = [CameraSource(path, offsets[i], i in rotated) for i, path in enumerate(args.cameras)]
+
+    settings = PipelineSettings(
+        detector=args.detector,
+        rally_stride=args.rally_stride,
+        live=args.live,
+        realtime=args.realtime
+    )
+    track_log_path = get_track_log_path(args.cameras[0] + ".fused") if args.save_tracks else None
+    fusion = MultiCameraFusion(cameras, settings, merge_radius=args.merge_radius,
+                               sync="clock" if args.clock_sync else "offset", track_log_path=track_log_path)
+
+    radar_window = "Volley_CV - Radar View"
+    radar_view = RadarView(pixels_per_meter=args.radar_scale)
+    radar_view.invert_sides = args.invert_sides
+    radar_view.mirror_lr = args.mirror_lr
+    cv2.namedWindow(radar_window)
+    cv2.setMouseCallback(radar_window, radar_mouse_callback, radar_view)
+
+    publisher = start_publisher(args)
+    print(f"Starting {len(cameras)} camera workers...")
+    t0 = time.perf_counter()
+    count = 0
+    frames = fusion.run()
+    for fused in frames:
+        count += 1
+        if publisher is not None:
+            publisher.publish(fused.frame_idx, fused.time, fused.tracks)
+        radar_img = radar_view.update_player_positions(radar_view._draw_static_court(), fused.tracks)
+        minutes = int(fused.time // 60)
+        seconds = int(fused.time % 60)
+        cameras_text = " ".join("-" if c is None else str(c) for c in fused.camera_counts)
+        cv2.putText(radar_img, f"{minutes:02d}:{seconds:02d}  cams: {cameras_text}  merged: {fused.merged}",
+                    (10, radar_img.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        cv2.imshow(radar_window, radar_img)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+    frames.close() # Stops the camera workers and flushes the merged track log
+    if publisher is not None:
+        publisher.close()
+    elapsed = time.perf_counter() - t0
+    print(f"Multi-camera: {count} merged frames in {elapsed:.1f} s ({count / max(elapsed, 1e-9):.1f} fps)")
+    cv2.destroyAllWindows()
 
-            # 1. Detect and Draw Court Lines (Base Layer)
-            processed_frame = detector.process_frame(frame)
-            
-            # Draw ordered perimeter points on the main video for debug
-            if detector.manual_points:
-                processed_frame = detector.draw_ordered_perimeter_points(processed_frame, detector.manual_points)
-            
-            # 2. Detect and Track Players
-            tracks = tracker.detect_and_track(frame)
-            processed_frame = tracker.draw_tracks(processed_frame, tracks)
-
-            # Display current time
-            current_seconds = current_frame_pos / fps
-            minutes = int(current_seconds // 60)
-            seconds = int(current_seconds % 60)
-            time_str = f"{minutes:02d}:{seconds:02d}"
-
-            cv2.putText(processed_frame, f"Time: {time_str}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            cv2.putText(processed_frame, "Press 'q' to quit", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            cv2.imshow(window_name, processed_frame)
-            
-            # Radar / Birds-eye View
+def main():
+    parser = argparse.ArgumentParser(description="Volley_CV: Court Detection")
+    parser.add_argument("--input", type=str, help="Path to input video or image")
+    parser.add_argument("--rally-stride", type=int, default=1,
+                        help="Run detection on every frame inside rallies and only every N frames in dead time (1 = disabled)")
+    parser.add_argument("--scan-rallies", action="store_true",
+                        help="Run a cheap motion pre-pass to segment rallies and save them next to the video")
+    parser.add_argument("--save-tracks", action="store_true",
+                        help="Save per-frame tracks (boxes + court metres) to <input>.tracks.csv")
+    parser.add_argument("--stitch", action="store_true",
+                        help="Offline: join fragmented track ids in the saved track log and exit")
+    parser.add_argument("--smooth-lag", type=int, default=None,
+                        help="Smooth radar positions with a fixed-lag Kalman smoother (radar delayed by N frames, 0 = filter only)")
+    parser.add_argument("--smooth-tracks", action="store_true",
+                        help="Offline: smooth the full trajectories in the saved track log and exit")
+    parser.add_argument("--pose-budget", type=int, default=0,
+                        help="Run MediaPipe pose on at most K in-court players per frame (0 = disabled)")
+    parser.add_argument("--actions", action="store_true",
+                        help="Recognize spike/block/set/dig per player and save the events to <input>.actions.json")
+    parser.add_argument("--live", action="store_true",
+                        help="Treat --input as a live source (stream URL, device index or named pipe): always process the newest frame")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Replay a video file at its native frame rate through the live reader (test stand-in for a camera)")
+    parser.add_argument("--adaptive-quality", action="store_true",
+                        help="Lower detection rate, inference size, optional stages and radar rate to keep up with the source fps")
+    parser.add_argument("--target-fps", type=float, default=None,
+                        help="Frame rate held by --adaptive-quality (default: source fps)")
+    parser.add_argument("--replay", type=str, default=None, metavar="OUTPUT",
+                        help="Offline: render the radar from the saved track log (no decode, no inference) to a video (.mp4/.avi) or an image directory, and exit")
+    parser.add_argument("--replay-workers", type=int, default=1,
+                        help="Processes used by --replay (frame range split into chunks)")
+    parser.add_argument("--clips", type=str, default=None, metavar="DIR",
+                        help="Offline: cut the clips selected by --clip-query into DIR (one .mp4 per clip), and exit")
+    parser.add_argument("--clip-query", type=str, default="rallies",
+                        help='Clips to cut: "rallies", "action=spike[,block] [track=ID]" or "zone=ZONE [track=ID] [team=T]" (ZONE: 1-6, near_4, far_front, ...)')
+    parser.add_argument("--clip-pad", type=float, default=1.0,
+                        help="Seconds added before and after every clip (overlapping clips are merged)")
+    parser.add_argument("--clip-overlay", action="store_true",
+                        help="Burn the stored tracks and a radar inset into the clips")
+    parser.add_argument("--clip-workers", type=int, default=2,
+                        help="Processes writing clips in parallel")
+    parser.add_argument("--invert-sides", action="store_true", help="Start the radar with the sides swapped")
+    parser.add_argument("--mirror-lr", action="store_true", help="Start the radar mirrored left-right")
+    parser.add_argument("--radar-scale", type=int, default=40, help="Radar pixels per metre")
+    parser.add_argument("--birdseye", type=int, default=0, metavar="N",
+                        help="Show the real footage warped top-down under the radar, refreshed every N frames (0 = synthetic court)")
+    parser.add_argument("--cameras", type=str, nargs="+", default=None, metavar="INPUT",
+                        help="Merge several calibrated cameras of the same match onto one radar (one worker process per camera)")
+    parser.add_argument("--camera-offsets", type=float, nargs="+", default=None, metavar="SECONDS",
+                        help="Time offset added to each camera of --cameras to align them (default 0)")
+    parser.add_argument("--rotated-cameras", type=int, nargs="+", default=None, metavar="INDEX",
+                        help="Indices of --cameras calibrated from the opposite end of the court (rotated 180 degrees)")
+    parser.add_argument("--clock-sync", action="store_true",
+                        help="Align live --cameras by capture time instead of frame time + offset")
+    parser.add_argument("--merge-radius", type=float, default=1.0,
+                        help="Metres within which players seen by two cameras are merged")
+    parser.add_argument("--shot-detection", action="store_true",
+                        help="Broadcast footage: skip detection and radar updates outside the calibrated main camera (close-ups, replays, graphics)")
+    parser.add_argument("--checkpoint-every", type=int, default=0, metavar="N",
+                        help="Offline: save a checkpoint every N frames to <input>.checkpoint.pkl (0 = disabled)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the last checkpoint of --input (same video, calibration and settings)")
+    parser.add_argument("--proxy", type=int, nargs="?", const=960, default=0, metavar="WIDTH",
+                        help="Offline: decode the video once into <input>.proxy (raw frames downscaled to WIDTH, default 960) and read every later run from it")
+    parser.add_argument("--inference-workers", type=int, default=0, metavar="N",
+                        help="Offline: decode into shared memory and run detection in N worker processes (tracking stays in frame order; no seeking)")
+    parser.add_argument("--detector", choices=["yolo", "synthetic"], default="yolo",
+                        help="Detection backend: YOLOv8 + ByteTrack, or a deterministic synthetic one (no model, no torch; replays <input>.truth.csv if present)")
+    parser.add_argument("--make-synthetic", type=str, default=None, metavar="OUTPUT",
+                        help="Write a synthetic match video with its ground truth and calibration (use with --detector synthetic), and exit")
+    parser.add_argument("--serve", type=int, default=None, metavar="PORT",
+                        help="Publish live court positions over HTTP on PORT (radar page at /, Server-Sent Events at /stream)")
+    parser.add_argument("--serve-rate", type=float, default=10.0,
+                        help="Maximum updates per second sent to each --serve client")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="Print where import time went (startup modules and heavy ML dependencies) on exit")
+    args = parser.parse_args()
 
-            if detector.manual_points:
-                birdseye_frame = radar_view.get_warped_frame(frame, detector.manual_points)
-                if birdseye_frame is not None:
-                    birdseye_frame = radar_view.update_player_positions(birdseye_frame, tracks)
-                    cv2.imshow(radar_window, birdseye_frame)
-            
-            key = cv2.waitKey(1) & 0xFF # Added a small delay to allow trackbar to update
-            if key == ord('q'):
-                break
-            
-            # Handle window close (X button)
-            try:
-                if cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
-                    break
-            except cv2.error:
-                pass 
-        
-        cap.release()
-    else:
+    if args.profile_imports:
+        atexit.register(startup.report)
+
+    if args.make_synthetic:
+        write_synthetic_video(args.make_synthetic, seconds=20.0)
+        print(f"Synthetic match written to {args.make_synthetic} (ground truth: {get_truth_path(args.make_synthetic)})")
+        return
+
+    if args.cameras:
+        run_multicam(args)
+        return
+
+    if not args.input:
+        print("Error: Please provide an input file using --input")
+        sys.exit(1)
+
+    if args.stitch:
+        run_stitching(args.input)
+        return
+
+    if args.smooth_tracks:
+        run_offline_smoothing(args.input)
+        return
+
+    if args.replay:
+        run_replay(args)
+        return
+
+    if args.clips:
+        run_clips(args)
+        return
+
+    # Model load + warmup run in the background while the user calibrates
+    backend_options = {'source': args.input} if args.detector == 'synthetic' else {}
+    loader = TrackerLoader(backend=args.detector, **backend_options)
+
+    settings = PipelineSettings(
+        detector=args.detector,
+        rally_stride=args.rally_stride,
+        track_log_path=get_track_log_path(args.input) if args.save_tracks else None,
+        smooth_lag=args.smooth_lag,
+        pose_budget=args.pose_budget,
+        actions=args.actions,
+        adaptive_quality=args.adaptive_quality,
+        target_fps=args.target_fps,
+        live=args.live,
+        realtime=args.realtime,
+        pixels_per_meter=args.radar_scale,
+        birdseye_every=args.birdseye,
+        shot_detection=args.shot_detection,
+        checkpoint_every=args.checkpoint_every,
+        resume=args.resume,
+        inference_workers=args.inference_workers,
+        proxy_width=args.proxy
+    )
+    pipeline = VolleyPipeline(args.input, settings=settings)
+    pipeline.radar_view.invert_sides = args.invert_sides
+    pipeline.radar_view.mirror_lr = args.mirror_lr
+    window_name = "Volley_CV - Court Detection"
+    radar_window = "Volley_CV - Radar View"
+
+    # Check if input is image, video or live source
+    is_image = not (pipeline.is_live or args.input.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')))
+
+    if is_image:
         # Image processing
         frame = cv2.imread(args.input)
         if frame is None:
             print(f"Error: Could not open image {args.input}")
             sys.exit(1)
-            
-        # Load calibration for image if exists
-        saved_points, saved_settings = CalibrationManager.load_calibration(args.input)
-        manual_points = None
-        loaded_settings = None
-        
-        if saved_points:
-             print("Found existing calibration data.")
-             use_saved = ask_user_choice_cv("Use saved calibration?", window_name="Load Calibration")
-             if use_saved:
-                 manual_points = saved_points
-                 loaded_settings = saved_settings
-        
-        if manual_points is None:
-             manual_points = select_court_structure(frame, radar_view)
+    else:
+        if not pipeline.open():
+            print(f"Error: Could not open video {args.input}")
+            sys.exit(1)
+        frame = pipeline.peek_frame()
+        if pipeline.image_scale != 1.0:
+            # Points are clicked on the original frame (the proxy is downscaled)
+            cap = cv2.VideoCapture(args.input)
+            ret, frame = cap.read()
+            cap.release()
+
+    # Manual Calibration Step
+    calibration = calibrate_interactively(args.input, frame, pipeline.radar_view)
+    if calibration is not None:
+        pipeline.set_calibration(calibration)
+
+    cv2.destroyAllWindows() # Ensure clean state
+
+    if not loader.ready():
+        print("Waiting for the detection model...")
+    try:
+        pipeline.tracker = loader.result()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        pipeline.close()
+        sys.exit(1)
+    print(f"Model ready ({loader.load_time:.1f} s, loaded in the background).")
 
-        if manual_points:
-            detector.set_manual_points(manual_points)
-            
-            # Calculate homography immediately
-            radar_view.update_homography(manual_points)
-            
-            # Configure Orientation and Zone
-            settings_applied = False
-            if loaded_settings:
-                 use_settings = ask_user_choice_cv("Use saved settings (Orientation/Zone)?", window_name="Load Settings")
-                 if use_settings:
-                     orientation = loaded_settings.get("orientation", "vertical")
-                     selected_zone = loaded_settings.get("zone", "all")
-                     radar_view.set_orientation(orientation)
-                     radar_view.set_active_zone(selected_zone)
-                     settings_applied = True
-            
-            if not settings_applied:
-                # Ask orientation first
-                orientation = ask_video_orientation()
-                radar_view.set_orientation(orientation)
-                
-                # Ask user for tracking zone preference
-                selected_zone = ask_court_side_selection()
-                radar_view.set_active_zone(selected_zone)
-            
-            # Save settings
-            current_settings = {
-                "orientation": radar_view.orientation,
-                "zone": radar_view.active_zone
-            }
-            CalibrationManager.save_calibration(args.input, manual_points, current_settings)
-            
-            # Set the ROI filter for the tracker
-            tracker.set_roi_filter(radar_view.is_in_bounds)
+    cv2.namedWindow(window_name)
+    cv2.namedWindow(radar_window)
+    cv2.setMouseCallback(radar_window, radar_mouse_callback, pipeline.radar_view)
 
-        processed_frame = detector.process_frame(frame)
-        
+    if is_image:
         # Run detection on single image too
-        tracks = tracker.detect_and_track(frame)
-        processed_frame = tracker.draw_tracks(processed_frame, tracks)
-
-        cv2.putText(processed_frame, "Press any key to exit", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        cv2.imshow("Volley_CV - Court Detection", processed_frame)
-        
-        cv2.namedWindow("Volley_CV - Radar View")
-        cv2.setMouseCallback("Volley_CV - Radar View", radar_mouse_callback, radar_view)
-
+        pipeline.compositor.set_static_text([("Press any key to exit", (10, 30))])
+        result = pipeline.process_frame(frame, 0)
+        cv2.imshow(window_name, result.view)
         # Also show radar view for image
-        if detector.manual_points:
-            birdseye_frame = radar_view.get_warped_frame(frame, detector.manual_points)
-            if birdseye_frame is not None:
-                birdseye_frame = radar_view.update_player_positions(birdseye_frame, tracks)
-                cv2.imshow("Volley_CV - Radar View", birdseye_frame)
-            
+        if result.radar is not None:
+            cv2.imshow(radar_window, result.radar)
+        pipeline.close()
         cv2.waitKey(0)
+        cv2.destroyAllWindows()
+        return
+
+    # Rally segmentation: expensive stages only inside rallies, low-rate mode elsewhere
+    if args.scan_rallies:
+        print("Scanning video for rallies...")
+        segments = scan_video(args.input, pipeline.radar_view if pipeline.radar_view.M is not None else None)
+        save_segments(args.input, segments, pipeline.fps)
+    if args.rally_stride > 1:
+        # Pre-pass segments if available, otherwise decided live from frame differencing and track motion
+        settings.rally_segments = load_segments(args.input)
+
+    # Static overlays are rendered once; only tracks and time are drawn per frame
+    pipeline.compositor.set_static_text([("Press 'q' to quit", (10, 30))])
+
+    if not pipeline.is_live and settings.inference_workers == 0:
+        # Get video properties for trackbar
+        trackbar_context['pipeline'] = pipeline
+        trackbar_context['total_frames'] = pipeline.total_frames
+        # Aggiungi un imshow "dummy" per assicurarti che la finestra sia renderizzata prima del trackbar
+        cv2.imshow(window_name, np.zeros((10, 10, 3), dtype=np.uint8))
+        cv2.waitKey(1) # Rendi la finestra visibile per un istante
+        # Create trackbar, mapping frames to current position
+        cv2.createTrackbar("Seek (frames)", window_name, 0, trackbar_context['total_frames'] - 1, on_trackbar_change)
+
+    publisher = start_publisher(args)
+    results = pipeline.run()
+    for result in results:
+        if publisher is not None:
+            publisher.publish(result.frame_idx, result.time, result.radar_tracks)
+        for event in result.events:
+            print(f"[{event['time']:.1f}s] Player {event['track_id']}: {event['action']} ({event['confidence']:.2f})")
+
+        cv2.imshow(window_name, result.view)
+        # Radar / Birds-eye View
+        if result.radar is not None:
+            cv2.imshow(radar_window, result.radar)
+
+        if not pipeline.is_live and settings.inference_workers == 0:
+            # Update trackbar position to the next frame
+            trackbar_context['position'] = result.frame_idx + 1
+            cv2.setTrackbarPos("Seek (frames)", window_name, trackbar_context['position'])
+
+        key = cv2.waitKey(1) & 0xFF # Added a small delay to allow trackbar to update
+        if key == ord('q'):
+            break
+
+        # Handle window close (X button)
+        try:
+            if cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
+                break
+        except cv2.error:
+            pass
+    results.close() # Releases the source and flushes the track log
+    if publisher is not None:
+        publisher.close()
+
+    if pipeline.action_recognizer is not None:
+        save_events(args.input, pipeline.action_recognizer.events)
+        for tid, counts in sorted(pipeline.action_recognizer.counts().items()):
+            print(f"Player {tid}: {counts}")
 
     cv2.destroyAllWindows()
 
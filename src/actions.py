@@ -0,0 +1,294 @@
+import json
+import os
+import pickle
+
+import numpy as np
+
+ACTIONS = ["none", "spike", "block", "set", "dig"]
+
+# Per-frame feature layout of the ring buffers
+FEATURES = ["x", "y", "vx", "vy", "aspect", "jump", "wrist_up", "wrists_low", "has_pose"]
+F_X, F_Y, F_VX, F_VY, F_ASPECT, F_JUMP, F_WRIST_UP, F_WRISTS_LOW, F_HAS_POSE = range(len(FEATURES))
+
+# Approximate standing height used to turn box-relative motion into metres
+PLAYER_HEIGHT_METERS = 1.9
+NET_Y_METERS = 9.0
+
+# A feet rise only counts as lift-off if the court position stays put (m/s) or if the
+# whole box moves up with the feet: height change at most this fraction of the rise
+JUMP_STILL_SPEED = 0.5
+JUMP_RIGID_TOLERANCE = 0.25
+
+# MediaPipe landmark indices
+NOSE, L_SHOULDER, R_SHOULDER, L_WRIST, R_WRIST, L_HIP, R_HIP = 0, 11, 12, 15, 16, 23, 24
+
+def _smoothstep(x, lo, hi):
+    """
+    0 below lo, 1 above hi, smooth in between (vectorized).
+    """
+    t = np.clip((x - lo) / (hi - lo), 0.0, 1.0)
+    return t * t * (3 - 2 * t)
+
+def summarize_windows(windows):
+    """
+    Reduces a batch of windows (N, W, F) to the summary features (N, D)
+    used by the classifiers.
+    """
+    speed = np.hypot(windows[:, :, F_VX], windows[:, :, F_VY])
+    half = windows.shape[1] // 2
+    return np.stack([
+        windows[:, :, F_JUMP].max(axis=1),                           # 0 max jump (m)
+        windows[:, :, F_WRIST_UP].max(axis=1),                       # 1 max wrist height above head
+        windows[:, :, F_WRISTS_LOW].max(axis=1),                     # 2 forearm pass posture
+        speed[:, :half].max(axis=1),                                 # 3 approach speed (first half)
+        speed.mean(axis=1),                                          # 4 mean speed
+        np.abs(windows[:, -1, F_Y] - NET_Y_METERS),                  # 5 distance to the net
+        windows[:, :, F_ASPECT].min(axis=1),                         # 6 lowest posture (h / w)
+        windows[:, :, F_HAS_POSE].mean(axis=1)                       # 7 pose coverage
+    ], axis=1)
+
+class RuleBasedActionClassifier:
+    """
+    Default CPU classifier: hand-tuned soft rules on the window summaries.
+    Same interface as a scikit-learn estimator (predict_proba over ACTIONS).
+    """
+    def predict_proba(self, X):
+        jump, wrist_up, wrists_low, approach, mean_speed, net_dist, min_aspect, pose_cov = X.T
+
+        high_jump = _smoothstep(jump, 0.2, 0.45)
+        arms_up = np.maximum(_smoothstep(wrist_up, 0.0, 0.15), (1 - pose_cov) * high_jump)
+
+        spike = high_jump * arms_up * _smoothstep(approach, 1.5, 3.0) * _smoothstep(net_dist, 0.5, 1.5)
+        block = high_jump * arms_up * (1 - _smoothstep(net_dist, 0.8, 1.5)) * (1 - _smoothstep(approach, 2.0, 3.5))
+        set_ = _smoothstep(wrist_up, 0.05, 0.2) * (1 - high_jump * 0.5) * (1 - _smoothstep(mean_speed, 1.0, 2.5)) \
+            * (1 - _smoothstep(net_dist, 3.0, 5.0)) * pose_cov
+        dig = np.maximum(_smoothstep(wrists_low, 0.3, 0.8), 1 - _smoothstep(min_aspect, 1.2, 1.8)) \
+            * _smoothstep(net_dist, 2.5, 4.0)
+
+        scores = np.stack([np.full(len(X), 0.3), spike, block, set_, dig], axis=1)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+def load_classifier(path):
+    """
+    Loads a pickled estimator (e.g. scikit-learn) trained on summarize_windows features.
+    """
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+class ActionRecognizer:
+    """
+    Windowed action recognition over per-track feature ring buffers.
+
+    Every track owns a slot in one (capacity, window, F) array, so memory is bounded
+    by the number of active tracks. Every 'stride' frames the full windows of all
+    tracks are gathered into one batch, summarized and classified together; confident
+    detections become timestamped events (with a per-track refractory period).
+    """
+    def __init__(self, fps=30.0, window=24, stride=4, threshold=0.5, refractory_seconds=1.0,
+                 classifier=None, max_missing=30, initial_capacity=16):
+        """
+        Args:
+            fps (float): Source frame rate (timestamps and velocities).
+            window (int): Frames per classification window.
+            stride (int): Frames between classifications.
+            threshold (float): Minimum class probability to emit an event.
+            refractory_seconds (float): Minimum time between two events of the same track and action.
+            classifier: Object with predict_proba(X) over ACTIONS (rule-based if None).
+            max_missing (int): Frames without the track after which its slot is freed.
+            initial_capacity (int): Initial number of slots (grows as needed).
+        """
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.window = window
+        self.stride = stride
+        self.threshold = threshold
+        self.refractory_frames = int(refractory_seconds * self.fps)
+        self.classifier = classifier if classifier is not None else RuleBasedActionClassifier()
+        self.max_missing = max_missing
+
+        self.buffers = np.zeros((initial_capacity, window, len(FEATURES)), dtype=np.float32)
+        self.heads = np.zeros(initial_capacity, dtype=np.int64)   # Next write position
+        self.filled = np.zeros(initial_capacity, dtype=np.int64)  # Valid entries (<= window)
+        self.prev_box = np.zeros((initial_capacity, 2), dtype=np.float32) # Last (y1, y2) in the image
+        self.lift = np.zeros(initial_capacity, dtype=np.float32) # Accumulated feet rise, in box heights
+        self.last_frame = np.zeros(initial_capacity, dtype=np.int64)
+
+        self.slot_of = {}
+        self.free_slots = list(range(initial_capacity - 1, -1, -1))
+
+        self.events = []
+        self.last_event = {} # (track_id, action) -> frame_idx
+        self.frames_seen = 0
+
+    def _grow(self):
+        old = len(self.buffers)
+        self.buffers = np.concatenate([self.buffers, np.zeros_like(self.buffers)])
+        for name in ("heads", "filled", "prev_box", "lift", "last_frame"):
+            arr = getattr(self, name)
+            setattr(self, name, np.concatenate([arr, np.zeros_like(arr)]))
+        self.free_slots.extend(range(2 * old - 1, old - 1, -1))
+
+    def _slot(self, track_id):
+        slot = self.slot_of.get(track_id)
+        if slot is None:
+            if not self.free_slots:
+                self._grow()
+            slot = self.free_slots.pop()
+            self.slot_of[track_id] = slot
+            self.heads[slot] = 0
+            self.filled[slot] = 0
+            self.lift[slot] = 0
+        return slot
+
+    def _pose_features(self, kp, box_h):
+        """
+        (wrist_up, wrists_low, has_pose) from keypoints in image coordinates.
+        """
+        if kp is None:
+            return 0.0, 0.0, 0.0
+        head_y = kp[NOSE, 1]
+        wrist_y = min(kp[L_WRIST, 1], kp[R_WRIST, 1])
+        wrist_up = (head_y - wrist_y) / box_h
+
+        hip_y = (kp[L_HIP, 1] + kp[R_HIP, 1]) / 2
+        shoulder_w = abs(kp[L_SHOULDER, 0] - kp[R_SHOULDER, 0]) + 1e-6
+        wrists_close = 1.0 - min(1.0, abs(kp[L_WRIST, 0] - kp[R_WRIST, 0]) / shoulder_w)
+        wrists_below_chest = 1.0 if kp[L_WRIST, 1] > (kp[L_SHOULDER, 1] + hip_y) / 2 and \
+            kp[R_WRIST, 1] > (kp[R_SHOULDER, 1] + hip_y) / 2 else 0.0
+        return wrist_up, wrists_close * wrists_below_chest, 1.0
+
+    def push(self, frame_idx, tracks):
+        """
+        Appends one frame of features for each track (court_xy must be set).
+        """
+        for track in tracks:
+            court_xy = getattr(track, 'court_xy', None)
+            if court_xy is None:
+                continue
+            slot = self._slot(track.track_id)
+            x1, y1, x2, y2 = track.to_ltrb()
+            box_w, box_h = max(1.0, x2 - x1), max(1.0, y2 - y1)
+
+            buf = self.buffers[slot]
+            prev = buf[(self.heads[slot] - 1) % self.window]
+            vx = vy = 0.0
+            if self.filled[slot] > 0:
+                dt = max(1, frame_idx - self.last_frame[slot]) / self.fps
+                vx = (court_xy[0] - prev[F_X]) / dt
+                vy = (court_xy[1] - prev[F_Y]) / dt
+
+            # Jump: lift accumulates while the feet rise without moving across the court, or
+            # while the box top rises with them at constant height. Walking towards the far
+            # baseline also raises the feet in the image, but moves court_xy and shrinks the box.
+            if self.filled[slot] > 0:
+                prev_y1, prev_y2 = self.prev_box[slot]
+                rise = prev_y2 - y2
+                if rise > 0:
+                    still = np.hypot(vx, vy) < JUMP_STILL_SPEED
+                    rigid = prev_y1 - y1 > 0 and \
+                        abs((y2 - y1) - (prev_y2 - prev_y1)) <= JUMP_RIGID_TOLERANCE * rise
+                    self.lift[slot] = self.lift[slot] + rise / box_h if still or rigid else 0.9 * self.lift[slot]
+                else:
+                    self.lift[slot] = max(0.0, self.lift[slot] + rise / box_h) # Coming down
+            self.prev_box[slot] = (y1, y2)
+            jump = self.lift[slot] * PLAYER_HEIGHT_METERS
+
+            wrist_up, wrists_low, has_pose = self._pose_features(getattr(track, 'pose', None), box_h)
+
+            buf[self.heads[slot]] = (court_xy[0], court_xy[1], vx, vy, box_h / box_w, jump,
+                                     wrist_up, wrists_low, has_pose)
+            self.heads[slot] = (self.heads[slot] + 1) % self.window
+            self.filled[slot] = min(self.window, self.filled[slot] + 1)
+            self.last_frame[slot] = frame_idx
+
+    def _release_stale(self, frame_idx):
+        for tid in list(self.slot_of.keys()):
+            slot = self.slot_of[tid]
+            if frame_idx - self.last_frame[slot] > self.max_missing:
+                del self.slot_of[tid]
+                self.free_slots.append(slot)
+                # Its refractory timers go with the slot, so memory follows the active tracks
+                for action in ACTIONS:
+                    self.last_event.pop((tid, action), None)
+
+    def classify(self, frame_idx):
+        """
+        Classifies the current window of every full track in one batch.
+        Returns the list of new events.
+        """
+        ids = [tid for tid, slot in self.slot_of.items() if self.filled[slot] == self.window]
+        if not ids:
+            return []
+
+        slots = np.array([self.slot_of[tid] for tid in ids])
+        # Unroll the ring buffers in time order: (N, W, F)
+        idx = (self.heads[slots, None] + np.arange(self.window)[None, :]) % self.window
+        windows = self.buffers[slots[:, None], idx]
+
+        probs = self.classifier.predict_proba(summarize_windows(windows))
+        best = probs.argmax(axis=1)
+
+        new_events = []
+        for tid, cls, p in zip(ids, best, probs[np.arange(len(ids)), best]):
+            if cls == 0 or p < self.threshold:
+                continue
+            action = ACTIONS[cls]
+            last = self.last_event.get((tid, action))
+            if last is not None and frame_idx - last < self.refractory_frames:
+                continue
+            self.last_event[(tid, action)] = frame_idx
+            event = {
+                "frame": int(frame_idx),
+                "time": round(frame_idx / self.fps, 3),
+                "track_id": int(tid),
+                "action": action,
+                "confidence": round(float(p), 3)
+            }
+            new_events.append(event)
+        self.events.extend(new_events)
+        return new_events
+
+    def update(self, frame_idx, tracks):
+        """
+        Pushes one frame and classifies every 'stride' frames. Returns new events.
+        """
+        self.push(frame_idx, tracks)
+        self.frames_seen += 1
+        if self.frames_seen % self.stride != 0:
+            return []
+        self._release_stale(frame_idx)
+        return self.classify(frame_idx)
+
+    def counts(self, relabel=None):
+        """
+        Returns {track_id: {action: count}} (optionally with stitched ids).
+        """
+        counts = {}
+        for event in self.events:
+            tid = event["track_id"]
+            if relabel:
+                tid = relabel.get(tid, tid)
+            per_track = counts.setdefault(tid, {})
+            per_track[event["action"]] = per_track.get(event["action"], 0) + 1
+        return counts
+
+def get_events_path(video_path):
+    return video_path + ".actions.json"
+
+def save_events(video_path, events):
+    path = get_events_path(video_path)
+    try:
+        with open(path, 'w') as f:
+            json.dump(events, f, indent=4)
+        print(f"Action events saved to {path}")
+    except Exception as e:
+        print(f"Error saving action events: {e}")
+
+def load_events(video_path):
+    path = get_events_path(video_path)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading action events: {e}")
+    return None
@@ -1,5 +1,6 @@
 import json
 import os
+import re
 
 class CalibrationManager:
     def __init__(self):
@@ -7,6 +8,11 @@ class CalibrationManager:
 
     @staticmethod
     def get_json_path(video_path):
+        # Live sources (device index, stream URL) have no file to sit next to:
+        # store their calibration under 'calibrations/' with a sanitized name
+        if str(video_path).isdigit() or "://" in str(video_path):
+            safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(video_path))
+            return os.path.join("calibrations", safe_name + ".json")
         return video_path + ".json"
 
     @staticmethod
@@ -52,8 +58,69 @@ class CalibrationManager:
                 "points": points,
                 "settings": settings if settings else {}
             }
+            if os.path.dirname(json_path):
+                os.makedirs(os.path.dirname(json_path), exist_ok=True)
             with open(json_path, 'w') as f:
                 json.dump(data, f, indent=4)
             print(f"Calibration and settings saved to {json_path}")
         except Exception as e:
-            print(f"Error saving calibration file: {e}")
\ No newline at end of file
+            print(f"Error saving calibration file: {e}")
+
+    @staticmethod
+    def get_maps_path(video_path):
+        """
+        Undistortion maps (.npz) saved next to the calibration JSON.
+        """
+        return os.path.splitext(CalibrationManager.get_json_path(video_path))[0] + ".undistort.npz"
+
+class Calibration:
+    """
+    Court points plus the settings needed to use them (video orientation, active zone
+    and, if estimated, the lens distortion model).
+    This is what VolleyPipeline consumes; it can be built in code or loaded from the JSON sidecar.
+    """
+    def __init__(self, points, orientation='vertical', zone='all', lens=None):
+        self.points = [tuple(pt) for pt in points]
+        self.orientation = orientation
+        self.zone = zone
+        self.lens = lens
+
+    @property
+    def settings(self):
+        return {"orientation": self.orientation, "zone": self.zone}
+
+    def scaled(self, scale):
+        """
+        The calibration for frames resized by 'scale' (e.g. a decoded proxy).
+        """
+        points = [(x * scale, y * scale) for x, y in self.points]
+        lens = self.lens.scaled(scale) if self.lens is not None else None
+        return Calibration(points, self.orientation, self.zone, lens)
+
+    @classmethod
+    def load(cls, video_path):
+        """
+        Loads the calibration saved for a video. Returns None if there is none.
+        """
+        points, settings = CalibrationManager.load_calibration(video_path)
+        if not points:
+            return None
+        settings = settings or {}
+        lens = None
+        if settings.get("lens"):
+            from src.distortion import LensDistortion
+            lens = LensDistortion.from_dict(settings["lens"])
+        return cls(points, settings.get("orientation", "vertical"), settings.get("zone", "all"), lens)
+
+    def save(self, video_path):
+        settings = self.settings
+        if self.lens is not None:
+            # The JSON holds the model; the precomputed maps go to an .npz sidecar
+            maps_path = CalibrationManager.get_maps_path(video_path)
+            try:
+                self.lens.save_maps(maps_path)
+            except Exception as e:
+                print(f"Error saving undistortion maps: {e}")
+                maps_path = None
+            settings["lens"] = self.lens.to_dict(maps_path)
+        CalibrationManager.save_calibration(video_path, self.points, settings)
@@ -0,0 +1,77 @@
+import os
+import pickle
+
+CHECKPOINT_VERSION = 1
+
+def get_checkpoint_path(video_path):
+    return video_path + ".checkpoint.pkl"
+
+def source_fingerprint(path):
+    """
+    (size, mtime) of the source file: a checkpoint is only valid for the same video.
+    """
+    try:
+        stat = os.stat(path)
+        return stat.st_size, int(stat.st_mtime)
+    except OSError:
+        return None
+
+class Checkpointer:
+    """
+    Periodic snapshots of an offline run, so a crashed or stopped job can resume.
+
+    A checkpoint is one pickle written next to the video every 'every' frames: the
+    next frame to read, the tracker state (ByteTrack tracks and id counter), the
+    per-run stages (teams, smoother, rally detector, actions, pose cache), the
+    current tracks and the byte offsets of the output files. It is written to a
+    temporary file and renamed, so a crash while saving leaves the previous
+    checkpoint intact. Nothing is copied per frame: the cost is one pickle of
+    small objects every 'every' frames.
+    """
+    def __init__(self, path, every=900):
+        self.path = path
+        self.every = max(1, int(every))
+        self.saves = 0
+
+    def due(self, frame_idx):
+        return (frame_idx + 1) % self.every == 0
+
+    def save(self, state):
+        state = dict(state, version=CHECKPOINT_VERSION)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.saves += 1
+
+    def load(self):
+        """
+        The last checkpoint, or None if there is none (or it cannot be read).
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"Error loading checkpoint {self.path}: {e}")
+            return None
+        if state.get("version") != CHECKPOINT_VERSION:
+            return None
+        return state
+
+    def clear(self):
+        """
+        Removes the checkpoint (the run completed).
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def truncate_output(path, offset):
+    """
+    Cuts an output file back to the offset recorded in a checkpoint (rows written
+    after it are written again by the resumed run).
+    """
+    if offset is not None and os.path.exists(path):
+        with open(path, 'r+b') as f:
+            f.truncate(offset)
@@ -0,0 +1,292 @@
+import multiprocessing
+import os
+import time
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from src.actions import load_events
+from src.rally import load_segments
+from src.replay import RadarReplay
+from src.spatial_index import CourtIndex, ZONES
+from src.tracker import draw_tracks
+from src.zones import FAR_BASE, NEAR_BASE, classify_court_points, label_name, label_position
+
+@dataclass
+class Clip:
+    """
+    Frame range [start, end] (inclusive, like rally segments) to cut from the video.
+    """
+    start: int
+    end: int
+    label: str
+
+    @property
+    def length(self):
+        return self.end - self.start + 1
+
+def frames_to_clips(frames, fps, label, max_gap=0.5, min_seconds=0.0):
+    """
+    Groups sorted frame indices into clips: runs closer than 'max_gap' seconds are
+    joined, runs shorter than 'min_seconds' are dropped.
+    """
+    frames = np.unique(np.asarray(frames, dtype=np.int64))
+    if len(frames) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(frames) > max(1, int(round(max_gap * fps))))
+    starts = frames[np.r_[0, breaks + 1]]
+    ends = frames[np.r_[breaks, len(frames) - 1]]
+    min_frames = int(round(min_seconds * fps))
+    return [Clip(int(s), int(e), label) for s, e in zip(starts, ends) if e - s + 1 >= min_frames]
+
+def pad_clips(clips, fps, pad_seconds, num_frames=None):
+    """
+    Extends every clip by 'pad_seconds' on both sides (clamped to the video) and
+    merges the clips that then overlap (labels joined with '+' if they differ).
+    """
+    pad = int(round(pad_seconds * fps))
+    last = num_frames - 1 if num_frames else None
+    merged = []
+    for clip in sorted(clips, key=lambda c: c.start):
+        start = max(0, clip.start - pad)
+        end = clip.end + pad if last is None else min(last, clip.end + pad)
+        if merged and start <= merged[-1].end + 1:
+            prev = merged[-1]
+            prev.end = max(prev.end, end)
+            if clip.label not in prev.label.split("+"):
+                prev.label += "+" + clip.label
+        else:
+            merged.append(Clip(start, end, clip.label))
+    return merged
+
+# --- Queries -------------------------------------------------------------------
+
+def rally_clips(video_path):
+    """
+    One clip per saved rally segment (--scan-rallies). None if there are none.
+    """
+    segments = load_segments(video_path)
+    if segments is None:
+        return None
+    return [Clip(int(s), int(e), "rally") for s, e in segments]
+
+def event_clips(events, fps, actions=None, track_id=None, before=1.0, after=1.0):
+    """
+    One clip around every action event (optionally of some actions / one player).
+    The event frame is where the classifier window ended, so more context is kept
+    before it than after.
+    """
+    clips = []
+    for event in events:
+        if actions and event["action"] not in actions:
+            continue
+        if track_id is not None and event["track_id"] != track_id:
+            continue
+        frame = int(event["frame"])
+        clips.append(Clip(max(0, frame - int(round(before * fps))), frame + int(round(after * fps)),
+                          f"{event['action']}_id{event['track_id']}"))
+    return clips
+
+def presence_clips(index, zone="court", track_id=None, team=None, max_gap=0.5, min_seconds=0.5):
+    """
+    Clips of the time a player (or any player of a team / anyone) spends in a zone.
+
+    'zone' is a CourtIndex zone name (ZONES), a zone label name such as 'near_4',
+    or a court position 1-6 (either side).
+    """
+    rect_name, positions = _parse_zone(zone)
+    rows = index.query_zone(rect_name, team=team)
+    if track_id is not None:
+        rows = rows[rows["track_id"] == track_id]
+    if positions is not None:
+        labels = classify_court_points(np.stack([rows["court_x"], rows["court_y"]], axis=1))
+        mask = np.isin(labels, positions[0]) if positions[1] else np.isin(label_position(labels), positions[0])
+        rows = rows[mask]
+
+    who = f"id{track_id}" if track_id is not None else (f"team{team}" if team is not None else "any")
+    return frames_to_clips(rows["frame"], index.fps, f"{who}_{zone}", max_gap, min_seconds)
+
+def _parse_zone(zone):
+    # (CourtIndex rectangle, (values, values_are_labels) or None for rectangle-only zones)
+    zone = str(zone)
+    if zone in ZONES:
+        return zone, None
+    if zone.isdigit() and 1 <= int(zone) <= 6:
+        return "court", ([int(zone)], False)
+    labels = [base + p for base in (FAR_BASE, NEAR_BASE) for p in range(1, 7) if label_name(base + p) == zone]
+    if labels:
+        return "court", (labels, True)
+    raise ValueError(f"Unknown zone '{zone}' (use {', '.join(ZONES)}, 1-6 or far_N/near_N)")
+
+def parse_query(text):
+    """
+    Parses a clip query such as "rallies", "action=spike,block track=7",
+    "zone=4 track=7" or "zone=near_front team=1" into a dict.
+    """
+    query = {}
+    for term in text.split():
+        key, _, value = term.partition("=")
+        if key == "rallies" and not value:
+            query["rallies"] = True
+        elif key == "action":
+            query["actions"] = value.split(",")
+        elif key in ("track", "team"):
+            query[key] = int(value)
+        elif key == "zone":
+            query["zone"] = value
+        elif key in ("min", "gap"):
+            query[key] = float(value)
+        else:
+            raise ValueError(f"Unknown clip query term '{term}'")
+    return query
+
+def query_clips(video_path, fps, query, index=None):
+    """
+    Clips (unpadded) selected by a parsed query from the data saved next to the video:
+    rally segments, action events or the track log (through CourtIndex).
+    """
+    if query.get("rallies"):
+        clips = rally_clips(video_path)
+        if clips is None:
+            raise ValueError("No rally segments saved: run with --scan-rallies first")
+        return clips
+    if "actions" in query:
+        events = load_events(video_path)
+        if events is None:
+            raise ValueError("No action events saved: run with --actions first")
+        return event_clips(events, fps, query["actions"], query.get("track"))
+
+    index = index if index is not None else CourtIndex.for_video(video_path, fps)
+    if index is None:
+        raise ValueError("No track log saved: run with --save-tracks first")
+    return presence_clips(index, query.get("zone", "court"), query.get("track"), query.get("team"),
+                          max_gap=query.get("gap", 0.5), min_seconds=query.get("min", 0.5))
+
+# --- Extraction ----------------------------------------------------------------
+
+def _draw_overlay(frame, frame_idx, replay, radar_fraction):
+    tracks = replay.tracks_at(frame_idx)
+    draw_tracks(frame, tracks)
+    if radar_fraction > 0:
+        radar = replay.radar_view.update_player_positions(replay.static_court.copy(), tracks)
+        h = max(1, int(frame.shape[0] * radar_fraction))
+        w = max(1, int(radar.shape[1] * h / radar.shape[0]))
+        if w < frame.shape[1]:
+            frame[:h, -w:] = cv2.resize(radar, (w, h), interpolation=cv2.INTER_AREA)
+    return frame
+
+def _write_clips(args):
+    """
+    Worker entry point (top level so it can be pickled by multiprocessing): writes
+    its clips in frame order from one capture.
+
+    Seeking (CAP_PROP_POS_FRAMES) makes FFmpeg jump to the keyframe before the target
+    and decode forward from there, so only the frames of each clip plus at most one
+    GOP are decoded. A clip starting shortly after the previous one is reached by
+    grabbing forward instead, so the same GOP is not decoded twice.
+    """
+    video_path, clips, paths, fps, log, overlay_options, max_skip = args
+    cap = cv2.VideoCapture(video_path)
+    replay = None
+    if log is not None:
+        radar_fraction = overlay_options.pop("radar_fraction")
+        replay = RadarReplay(log, fps, **overlay_options)
+        replay.static_court = replay.radar_view._draw_static_court()
+
+    position = None # Index of the next frame the capture returns
+    read = 0 # Frames read or grabbed (the keyframe run-up of a seek is not counted)
+    try:
+        for clip, path in zip(clips, paths):
+            if position is None or clip.start < position or clip.start - position > max_skip:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, clip.start)
+            else:
+                for _ in range(clip.start - position):
+                    cap.grab()
+                read += clip.start - position
+            position = clip.start
+
+            writer = None
+            for frame_idx in range(clip.start, clip.end + 1):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                position += 1
+                read += 1
+                if replay is not None:
+                    frame = _draw_overlay(frame, frame_idx, replay, radar_fraction)
+                if writer is None:
+                    h, w = frame.shape[:2]
+                    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+                writer.write(frame)
+            if writer is not None:
+                writer.release()
+    finally:
+        cap.release()
+    return read
+
+def _split_work(clips, workers):
+    # Contiguous groups of clips with about the same number of frames each
+    lengths = np.array([clip.length for clip in clips])
+    cumulative = np.cumsum(lengths) - lengths / 2
+    group = np.minimum((cumulative * workers / lengths.sum()).astype(int), workers - 1)
+    return [np.flatnonzero(group == g) for g in range(workers) if np.any(group == g)]
+
+def extract_clips(video_path, clips, output_dir, workers=1, log=None, max_skip=None,
+                  radar_fraction=0.3, **overlay_options):
+    """
+    Cuts clips out of a video into 'output_dir' (one .mp4 per clip).
+
+    Clips are sorted and split into contiguous groups of similar length, one per
+    worker process; each worker only decodes around its own clips (see _write_clips).
+
+    Args:
+        video_path (str): Source video.
+        clips (list[Clip]): Frame ranges to cut.
+        output_dir (str): Output directory (created if missing).
+        workers (int): Processes writing clips in parallel.
+        log (np.ndarray): Track log to burn in (boxes + radar inset), None = plain clips.
+        max_skip (int): Largest gap to the next clip decoded forward instead of seeking
+                        (default: 1 second).
+        radar_fraction (float): Radar inset height as a fraction of the frame (0 = boxes only).
+        overlay_options: RadarReplay display options (pixels_per_meter, invert_sides, mirror_lr).
+    Returns the output paths, in clip order.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video {video_path}")
+        return []
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    if not clips:
+        print("Clips: nothing matched the query.")
+        return []
+
+    os.makedirs(output_dir, exist_ok=True)
+    clips = sorted(clips, key=lambda c: c.start)
+    paths = [os.path.join(output_dir, f"{i:03d}_{clip.label}_{clip.start}.mp4") for i, clip in enumerate(clips)]
+    max_skip = int(fps) if max_skip is None else max_skip
+    if log is not None:
+        overlay_options["radar_fraction"] = radar_fraction
+
+    jobs = []
+    for group in _split_work(clips, max(1, min(workers, len(clips)))):
+        rows = None
+        if log is not None:
+            lo, hi = clips[group[0]].start, clips[group[-1]].end
+            rows = log[(log["frame"] >= lo - int(fps)) & (log["frame"] <= hi)] # Plus the radar hold window
+        jobs.append((video_path, [clips[i] for i in group], [paths[i] for i in group], fps, rows,
+                     dict(overlay_options), max_skip))
+
+    t0 = time.perf_counter()
+    if len(jobs) == 1:
+        read = _write_clips(jobs[0])
+    else:
+        with multiprocessing.Pool(len(jobs)) as pool:
+            read = sum(pool.map(_write_clips, jobs))
+    elapsed = time.perf_counter() - t0
+
+    seconds = sum(clip.length for clip in clips) / fps
+    print(f"Clips: {len(clips)} clips ({seconds:.0f} s of video, {read} frames read) "
+          f"written to {output_dir} in {elapsed:.1f} s")
+    return paths
@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+
+class FrameCompositor:
+    """
+    Composes the main video view without redrawing the static overlays on every frame.
+
+    The calibration overlay (court polygon, 3m lines, net, TL/TR/BR/BL labels) and any
+    static HUD text never change between frames, so they are rendered once into a cached
+    layer together with a mask. Each frame is then written into a reusable output buffer
+    and the layer is applied with a single vectorized masked copy, restricted to the
+    bounding box of the mask. Only the dynamic parts (tracks, time) are drawn afterwards.
+    """
+    def __init__(self, detector):
+        self.detector = detector
+
+        # Static HUD lines: list of (text, (x, y))
+        self.static_text = []
+
+        # Cached static layer, its mask and the mask bounding box (y0, y1, x0, x1)
+        self.layer = None
+        self.mask = None
+        self.roi = None
+        self._layer_points = None
+
+        # Reusable output buffer (allocated once per frame size)
+        self.output = None
+
+    def set_static_text(self, lines):
+        """
+        Sets HUD text lines that never change between frames.
+        lines: list of (text, (x, y)) tuples.
+        """
+        self.static_text = list(lines)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Drops the cached layer. Call after the calibration points change.
+        """
+        self.layer = None
+        self.mask = None
+        self.roi = None
+
+    def _build_static_layer(self, shape):
+        """
+        Renders the static overlay once on a black canvas and derives its mask.
+        """
+        h, w = shape[:2]
+        layer = np.zeros((h, w, 3), dtype=np.uint8)
+
+        # 1. Calibration overlay (same drawing code as the per-frame path)
+        if self.detector.manual_points:
+            self.detector.draw_static_overlay(layer)
+
+        # 2. Static HUD text
+        for text, pos in self.static_text:
+            cv2.putText(layer, text, pos, cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+        # Every static colour is non-black, so any touched pixel belongs to the overlay
+        mask = layer.any(axis=2)
+
+        ys, xs = np.nonzero(mask)
+        if len(ys) == 0:
+            self.layer, self.mask, self.roi = layer, mask, None
+            return
+
+        y0, y1 = ys.min(), ys.max() + 1
+        x0, x1 = xs.min(), xs.max() + 1
+
+        # Keep only the bounding box of the overlay, so the blend touches as few pixels as possible
+        self.roi = (y0, y1, x0, x1)
+        self.layer = np.ascontiguousarray(layer[y0:y1, x0:x1])
+        self.mask = np.ascontiguousarray(mask[y0:y1, x0:x1, np.newaxis])
+
+    def compose(self, frame, detect_lines=True):
+        """
+        Writes the frame plus the static overlay into the reusable output buffer.
+        The returned buffer is overwritten on the next call; dynamic overlays
+        (tracks, time) should be drawn on it directly.
+        detect_lines=False skips the Hough fallback used when there is no calibration.
+        """
+        if self.output is None or self.output.shape != frame.shape:
+            self.output = np.empty_like(frame)
+            self.invalidate()
+
+        np.copyto(self.output, frame)
+
+        if not self.detector.manual_points:
+            # No calibration: fall back to per-frame line detection (fully dynamic)
+            if detect_lines:
+                edges = self.detector.preprocess(frame)
+                lines = self.detector.detect_lines(edges)
+                self.detector.draw_lines(self.output, lines)
+            for text, pos in self.static_text:
+                cv2.putText(self.output, text, pos, cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            return self.output
+
+        # Rebuild only when the calibration changed (set_manual_points assigns a new list)
+        if self.layer is None or self._layer_points is not self.detector.manual_points:
+            self._build_static_layer(frame.shape)
+            self._layer_points = self.detector.manual_points
+
+        if self.roi is not None:
+            y0, y1, x0, x1 = self.roi
+            np.copyto(self.output[y0:y1, x0:x1], self.layer, where=self.mask)
+
+        return self.output
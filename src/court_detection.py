@@ -85,13 +85,16 @@ class CourtDetector:
         if not self.manual_points:
             return frame
 
+        # Points may be sub-pixel (e.g. a calibration scaled to a proxy): drawn rounded
+        pixels = [(int(round(x)), int(round(y))) for x, y in self.manual_points]
+
         # Draw all points
-        for point in self.manual_points:
+        for point in pixels:
             cv2.circle(frame, point, 5, (0, 0, 255), -1)
 
         # 1. Draw Perimeter (First 4 points)
         if len(self.manual_points) >= 4:
-            perimeter_pts = np.array(self.manual_points[:4], np.int32)
+            perimeter_pts = np.array(pixels[:4], np.int32)
             perimeter_pts = perimeter_pts.reshape((-1, 1, 2))
             cv2.polylines(frame, [perimeter_pts], True, (255, 255, 0), 2) # Cyan for perimeter
 
@@ -99,12 +102,21 @@ class CourtDetector:
         # Iterate from index 4, taking 2 points at a time
         for i in range(4, len(self.manual_points), 2):
             if i + 1 < len(self.manual_points):
-                pt1 = self.manual_points[i]
-                pt2 = self.manual_points[i+1]
+                pt1 = pixels[i]
+                pt2 = pixels[i+1]
                 cv2.line(frame, pt1, pt2, (0, 165, 255), 2) # Orange for internal lines
 
         return frame
 
+    def draw_static_overlay(self, img):
+        """
+        Draws everything that depends only on the calibration: the manual court
+        and the labelled perimeter corners. Used by FrameCompositor to build its cached layer.
+        """
+        self.draw_manual_court(img)
+        self.draw_ordered_perimeter_points(img, self.manual_points)
+        return img
+
     def process_frame(self, frame):
         """
         Main pipeline for processing a single frame.
@@ -0,0 +1,403 @@
+import os
+
+import cv2
+import numpy as np
+
+from src.startup import timed_import
+from src.track_log import TrackLogWriter, load_track_log
+from src.zones import COURT_WIDTH, COURT_LENGTH, NET_Y, ATTACK_LINE
+
+# Player class in COCO (person)
+PERSON_CLASS_ID = 0
+
+class DetectorBackend:
+    """
+    Detection + tracking backend used by PlayerTracker.
+
+    track() returns the raw tracked boxes of one frame as numpy arrays; ROI
+    filtering and TrackWrapper creation stay in PlayerTracker, so every backend
+    feeds the rest of the pipeline the same way.
+    """
+    name = "base"
+
+    def warmup(self, imgsz=640):
+        pass
+
+    def detect(self, frame, conf_threshold=0.3, imgsz=640, frame_idx=None):
+        """
+        Detection only: (boxes (N, 4) x1 y1 x2 y2, track_ids (N,) or None, confs (N,)).
+        Must not touch tracker state, so it can run on several processes out of order.
+        """
+        raise NotImplementedError
+
+    def associate(self, boxes, track_ids, confs, frame=None):
+        """
+        Tracking step for detect() output, called in frame order. Backends whose
+        detections already carry ids pass them through.
+        """
+        if track_ids is None:
+            raise NotImplementedError(f"The {self.name} backend has no separate association step")
+        return boxes, track_ids, confs
+
+    def track(self, frame, conf_threshold=0.3, imgsz=640, frame_idx=None):
+        """
+        Returns (boxes (N, 4) x1 y1 x2 y2, track_ids (N,), confs (N,)).
+        """
+        return self.associate(*self.detect(frame, conf_threshold, imgsz, frame_idx), frame=frame)
+
+    def reset(self):
+        """
+        Drops the tracker state (after a cut away from the calibrated camera). New
+        tracks get new ids: ids are never reused within a run.
+        """
+        pass
+
+    def get_state(self):
+        """
+        Picklable tracker state for checkpoints (None if the backend has none).
+        """
+        return None
+
+    def set_state(self, state):
+        pass
+
+def _empty():
+    return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+class YoloBackend(DetectorBackend):
+    """
+    YOLOv8 detector with native ByteTrack tracking (ultralytics).
+    """
+    name = "yolo"
+
+    def __init__(self, model_path='yolov8n.pt', frame_rate=30):
+        print(f"Initializing YOLOv8 model: {model_path}...")
+
+        # Heavy dependencies are imported here, not at module load, so the CLI
+        # starts (and the calibration UI appears) without waiting for them
+        torch = timed_import("torch")
+        YOLO = timed_import("ultralytics").YOLO
+
+        # Check and print device
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        print(f"Using device: {device.upper()}")
+
+        self.model = YOLO(model_path)
+        self.frame_rate = frame_rate
+        self.byte_tracker = None # Standalone ByteTrack for associate()
+
+    def warmup(self, imgsz=640):
+        """
+        Runs one dummy inference so the first real frame does not pay for lazy
+        initialization (weights to device, kernel selection, allocations).
+        Uses predict(), not track(), so the ByteTrack state stays untouched.
+        """
+        dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        self.model.predict(dummy, classes=[PERSON_CLASS_ID], verbose=False, imgsz=imgsz)
+
+    def track(self, frame, conf_threshold=0.3, imgsz=640, frame_idx=None):
+        if self.byte_tracker is not None:
+            # Tracker restored from a checkpoint: keep tracking with it
+            return super().track(frame, conf_threshold, imgsz, frame_idx)
+        # persist=True is essential for tracking continuity
+        # tracker="bytetrack.yaml" uses the lightweight ByteTrack algorithm
+        results = self.model.track(
+            frame,
+            persist=True,
+            tracker="bytetrack.yaml",
+            classes=[PERSON_CLASS_ID],
+            conf=conf_threshold,
+            verbose=False,
+            imgsz=imgsz
+        )
+        if not results:
+            return _empty()
+        r = results[0] # We only process the first (and only) frame
+        if not r.boxes or r.boxes.id is None:
+            return _empty()
+        # boxes.xyxy is [x1, y1, x2, y2]
+        return r.boxes.xyxy.cpu().numpy(), r.boxes.id.cpu().numpy(), r.boxes.conf.cpu().numpy()
+
+    def detect(self, frame, conf_threshold=0.3, imgsz=640, frame_idx=None):
+        results = self.model.predict(frame, classes=[PERSON_CLASS_ID], conf=conf_threshold, verbose=False, imgsz=imgsz)
+        if not results or not results[0].boxes:
+            return np.zeros((0, 4), dtype=np.float32), None, np.zeros(0, dtype=np.float32)
+        boxes = results[0].boxes
+        return boxes.xyxy.cpu().numpy(), None, boxes.conf.cpu().numpy()
+
+    def associate(self, boxes, track_ids, confs, frame=None):
+        """
+        The same ByteTrack model.track() uses (bytetrack.yaml), fed with boxes
+        detected elsewhere.
+        """
+        if self.byte_tracker is None:
+            from ultralytics.trackers.byte_tracker import BYTETracker
+            from ultralytics.utils import IterableSimpleNamespace, yaml_load
+            from ultralytics.utils.checks import check_yaml
+            cfg = IterableSimpleNamespace(**yaml_load(check_yaml("bytetrack.yaml")))
+            self.byte_tracker = BYTETracker(args=cfg, frame_rate=self.frame_rate)
+
+        tracked = self.byte_tracker.update(_Detections(boxes, confs), frame)
+        if len(tracked) == 0:
+            return _empty()
+        # Rows: x1, y1, x2, y2, track_id, score, cls, detection index
+        return tracked[:, :4].astype(np.float32), tracked[:, 4].astype(np.int64), tracked[:, 5].astype(np.float32)
+
+    def reset(self):
+        # model.track() keeps its ByteTrack on the predictor (created on the first call)
+        predictor = getattr(self.model, "predictor", None)
+        trackers = list(getattr(predictor, "trackers", None) or [])
+        if self.byte_tracker is not None:
+            trackers.append(self.byte_tracker)
+        for tracker in trackers:
+            # BYTETracker.reset() would also restart the id counter
+            tracker.tracked_stracks = []
+            tracker.lost_stracks = []
+            tracker.removed_stracks = []
+
+    def _active_tracker(self):
+        trackers = getattr(getattr(self.model, "predictor", None), "trackers", None)
+        return trackers[0] if trackers and self.byte_tracker is None else self.byte_tracker
+
+    def get_state(self):
+        """
+        The ByteTrack instance in use (pickled whole) and the global id counter.
+        """
+        from ultralytics.trackers.basetrack import BaseTrack
+        return {"tracker": self._active_tracker(), "next_id": BaseTrack._count}
+
+    def set_state(self, state):
+        from ultralytics.trackers.basetrack import BaseTrack
+        BaseTrack._count = state["next_id"]
+        # The restored tracker is fed through detect() + associate() from now on
+        self.byte_tracker = state["tracker"]
+
+class _Detections:
+    """
+    The subset of ultralytics' Boxes that BYTETracker.update reads.
+    """
+    def __init__(self, boxes, confs):
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(confs, dtype=np.float32)
+        self.cls = np.zeros(len(boxes), dtype=np.float32)
+        self.xyxy = boxes
+        self.xywh = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2,
+                              boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]], axis=1)
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __getitem__(self, index):
+        return _Detections(self.xyxy[index], self.conf[index])
+
+# --- Synthetic backend ----------------------------------------------------------
+
+def get_truth_path(video_path):
+    return video_path + ".truth.csv"
+
+def synthetic_camera(frame_size):
+    """
+    Homography court metres -> image of the synthetic camera: a raised baseline
+    view (far end line at the top, narrower than the near one).
+    """
+    w, h = frame_size
+    court = np.float32([[0, 0], [COURT_WIDTH, 0], [COURT_WIDTH, COURT_LENGTH], [0, COURT_LENGTH]])
+    image = np.float32([[0.36 * w, 0.22 * h], [0.64 * w, 0.22 * h], [0.92 * w, 0.92 * h], [0.08 * w, 0.92 * h]])
+    return cv2.getPerspectiveTransform(court, image)
+
+def synthetic_calibration(frame_size):
+    """
+    Calibration of the synthetic camera (10 points, as clicked by hand:
+    corners, near 3 m line, net, far 3 m line).
+    """
+    from src.calibration import Calibration
+
+    court = [[0, 0], [COURT_WIDTH, 0], [COURT_WIDTH, COURT_LENGTH], [0, COURT_LENGTH]]
+    for y in (NET_Y + ATTACK_LINE, NET_Y, NET_Y - ATTACK_LINE):
+        court += [[0, y], [COURT_WIDTH, y]]
+    image = cv2.perspectiveTransform(np.float64(court).reshape(-1, 1, 2), synthetic_camera(frame_size)).reshape(-1, 2)
+    # Whole pixels, like clicked points
+    return Calibration([(int(round(x)), int(round(y))) for x, y in image], orientation='vertical')
+
+class SyntheticBackend(DetectorBackend):
+    """
+    Deterministic stand-in for the detector: no model, no torch.
+
+    Players move on smooth seeded paths in court metres (each team in its own half)
+    and are projected through the synthetic camera, so boxes and ids depend only on
+    (seed, frame index): runs are reproducible on any machine and seeking works.
+    With 'ground_truth' (a track log, e.g. from write_synthetic_video) the boxes of
+    each frame are replayed from it instead. 'miss_rate' and 'jitter' (pixels) add
+    seeded detection noise.
+    """
+    name = "synthetic"
+
+    def __init__(self, players=12, seed=0, fps=30.0, frame_size=(1280, 720), ground_truth=None,
+                 miss_rate=0.0, jitter=0.0):
+        self.players = players
+        self.seed = seed
+        self.fps = fps
+        self.frame_size = tuple(frame_size)
+        self.miss_rate = miss_rate
+        self.jitter = jitter
+        self.frame_counter = 0
+        self.H = synthetic_camera(self.frame_size)
+
+        self.truth = None
+        if ground_truth is not None:
+            log = ground_truth[np.argsort(ground_truth["frame"], kind="stable")]
+            frames, starts = np.unique(log["frame"], return_index=True)
+            self.truth = (log, frames, starts, np.r_[starts[1:], len(log)])
+
+        # Per player: team, home position and two sinusoids per axis
+        rng = np.random.default_rng(seed)
+        self.team = np.arange(players) % 2
+        slot = np.arange(players) // 2
+        self.home = np.stack([
+            (slot % 3 + 0.5) * COURT_WIDTH / 3,
+            np.where(self.team == 0, 1.5 + (slot // 3 % 2) * 4.5, COURT_LENGTH - 1.5 - (slot // 3 % 2) * 4.5)
+        ], axis=1)
+        self.amplitude = rng.uniform(0.5, 1.5, (players, 2, 2))
+        self.frequency = rng.uniform(0.05, 0.4, (players, 2, 2)) * 2 * np.pi
+        self.phase = rng.uniform(0, 2 * np.pi, (players, 2, 2))
+
+    def court_positions(self, frame_idx):
+        """
+        (players, 2) court metres of every scripted player at a frame.
+        """
+        t = frame_idx / self.fps
+        offset = (self.amplitude * np.sin(self.frequency * t + self.phase)).sum(axis=2)
+        xy = self.home + offset
+        xy[:, 0] = np.clip(xy[:, 0], -1.0, COURT_WIDTH + 1.0)
+        # Nobody crosses the net
+        far = self.team == 0
+        xy[far, 1] = np.clip(xy[far, 1], -1.5, NET_Y - 0.3)
+        xy[~far, 1] = np.clip(xy[~far, 1], NET_Y + 0.3, COURT_LENGTH + 1.5)
+        return xy
+
+    def get_state(self):
+        return {"frame_counter": self.frame_counter}
+
+    def set_state(self, state):
+        self.frame_counter = state["frame_counter"]
+
+    def boxes_at(self, frame_idx):
+        """
+        Noise-free (boxes, ids, teams) of the scripted players at a frame.
+        """
+        court = self.court_positions(frame_idx)
+        feet = cv2.perspectiveTransform(court.reshape(-1, 1, 2), self.H).reshape(-1, 2)
+        # Local scale: image length of 1 m across the court at the feet
+        side = cv2.perspectiveTransform((court + [1.0, 0.0]).reshape(-1, 1, 2), self.H).reshape(-1, 2)
+        height = 1.9 * np.linalg.norm(side - feet, axis=1)
+        width = 0.4 * height
+        boxes = np.stack([feet[:, 0] - width / 2, feet[:, 1] - height, feet[:, 0] + width / 2, feet[:, 1]], axis=1)
+        return boxes.astype(np.float32), np.arange(1, self.players + 1), self.team
+
+    def detect(self, frame, conf_threshold=0.3, imgsz=640, frame_idx=None):
+        # Scripted ids come with the boxes, so associate() passes them through
+        if frame_idx is None:
+            frame_idx = self.frame_counter
+        self.frame_counter = frame_idx + 1
+
+        if self.truth is not None:
+            log, frames, starts, ends = self.truth
+            i = np.searchsorted(frames, frame_idx)
+            if i >= len(frames) or frames[i] != frame_idx:
+                return _empty()
+            rows = log[starts[i]:ends[i]]
+            boxes = np.stack([rows["x1"], rows["y1"], rows["x2"], rows["y2"]], axis=1).astype(np.float32)
+            ids = rows["track_id"].copy()
+        else:
+            boxes, ids, _ = self.boxes_at(frame_idx)
+        if frame is not None and frame.shape[1] != self.frame_size[0]:
+            # Frames read at another size (e.g. a decoded proxy): boxes follow them
+            boxes = boxes * np.float32(frame.shape[1] / self.frame_size[0])
+
+        # Seeded per frame, so the noise does not depend on which frames were processed before
+        rng = np.random.default_rng([self.seed, frame_idx])
+        confs = rng.uniform(0.6, 0.95, len(ids)).astype(np.float32)
+        if self.jitter > 0:
+            boxes = boxes + rng.normal(0, self.jitter, boxes.shape).astype(np.float32)
+        keep = (confs >= conf_threshold) & (rng.random(len(ids)) >= self.miss_rate)
+        return boxes[keep], ids[keep], confs[keep]
+
+# Shirt colours of the synthetic video (BGR)
+SYNTHETIC_SHIRTS = ((40, 40, 220), (220, 120, 30))
+
+def draw_synthetic_frame(backend, frame_idx):
+    """
+    Synthetic video frame: floor, court lines and one box per player (team shirt
+    on top, dark shorts below) drawn far-to-near so nearer players occlude.
+    """
+    w, h = backend.frame_size
+    frame = np.full((h, w, 3), (70, 110, 70), dtype=np.uint8)
+
+    def line(p0, p1, thickness=3):
+        pts = cv2.perspectiveTransform(np.float64([p0, p1]).reshape(-1, 1, 2), backend.H).reshape(-1, 2)
+        cv2.line(frame, tuple(int(v) for v in pts[0]), tuple(int(v) for v in pts[1]), (255, 255, 255), thickness)
+
+    corners = cv2.perspectiveTransform(np.float64([[0, 0], [COURT_WIDTH, 0], [COURT_WIDTH, COURT_LENGTH],
+                                                   [0, COURT_LENGTH]]).reshape(-1, 1, 2), backend.H)
+    cv2.fillPoly(frame, [corners.astype(np.int32)], (60, 140, 200))
+    for x in (0, COURT_WIDTH):
+        line([x, 0], [x, COURT_LENGTH])
+    for y in (0, NET_Y - ATTACK_LINE, NET_Y, NET_Y + ATTACK_LINE, COURT_LENGTH):
+        line([0, y], [COURT_WIDTH, y], 5 if y == NET_Y else 3)
+
+    boxes, _, teams = backend.boxes_at(frame_idx)
+    for i in np.argsort(boxes[:, 3]):
+        x1, y1, x2, y2 = boxes[i].astype(int)
+        mid = int(y1 + 0.55 * (y2 - y1))
+        cv2.rectangle(frame, (x1, y1), (x2, mid), SYNTHETIC_SHIRTS[teams[i]], -1)
+        cv2.rectangle(frame, (x1, mid), (x2, y2), (30, 30, 30), -1)
+    return frame
+
+def write_synthetic_video(path, seconds=10.0, fps=30.0, players=12, seed=0, frame_size=(1280, 720)):
+    """
+    Writes a synthetic match: the video, its ground-truth track log
+    (<video>.truth.csv, same format as --save-tracks) and its calibration
+    sidecar, so the whole CLI can run on it with '--detector synthetic'.
+    """
+    backend = SyntheticBackend(players, seed, fps, frame_size)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, tuple(frame_size))
+    truth = TrackLogWriter(get_truth_path(path))
+
+    from src.tracker import TrackWrapper
+    for frame_idx in range(int(round(seconds * fps))):
+        writer.write(draw_synthetic_frame(backend, frame_idx))
+        boxes, ids, teams = backend.boxes_at(frame_idx)
+        court = backend.court_positions(frame_idx)
+        tracks = []
+        for box, tid, team, xy in zip(boxes, ids, teams, court):
+            track = TrackWrapper(tid, box.tolist(), 1.0)
+            track.court_xy = (float(xy[0]), float(xy[1]))
+            track.team = int(team)
+            tracks.append(track)
+        truth.write(frame_idx, tracks)
+
+    writer.release()
+    truth.close()
+    synthetic_calibration(frame_size).save(path)
+
+def create_backend(name='yolo', model_path='yolov8n.pt', **options):
+    """
+    Backend by name: 'yolo' or 'synthetic' (options are passed to the backend; for
+    'synthetic', 'source' picks up the ground truth saved next to a synthetic video).
+    """
+    if name == 'yolo':
+        return YoloBackend(model_path, **options)
+    if name == 'synthetic':
+        source = options.pop('source', None)
+        if source is not None and os.path.isfile(str(source)):
+            # Scripted players are drawn in the source's frame size and timed at its rate
+            cap = cv2.VideoCapture(str(source))
+            if cap.isOpened():
+                options.setdefault('frame_size', (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))))
+                options.setdefault('fps', cap.get(cv2.CAP_PROP_FPS) or 30.0)
+            cap.release()
+            truth_path = get_truth_path(str(source))
+            if options.get('ground_truth') is None and os.path.exists(truth_path):
+                options['ground_truth'] = load_track_log(truth_path)
+        return SyntheticBackend(**options)
+    raise ValueError(f"Unknown detector backend '{name}' (expected 'yolo' or 'synthetic')")
@@ -0,0 +1,195 @@
+import os
+
+import cv2
+import numpy as np
+
+from src.zones import COURT_WIDTH, COURT_LENGTH, NET_Y, ATTACK_LINE
+
+# Court-metre y of the three clicked lines (far 3 m, net, near 3 m)
+LINE_YS = (NET_Y - ATTACK_LINE, NET_Y, NET_Y + ATTACK_LINE)
+
+class LensDistortion:
+    """
+    Radial lens model (OpenCV k1, k2) with a pinhole matrix centred on the image.
+
+    Only the few foot points per frame are undistorted (undistort_points); whole
+    frames go through a cached remap (undistort_frame) and only when really needed.
+    The radar remap grids use distort_points instead, so the bird's-eye view needs
+    no extra per-frame pass at all.
+    """
+    def __init__(self, camera_matrix, dist_coeffs, image_size):
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).ravel()
+        self.image_size = (int(image_size[0]), int(image_size[1])) # (width, height)
+        self.maps = None
+
+    @classmethod
+    def from_coefficients(cls, k1, k2, image_size):
+        w, h = image_size
+        f = float(max(w, h)) # Wide-angle guess: focal length ~ image width
+        K = [[f, 0, w / 2.0], [0, f, h / 2.0], [0, 0, 1]]
+        return cls(K, [k1, k2, 0.0, 0.0, 0.0], image_size)
+
+    def undistort_points(self, points):
+        """
+        Distorted image points (N, 2) -> ideal pinhole image points (N, 2).
+        """
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        if len(pts) == 0:
+            return np.zeros((0, 2))
+        out = cv2.undistortPoints(pts, self.camera_matrix, self.dist_coeffs, P=self.camera_matrix)
+        return out.reshape(-1, 2)
+
+    def distort_points(self, points):
+        """
+        Ideal pinhole image points (N, 2) -> distorted image points (N, 2). Closed form.
+        """
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        fx, fy = self.camera_matrix[0, 0], self.camera_matrix[1, 1]
+        cx, cy = self.camera_matrix[0, 2], self.camera_matrix[1, 2]
+        k1, k2 = self.dist_coeffs[0], self.dist_coeffs[1]
+        x = (pts[:, 0] - cx) / fx
+        y = (pts[:, 1] - cy) / fy
+        r2 = x * x + y * y
+        factor = 1 + k1 * r2 + k2 * r2 * r2
+        return np.stack([x * factor * fx + cx, y * factor * fy + cy], axis=1).astype(np.float32)
+
+    def undistort_frame(self, frame):
+        """
+        Whole-frame undistortion through cached fixed-point remap maps.
+        """
+        if self.maps is None:
+            self.maps = cv2.initUndistortRectifyMap(self.camera_matrix, self.dist_coeffs, None,
+                                                    self.camera_matrix, self.image_size, cv2.CV_16SC2)
+        return cv2.remap(frame, self.maps[0], self.maps[1], cv2.INTER_LINEAR)
+
+    def scaled(self, scale):
+        """
+        The same lens for frames resized by 'scale' (distortion coefficients work on
+        normalized coordinates, so only the pinhole matrix and the size change).
+        """
+        K = self.camera_matrix.copy()
+        K[:2] *= scale
+        return LensDistortion(K, self.dist_coeffs, (round(self.image_size[0] * scale), round(self.image_size[1] * scale)))
+
+    # --- Persistence -----------------------------------------------------------
+
+    def to_dict(self, maps_path=None):
+        data = {
+            "camera_matrix": self.camera_matrix.tolist(),
+            "dist_coeffs": self.dist_coeffs.tolist(),
+            "image_size": list(self.image_size)
+        }
+        if maps_path is not None:
+            data["maps"] = maps_path
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        lens = cls(data["camera_matrix"], data["dist_coeffs"], data["image_size"])
+        maps_path = data.get("maps")
+        if maps_path and os.path.exists(maps_path):
+            try:
+                maps = np.load(maps_path)
+                lens.maps = (maps["map1"], maps["map2"])
+            except Exception as e:
+                print(f"Error loading undistortion maps (recomputed on demand): {e}")
+        return lens
+
+    def save_maps(self, path):
+        """
+        Precomputes the whole-frame undistortion maps and saves them to an .npz file.
+        """
+        if self.maps is None:
+            self.maps = cv2.initUndistortRectifyMap(self.camera_matrix, self.dist_coeffs, None,
+                                                    self.camera_matrix, self.image_size, cv2.CV_16SC2)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez_compressed(path, map1=self.maps[0], map2=self.maps[1])
+
+def court_targets(points, homography):
+    """
+    Court-metre coordinates of the 10 clicked points.
+
+    The 4 corners and the three lines are matched to the court layout through the
+    corner homography (image -> court metres): corners snap to the nearest court
+    corner, line endpoints to the nearest sideline at the line's y.
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    court = cv2.perspectiveTransform(pts.reshape(-1, 1, 2), homography).reshape(-1, 2)
+
+    corners = np.array([[0, 0], [COURT_WIDTH, 0], [COURT_WIDTH, COURT_LENGTH], [0, COURT_LENGTH]])
+    targets = [corners[np.argmin(np.linalg.norm(corners - c, axis=1))] for c in court[:4]]
+
+    line_ys = np.array(LINE_YS)
+    for i in range(4, len(pts) - 1, 2):
+        y = line_ys[np.argmin(np.abs(line_ys - court[i:i + 2, 1].mean()))]
+        # The endpoint further left in court x is on the x = 0 sideline
+        left = 0 if court[i, 0] <= court[i + 1, 0] else 1
+        targets.append([0.0 if left == 0 else COURT_WIDTH, y])
+        targets.append([COURT_WIDTH if left == 0 else 0.0, y])
+    return np.array(targets, dtype=np.float64)
+
+def _fit_residuals(image_points, targets, lens):
+    undistorted = image_points if lens is None else lens.undistort_points(image_points)
+    H, _ = cv2.findHomography(undistorted.astype(np.float64), targets, 0)
+    if H is None:
+        return np.full(2 * len(targets), 1e3)
+    projected = cv2.perspectiveTransform(undistorted.reshape(-1, 1, 2).astype(np.float64), H).reshape(-1, 2)
+    return (projected - targets).ravel()
+
+def estimate_distortion(points, image_size, homography, min_gain=0.2):
+    """
+    Estimates k1, k2 from all 10 clicked points: after undistortion the corners and
+    the 3 m / net line endpoints must fit a single homography onto the court layout
+    (straight sidelines, correctly spaced lines). Returns (lens or None, rms_before,
+    rms_after) in court metres; None when there are too few points or the model
+    does not reduce the error by at least 'min_gain'.
+
+    Args:
+        points (list): Clicked points (4 corners + 3 lines x 2 endpoints).
+        image_size (tuple): (width, height) of the video.
+        homography (np.ndarray): Corner homography image -> court metres.
+    """
+    from scipy.optimize import least_squares
+
+    if len(points) < 10:
+        return None, None, None
+
+    image_points = np.asarray(points[:10], dtype=np.float64)
+    targets = court_targets(image_points, homography)
+
+    rms_before = float(np.sqrt(np.mean(_fit_residuals(image_points, targets, None) ** 2) * 2))
+
+    def residuals(k):
+        return _fit_residuals(image_points, targets, LensDistortion.from_coefficients(k[0], k[1], image_size))
+
+    fit = least_squares(residuals, x0=[0.0, 0.0], bounds=([-1.0, -1.0], [1.0, 1.0]), diff_step=1e-3)
+    rms_after = float(np.sqrt(np.mean(fit.fun ** 2) * 2))
+
+    if rms_after > (1 - min_gain) * rms_before:
+        return None, rms_before, rms_after
+    return LensDistortion.from_coefficients(fit.x[0], fit.x[1], image_size), rms_before, rms_after
+
+def calibrate_lens(points, orientation, image_size):
+    """
+    estimate_distortion() for a calibration: the corner homography is built with a
+    RadarView in the given orientation. Prints the fit and returns the lens or None.
+    """
+    from src.radar import RadarView
+
+    radar_view = RadarView()
+    radar_view.set_orientation(orientation)
+    radar_view.update_homography(points)
+    if radar_view.M is None:
+        return None
+
+    lens, rms_before, rms_after = estimate_distortion(points, image_size, radar_view.image_to_court_matrix())
+    if rms_before is None:
+        print("Lens: all 10 court points are needed to estimate distortion.")
+    elif lens is None:
+        print(f"Lens: no significant distortion (fit error {rms_before:.2f} m -> {rms_after:.2f} m).")
+    else:
+        k1, k2 = lens.dist_coeffs[:2]
+        print(f"Lens: k1={k1:.3f} k2={k2:.3f}, fit error {rms_before:.2f} m -> {rms_after:.2f} m.")
+    return lens
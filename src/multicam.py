@@ -0,0 +1,356 @@
+import dataclasses
+import multiprocessing
+import os
+import queue
+import sys
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.calibration import Calibration
+from src.pipeline import VolleyPipeline, PipelineSettings
+from src.tracker import TrackWrapper
+from src.track_log import TrackLogWriter, NO_TEAM
+from src.zones import COURT_WIDTH, COURT_LENGTH
+
+# Columns of the per-frame observation arrays sent by the camera workers
+OBS_ID, OBS_X, OBS_Y, OBS_TEAM, OBS_WEIGHT = range(5)
+
+@dataclass
+class CameraSource:
+    """
+    One camera of a multi-camera run.
+
+    'offset' (seconds) is added to the camera's timestamps to align it with the
+    others. 'rotated' is set for a camera calibrated from the opposite end of the
+    court: its court metres are turned by 180 degrees into the common frame.
+    """
+    source: str
+    offset: float = 0.0
+    rotated: bool = False
+
+@dataclass
+class FusedFrame:
+    """
+    Merged radar positions at one instant of the common clock.
+    """
+    frame_idx: int
+    time: float
+    tracks: list        # TrackWrapper with court_xy / team (ids are fused ids)
+    camera_counts: list # Players reported by each camera for this instant (None = no sample)
+    merged: int = 0     # Players seen by more than one camera
+
+def _put(q, item, stop_event):
+    # Blocking put that gives up when the run is stopped (the parent may no longer read)
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.2)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _camera_worker(camera, settings, sync, threads, out_queue, stop_event):
+    """
+    Worker process entry point (top level so it can be pickled by multiprocessing).
+
+    Decodes and runs inference on one camera with its own pipeline and calibration
+    sidecar, and sends only the court positions to the parent.
+    """
+    import cv2
+    cv2.setNumThreads(threads)
+
+    calibration = Calibration.load(camera.source)
+    if calibration is None:
+        _put(out_queue, ("error", f"no calibration for {camera.source} (calibrate it first with --input)"), stop_event)
+        return
+
+    pipeline = VolleyPipeline(camera.source, calibration, settings)
+    if not pipeline.open():
+        _put(out_queue, ("error", f"could not open {camera.source}"), stop_event)
+        return
+    try:
+        pipeline._ensure_tracker()
+    except Exception as e:
+        _put(out_queue, ("error", f"{camera.source}: {e}"), stop_event)
+        pipeline.close()
+        return
+
+    # The worker's share of the cores (torch is only loaded by the tracker)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+    if not _put(out_queue, ("fps", pipeline.fps), stop_event):
+        pipeline.close()
+        return
+
+    results = pipeline.run()
+    try:
+        for result in results:
+            if stop_event.is_set():
+                break
+            if sync == "clock" and pipeline.is_live and pipeline.cap.frame_time is not None:
+                t = pipeline.cap.frame_time
+            else:
+                t = result.time
+            rows = []
+            for track in result.tracks:
+                if track.court_xy is None:
+                    continue
+                x, y = track.court_xy
+                if camera.rotated:
+                    x, y = COURT_WIDTH - x, COURT_LENGTH - y
+                x1, y1, x2, y2 = track.to_ltrb()
+                team = NO_TEAM if track.team is None else track.team
+                # Closer players look taller and their feet project with less error
+                rows.append((track.track_id, x, y, team, max(y2 - y1, 1.0) ** 2))
+            obs = np.array(rows, dtype=np.float64).reshape(-1, 5)
+            if not _put(out_queue, ("frame", t + camera.offset, obs), stop_event):
+                break
+    finally:
+        results.close()
+    _put(out_queue, ("end", None), stop_event)
+
+class PositionFuser:
+    """
+    Merges the court positions reported by several cameras for one instant.
+
+    Cameras are added one at a time: each camera's players are assigned one-to-one
+    (LAP, lapx) to the players merged so far, within 'merge_radius' metres, so a
+    player seen by two cameras becomes a single point (weighted towards the camera
+    that sees it closer). Fused ids are kept stable through the (camera, track id)
+    pairs that formed them, and team labels of every camera are mapped onto the
+    first camera's labels by voting over merged players.
+    """
+    def __init__(self, num_cameras, merge_radius=1.0):
+        self.num_cameras = num_cameras
+        self.merge_radius = merge_radius
+        self.fused_ids = {}      # (camera, track_id) -> fused id
+        self.next_id = 1
+        self.team_votes = [{} for _ in range(num_cameras)] # (team, reference team) -> count
+
+    def _map_team(self, camera, team):
+        if team == NO_TEAM or camera == 0:
+            return team
+        votes = {ref: n for (t, ref), n in self.team_votes[camera].items() if t == team}
+        return max(votes, key=votes.get) if votes else NO_TEAM
+
+    def fuse(self, observations):
+        """
+        Args:
+            observations (list): Per camera, an (N, 5) array [track_id, x, y, team, weight]
+                                 or None if the camera has no sample for this instant.
+
+        Returns:
+            (tracks, merged): TrackWrapper list with court_xy and team, and the number
+            of players seen by more than one camera.
+        """
+        import lap # lapx
+
+        xy = np.zeros((0, 2))
+        weight = np.zeros(0)
+        members = [] # Per merged player: list of (camera, row)
+
+        for cam, obs in enumerate(observations):
+            if obs is None or len(obs) == 0:
+                continue
+            matched = np.full(len(obs), -1)
+            if len(xy):
+                cost = np.hypot(xy[:, None, 0] - obs[None, :, OBS_X], xy[:, None, 1] - obs[None, :, OBS_Y])
+                _, x, _ = lap.lapjv(cost, extend_cost=True, cost_limit=self.merge_radius)
+                for r, c in enumerate(x):
+                    if c >= 0 and cost[r, c] <= self.merge_radius:
+                        matched[c] = r
+
+            for c in np.flatnonzero(matched >= 0):
+                r = matched[c]
+                w = obs[c, OBS_WEIGHT]
+                xy[r] = (xy[r] * weight[r] + obs[c, OBS_X:OBS_Y + 1] * w) / (weight[r] + w)
+                weight[r] += w
+                members[r].append((cam, obs[c]))
+
+            new = np.flatnonzero(matched < 0)
+            xy = np.vstack([xy, obs[new, OBS_X:OBS_Y + 1]])
+            weight = np.r_[weight, obs[new, OBS_WEIGHT]]
+            members.extend([(cam, obs[c])] for c in new)
+
+        self._vote_teams(members)
+
+        tracks = []
+        used = set()
+        for pos, group in zip(xy, members):
+            track = TrackWrapper(self._fused_id(group, used), [0, 0, 0, 0], 1.0)
+            track.court_xy = (float(pos[0]), float(pos[1]))
+            # Team of the camera that sees the player best, in the reference labels
+            cam, row = max(group, key=lambda m: m[1][OBS_WEIGHT])
+            team = self._map_team(cam, int(row[OBS_TEAM]))
+            track.team = None if team == NO_TEAM else team
+            tracks.append(track)
+        return tracks, sum(len(group) > 1 for group in members)
+
+    def _vote_teams(self, members):
+        for group in members:
+            ref = [int(row[OBS_TEAM]) for cam, row in group if cam == 0]
+            if not ref or ref[0] == NO_TEAM:
+                continue
+            for cam, row in group:
+                team = int(row[OBS_TEAM])
+                if cam > 0 and team != NO_TEAM:
+                    key = (team, ref[0])
+                    self.team_votes[cam][key] = self.team_votes[cam].get(key, 0) + 1
+
+    def _fused_id(self, group, used):
+        keys = [(cam, int(row[OBS_ID])) for cam, row in group]
+        # Oldest fused id already attached to one of the member tracks
+        candidates = sorted(self.fused_ids[k] for k in keys if k in self.fused_ids and self.fused_ids[k] not in used)
+        if candidates:
+            fused_id = candidates[0]
+        else:
+            fused_id = self.next_id
+            self.next_id += 1
+        for k in keys:
+            self.fused_ids[k] = fused_id
+        used.add(fused_id)
+        return fused_id
+
+class MultiCameraFusion:
+    """
+    Several cameras of the same match merged onto one radar.
+
+    Every camera runs decode, inference and court projection in its own worker
+    process (one VolleyPipeline each, with its own calibration sidecar), so the
+    cameras use separate cores instead of sharing one loop. Workers only send court
+    positions back; the parent aligns them on a common clock (offset: frame time plus
+    the camera offset; clock: capture time of live sources) and merges them with
+    PositionFuser. Per-camera queues are bounded, so a faster camera waits for the
+    slower one instead of piling up results.
+    """
+    def __init__(self, cameras, settings=None, fps=None, merge_radius=1.0, max_age=None,
+                 sync="offset", track_log_path=None, queue_size=32):
+        """
+        Args:
+            cameras (list): CameraSource per camera (the first one is the team reference).
+            settings (PipelineSettings): Per-camera pipeline settings (rendering is disabled).
+            fps (float): Output rate of the merged radar (default: first camera's fps).
+            merge_radius (float): Metres within which two cameras' players are the same player.
+            max_age (float): Seconds a camera sample is used for (default: 2 output frames).
+            sync (str): "offset" (file timestamps + offsets) or "clock" (live capture time).
+            track_log_path (str): Write the merged tracks here (TrackLogWriter format).
+            queue_size (int): Results buffered per camera.
+        """
+        self.cameras = cameras
+        settings = settings if settings is not None else PipelineSettings()
+        self.settings = dataclasses.replace(settings, render=False, track_log_path=None)
+        self.fps = fps
+        self.max_age = max_age
+        self.sync = sync
+        self.track_log_path = track_log_path
+        self.queue_size = queue_size
+        self.fuser = PositionFuser(len(cameras), merge_radius)
+        self.processes = []
+        self.stop_event = None
+
+    def _start(self):
+        ctx = multiprocessing.get_context()
+        self.stop_event = ctx.Event()
+        self.queues = [ctx.Queue(self.queue_size) for _ in self.cameras]
+        threads = max(1, (os.cpu_count() or 1) // len(self.cameras))
+        for i, camera in enumerate(self.cameras):
+            settings = dataclasses.replace(self.settings, live=self.settings.live or self.sync == "clock")
+            p = ctx.Process(target=_camera_worker, daemon=True,
+                            args=(camera, settings, self.sync, threads, self.queues[i], self.stop_event))
+            p.start()
+            self.processes.append(p)
+
+    def _receive(self, cam):
+        """
+        Next message of a camera, or ("end", None) if its worker died.
+        """
+        while True:
+            try:
+                return self.queues[cam].get(timeout=1.0)
+            except queue.Empty:
+                if not self.processes[cam].is_alive():
+                    return ("end", None)
+
+    def run(self):
+        """
+        Generator of FusedFrame on the common clock, until every camera has ended.
+        """
+        self._start()
+        n = len(self.cameras)
+        buffers = [deque() for _ in range(n)]
+        finished = [False] * n
+        writer = TrackLogWriter(self.track_log_path) if self.track_log_path else None
+
+        def pull(cam):
+            kind, *payload = self._receive(cam)
+            if kind == "frame":
+                buffers[cam].append((payload[0], payload[1]))
+            elif kind == "fps":
+                if self.fps is None:
+                    self.fps = payload[0]
+            else:
+                if kind == "error":
+                    print(f"Camera {cam}: {payload[0]}")
+                finished[cam] = True
+
+        try:
+            # First sample of every camera: the common clock starts at the earliest one
+            for cam in range(n):
+                while not finished[cam] and not buffers[cam]:
+                    pull(cam)
+            if not any(buffers):
+                return
+            fps = self.fps or 30.0
+            step = 1.0 / fps
+            max_age = self.max_age if self.max_age is not None else 2 * step
+            t0 = min(b[0][0] for b in buffers if b)
+
+            frame_idx = 0
+            while True:
+                t = t0 + frame_idx * step
+                # A camera's sample for t is final once it has reported a later one
+                for cam in range(n):
+                    while not finished[cam] and (not buffers[cam] or buffers[cam][-1][0] <= t):
+                        pull(cam)
+                if all(finished) and all(not b or b[-1][0] < t - step / 2 for b in buffers):
+                    break
+
+                observations = []
+                for b in buffers:
+                    # Keep the latest sample at or before t (plus half a step of tolerance)
+                    while len(b) > 1 and b[1][0] <= t + step / 2:
+                        b.popleft()
+                    if b and abs(t - b[0][0]) <= max_age and b[0][0] <= t + step / 2:
+                        observations.append(b[0][1])
+                    else:
+                        observations.append(None)
+
+                tracks, merged = self.fuser.fuse(observations)
+                if writer is not None:
+                    writer.write(frame_idx, tracks)
+                yield FusedFrame(frame_idx, t - t0, tracks,
+                                 [None if o is None else len(o) for o in observations], merged)
+                frame_idx += 1
+        finally:
+            if writer is not None:
+                writer.close()
+            self.close()
+
+    def __iter__(self):
+        return self.run()
+
+    def close(self):
+        """
+        Stops the camera workers. Safe to call more than once.
+        """
+        if self.stop_event is not None:
+            self.stop_event.set()
+        for p in self.processes:
+            p.join(timeout=2.0)
+            if p.is_alive():
+                p.terminate()
+        self.processes = []
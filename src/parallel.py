@@ -0,0 +1,219 @@
+import multiprocessing
+import os
+import queue
+import sys
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from src.proxy import ProxyCapture, is_proxy_file
+
+class FrameRing:
+    """
+    Fixed number of frame slots in one shared memory block.
+
+    The decoder writes frames straight into a slot (VideoCapture.read into the
+    slot view) and only slot numbers travel through the queues, so no pixels are
+    pickled or copied between processes.
+    """
+    def __init__(self, shape, slots, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = name is None
+        size = int(np.prod(self.shape)) * slots
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.frames = None # Drop the view before closing the mapping
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def _get(q, stop_event):
+    # Blocking get that gives up when the run is stopped
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.2)
+        except queue.Empty:
+            continue
+    return None
+
+def _decoder(source, ring_name, shape, slots, start, free_slots, tasks, results, num_workers, stop_event):
+    """
+    Decoder process: fills free slots in frame order and hands them to the workers.
+    """
+    ring = FrameRing(shape, slots, ring_name)
+    cap = ProxyCapture(source) if is_proxy_file(source) else cv2.VideoCapture(source)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    frame_idx = start
+    try:
+        while not stop_event.is_set():
+            slot = _get(free_slots, stop_event)
+            if slot is None:
+                break
+            target = ring.frames[slot]
+            ret, frame = cap.read(target)
+            if not ret:
+                break
+            if frame is not target:
+                # The decoder allocated its own buffer (size changed mid-stream)
+                if frame.shape != target.shape:
+                    results.put(("error", frame_idx, None, f"frame size changed to {frame.shape[1]}x{frame.shape[0]}"))
+                    break
+                target[...] = frame
+            tasks.put((frame_idx, slot))
+            frame_idx += 1
+    finally:
+        results.put(("end", frame_idx, None, None))
+        for _ in range(num_workers):
+            tasks.put(None)
+        cap.release()
+        ring.close()
+
+def _inference_worker(ring_name, shape, slots, tracker_args, conf_threshold, imgsz, threads, tasks, results, stop_event):
+    """
+    Inference process: detection only (no tracker state) on the slots it receives.
+    """
+    from src.tracker import PlayerTracker
+
+    cv2.setNumThreads(1)
+    ring = FrameRing(shape, slots, ring_name)
+    try:
+        model_path, backend, options = tracker_args
+        tracker = PlayerTracker(model_path, backend, **options)
+        # The worker's share of the cores (torch is only loaded by the YOLO backend)
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(threads)
+        while True:
+            task = _get(tasks, stop_event) # None on the end sentinel or when the run stops
+            if task is None:
+                break
+            frame_idx, slot = task
+            detections = tracker.detect(ring.frames[slot], conf_threshold=conf_threshold, imgsz=imgsz, frame_idx=frame_idx)
+            results.put(("det", frame_idx, slot, detections))
+    except Exception as e:
+        results.put(("error", None, None, str(e)))
+    finally:
+        ring.close()
+
+class ParallelDetector:
+    """
+    Offline decode + detection spread over processes, results back in frame order.
+
+    One decoder process writes frames into a shared memory FrameRing, N inference
+    workers run detection (PlayerTracker.detect) on any free slot, and the parent
+    acts as the sequencer: it reorders the detections by frame index and yields
+    them one frame at a time, so ByteTrack association and ROI filtering
+    (PlayerTracker.associate) still see frames in order. A yielded frame is a view
+    on its slot and stays valid until the next one is requested; the slot is then
+    recycled. The number of slots bounds memory and how far ahead workers can run.
+    """
+    def __init__(self, source, frame_shape, workers=2, model_path='yolov8n.pt', backend='yolo',
+                 backend_options=None, conf_threshold=0.3, imgsz=640, slots=None, start=0):
+        """
+        Args:
+            source (str): Video file or decoded proxy (src.proxy).
+            frame_shape (tuple): (height, width, 3) of the decoded frames.
+            workers (int): Inference processes.
+            model_path, backend, backend_options: PlayerTracker arguments for the workers.
+            conf_threshold (float): Detection confidence threshold.
+            imgsz (int): Inference size.
+            slots (int): Frames in flight (default: 2 per worker + 2).
+            start (int): First frame.
+        """
+        self.source = source
+        self.frame_shape = tuple(frame_shape)
+        self.workers = max(1, workers)
+        self.tracker_args = (model_path, backend, backend_options or {})
+        self.conf_threshold = conf_threshold
+        self.imgsz = imgsz
+        self.slots = slots if slots is not None else 2 * self.workers + 2
+        self.start = start
+
+        self.ring = None
+        self.processes = []
+        self.stop_event = None
+
+    def _start(self):
+        ctx = multiprocessing.get_context()
+        self.ring = FrameRing(self.frame_shape, self.slots)
+        self.stop_event = ctx.Event()
+        self.free_slots = ctx.Queue()
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        for slot in range(self.slots):
+            self.free_slots.put(slot)
+
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.processes.append(ctx.Process(
+            target=_decoder, name="FrameDecoder", daemon=True,
+            args=(self.source, self.ring.name, self.frame_shape, self.slots, self.start,
+                  self.free_slots, self.tasks, self.results, self.workers, self.stop_event)))
+        for i in range(self.workers):
+            self.processes.append(ctx.Process(
+                target=_inference_worker, name=f"InferenceWorker-{i}", daemon=True,
+                args=(self.ring.name, self.frame_shape, self.slots, self.tracker_args, self.conf_threshold,
+                      self.imgsz, threads, self.tasks, self.results, self.stop_event)))
+        for p in self.processes:
+            p.start()
+
+    def _receive(self):
+        while True:
+            try:
+                return self.results.get(timeout=1.0)
+            except queue.Empty:
+                if not any(p.is_alive() for p in self.processes):
+                    raise RuntimeError("Parallel detection: all worker processes exited")
+
+    def run(self):
+        """
+        Generator of (frame_idx, frame, detections) in frame order.
+        """
+        self._start()
+        pending = {} # frame_idx -> (slot, detections), detected ahead of the next frame
+        next_idx = self.start
+        end_idx = None
+        try:
+            while end_idx is None or next_idx < end_idx:
+                if next_idx not in pending:
+                    kind, frame_idx, slot, payload = self._receive()
+                    if kind == "det":
+                        pending[frame_idx] = (slot, payload)
+                    elif kind == "end":
+                        end_idx = frame_idx
+                    else:
+                        raise RuntimeError(f"Parallel detection: {payload}")
+                    continue
+
+                slot, detections = pending.pop(next_idx)
+                yield next_idx, self.ring.frames[slot], detections
+                self.free_slots.put(slot)
+                next_idx += 1
+        finally:
+            self.close()
+
+    def __iter__(self):
+        return self.run()
+
+    def close(self):
+        """
+        Stops the processes and releases the shared memory. Safe to call more than once.
+        """
+        if self.stop_event is not None:
+            self.stop_event.set()
+        for p in self.processes:
+            p.join(timeout=2.0)
+            if p.is_alive():
+                p.terminate()
+        self.processes = []
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
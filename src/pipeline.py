@@ -0,0 +1,514 @@
+import dataclasses
+import time
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+import cv2
+
+from src.court_detection import CourtDetector
+from src.radar import RadarView
+from src.compositor import FrameCompositor
+from src.teams import TeamClassifier
+from src.track_log import TrackLogWriter
+from src.smoothing import TrajectorySmoother
+from src.pose import PoseScheduler, draw_poses
+from src.actions import ActionRecognizer
+from src.rally import RallyDetector, segments_to_labels
+from src.scheduler import QualityScheduler
+from src.shots import ShotDetector
+from src.checkpoint import Checkpointer, get_checkpoint_path, source_fingerprint, truncate_output
+from src.proxy import open_proxy, get_proxy_path
+from src.video_source import LatestFrameReader, LatencyStats, is_live_source
+from src.zones import zone_occupancy, OUTSIDE
+
+@dataclass
+class PipelineSettings:
+    """
+    Everything that configures a pipeline run (no GUI state).
+    """
+    model_path: str = 'yolov8n.pt'
+    detector: str = 'yolo'               # Detector backend: 'yolo' or 'synthetic' (src.detectors)
+    conf_threshold: float = 0.3
+
+    # Rally gating: detection every frame in rallies, every N frames in dead time
+    rally_stride: int = 1
+    rally_segments: Optional[List[tuple]] = None # Precomputed segments (live detection if None)
+
+    track_log_path: Optional[str] = None # Write per-frame tracks here
+    smooth_lag: Optional[int] = None     # Fixed-lag smoother (None = disabled)
+    pose_budget: int = 0                 # Max poses per frame (0 = disabled)
+    actions: bool = False                # Action recognition
+
+    adaptive_quality: bool = False
+    target_fps: Optional[float] = None   # Default: source fps
+
+    live: bool = False                   # Latest-frame-wins reader
+    realtime: bool = False               # Replay a file at native rate through the live reader
+
+    shot_detection: bool = False         # Broadcasts: skip frames outside the calibrated main camera shot
+    inference_workers: int = 0           # Offline: decode + detection in N worker processes (0 = inline)
+    proxy_width: int = 0                 # Offline: read frames from a decoded proxy of this width (0 = decode the source)
+    checkpoint_every: int = 0            # Offline: snapshot the run every N frames (0 = disabled)
+    resume: bool = False                 # Continue from the last checkpoint of this source, if it matches
+
+    render: bool = True                  # Produce the annotated view and the radar image
+    pixels_per_meter: int = 40           # Radar scale
+    birdseye_every: int = 0              # Remap the footage under the radar every N frames (0 = synthetic court)
+
+# Settings that do not change the outputs: a checkpoint stays valid across them
+RESUME_INDEPENDENT_SETTINGS = ("resume", "checkpoint_every", "render", "inference_workers",
+                               "pixels_per_meter", "birdseye_every")
+
+# Per-run stages saved whole in a checkpoint
+CHECKPOINT_STAGES = ("team_classifier", "rally_detector", "smoother", "pose_scheduler",
+                     "action_recognizer", "shot_detector")
+
+@dataclass
+class FrameResult:
+    """
+    Output of the pipeline for one frame.
+
+    'view' is the pipeline's reusable output buffer: it is only valid until the
+    next result is requested, so copy it if it must be kept.
+    """
+    frame_idx: int
+    time: float
+    frame: Any
+    tracks: list
+    radar_tracks: list                   # Tracks with (possibly smoothed, delayed) court_xy
+    court_positions: dict                # track_id -> (x, y) court metres for this frame
+    events: list = field(default_factory=list)
+    in_rally: bool = True
+    main_shot: bool = True               # Calibrated main camera on screen (see src.shots)
+    detected: bool = False               # Detection ran on this frame (else tracks are reused)
+    occupancy: Any = None                # Players per zone label (src.zones), None if uncalibrated
+    view: Any = None
+    radar: Any = None
+
+class VolleyPipeline:
+    """
+    Library-level engine: source + calibration + settings in, per-frame results out.
+
+    run() is a generator, so nothing is decoded or inferred until the caller asks for
+    the next result (natural backpressure). The caller can stop early by breaking out
+    and closing the generator, or by calling stop(). No window or prompt is opened here.
+    """
+    def __init__(self, source, calibration=None, settings=None, tracker=None):
+        """
+        Args:
+            source: Video path, stream URL, device index (int or digits) or named pipe.
+            calibration (Calibration): Court points + orientation/zone (optional).
+            settings (PipelineSettings): Run configuration (defaults if None).
+            tracker (PlayerTracker): Pre-built tracker (created on first use if None).
+        """
+        self.source = source
+        self.settings = settings if settings is not None else PipelineSettings()
+        self.tracker = tracker
+
+        self.detector = CourtDetector()
+        self.radar_view = RadarView(pixels_per_meter=self.settings.pixels_per_meter)
+        self.radar_view.birdseye_every = self.settings.birdseye_every
+        self.compositor = FrameCompositor(self.detector)
+        self.team_classifier = TeamClassifier()
+
+        self.cap = None
+        self.first_frame = None
+        self.fps = 30.0
+        self.total_frames = 0
+        self.image_scale = 1.0 # Frame size / source size (below 1 when reading a proxy)
+        self.is_live = self.settings.live or self.settings.realtime or is_live_source(source)
+
+        self.calibration = None
+        if calibration is not None:
+            self.set_calibration(calibration)
+
+        self.latency_stats = None # Live sources only, created with the per-run stages
+        self._stop = False
+        self._started = False
+
+    # --- Setup -----------------------------------------------------------------
+
+    def open(self):
+        """
+        Opens the source. Returns False if it cannot be opened.
+        """
+        if self.cap is not None:
+            return True
+        if self.is_live:
+            self.cap = LatestFrameReader(self.source, realtime=self.settings.realtime)
+        elif self.settings.proxy_width > 0:
+            self.cap = open_proxy(self.source, self.settings.proxy_width)
+        else:
+            self.cap = cv2.VideoCapture(self.source)
+        if self.cap is None or not self.cap.isOpened():
+            self.cap = None
+            return False
+        if self.settings.proxy_width > 0 and not self.is_live and self.cap.scale != self.image_scale:
+            self.image_scale = self.cap.scale
+            if self.calibration is not None:
+                self.set_calibration(self.calibration)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0 # Streams may not report a frame rate
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        return True
+
+    def peek_frame(self):
+        """
+        Returns the first frame (for calibration) and rewinds file sources.
+        """
+        if not self.open():
+            return None
+        # Live sources: read before the capture thread starts, so calibration time is not replayed/dropped
+        ret, frame = self.cap.peek() if self.is_live else self.cap.read()
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.first_frame = frame if ret else None
+        return self.first_frame
+
+    def set_calibration(self, calibration):
+        """
+        Applies court points, orientation and zone to every stage that depends on them.
+        The calibration is in source pixels; the stages work on the frames actually
+        read, so it is scaled to them when they come from a proxy.
+        """
+        self.calibration = calibration
+        if self.image_scale != 1.0:
+            calibration = calibration.scaled(self.image_scale)
+        # Same points for drawing and for the homography (get_warped_frame compares them)
+        self.detector.set_manual_points(calibration.points)
+        self.radar_view.set_orientation(calibration.orientation)
+        self.radar_view.set_active_zone(calibration.zone)
+        self.radar_view.lens = calibration.lens
+        self.radar_view.update_homography(calibration.points)
+        if self.tracker is not None:
+            self.tracker.set_roi_filter(self.radar_view.in_bounds_mask, batch=True)
+
+    def _ensure_tracker(self):
+        if self.tracker is None:
+            from src.tracker import PlayerTracker
+            options = {'source': self.source} if self.settings.detector == 'synthetic' else {}
+            self.tracker = PlayerTracker(self.settings.model_path, self.settings.detector, **options)
+        if self.calibration is not None:
+            self.tracker.set_roi_filter(self.radar_view.in_bounds_mask, batch=True)
+        return self.tracker
+
+    def _start(self, resume_state=None):
+        """
+        Builds the per-run stages (after source and calibration are known), then
+        restores them from 'resume_state' (a checkpoint) if given.
+        """
+        s = self.settings
+        self._ensure_tracker()
+
+        self.rally_labels = None
+        self.rally_detector = None
+        if s.rally_stride > 1:
+            if s.rally_segments is not None:
+                self.rally_labels = segments_to_labels(s.rally_segments, self.total_frames)
+            else:
+                self.rally_detector = RallyDetector(fps=self.fps)
+                self.rally_detector.set_court_roi(self.radar_view)
+
+        self.track_writer = None
+        if s.track_log_path:
+            if resume_state is not None:
+                # Rows after the checkpoint are written again by this run
+                truncate_output(s.track_log_path, resume_state["outputs"].get("track_log"))
+            self.track_writer = TrackLogWriter(s.track_log_path, append=resume_state is not None,
+                                               box_scale=1.0 / self.image_scale)
+        self.checkpointer = None
+        if s.checkpoint_every > 0 and not self.is_live:
+            self.checkpointer = Checkpointer(get_checkpoint_path(self.source), s.checkpoint_every)
+        self.smoother = TrajectorySmoother(fps=self.fps, lag=s.smooth_lag) if s.smooth_lag is not None else None
+        self.pose_scheduler = PoseScheduler(budget=s.pose_budget) if s.pose_budget > 0 else None
+        self.action_recognizer = ActionRecognizer(fps=self.fps) if s.actions else None
+        self.scheduler = QualityScheduler(s.target_fps or self.fps) if s.adaptive_quality else None
+        self.latency_stats = LatencyStats() if self.is_live else None
+        self.shot_detector = None
+        if s.shot_detection:
+            self.shot_detector = ShotDetector()
+            self.shot_detector.set_court_lines(self.radar_view)
+            if self.first_frame is not None:
+                # The frame shown for calibration is the main camera by definition
+                self.shot_detector.set_reference(self.first_frame)
+
+        self.tracks = []
+        self.radar_tracks = []
+        self._started = True
+
+        if resume_state is not None:
+            self.tracker.set_state(resume_state["tracker"])
+            for name, stage in resume_state["stages"].items():
+                if stage is not None and getattr(self, name, None) is not None:
+                    setattr(self, name, stage)
+            self.tracks = resume_state["tracks"]
+            self.radar_tracks = resume_state["radar_tracks"]
+
+    # --- Checkpoints -----------------------------------------------------------
+
+    def _resume_key(self):
+        settings = {k: v for k, v in dataclasses.asdict(self.settings).items() if k not in RESUME_INDEPENDENT_SETTINGS}
+        calibration = None
+        if self.calibration is not None:
+            calibration = (self.calibration.points, self.calibration.settings)
+        return {"source": source_fingerprint(self.source), "settings": settings, "calibration": calibration}
+
+    def save_checkpoint(self, next_frame):
+        """
+        Snapshots the run so that it can continue at 'next_frame' (see Checkpointer).
+        """
+        self.checkpointer.save({
+            "key": self._resume_key(),
+            "next_frame": next_frame,
+            "tracker": self.tracker.get_state(),
+            "stages": {name: getattr(self, name, None) for name in CHECKPOINT_STAGES},
+            "tracks": self.tracks,
+            "radar_tracks": self.radar_tracks,
+            "outputs": {"track_log": self.track_writer.tell() if self.track_writer is not None else None}
+        })
+
+    def _load_resume_state(self):
+        state = Checkpointer(get_checkpoint_path(self.source)).load()
+        if state is None:
+            return None
+        if state["key"] != self._resume_key():
+            print("Checkpoint does not match this video, calibration or settings: starting from the beginning.")
+            return None
+        return state
+
+    # --- Processing ------------------------------------------------------------
+
+    def process_frame(self, frame, frame_idx, detections=None):
+        """
+        Runs all stages on one frame and returns a FrameResult.
+        Can be called directly (e.g. on a single image) without run().
+        'detections' (PlayerTracker.detect output) skips the inline detection:
+        only the in-order association runs here.
+        """
+        if not self._started:
+            self._start()
+
+        s = self.settings
+        quality = self.scheduler.settings if self.scheduler is not None else QualityScheduler.FULL_QUALITY
+
+        # 0. Broadcast shots: nothing runs outside the calibrated camera, and tracks
+        # from before the cut are dropped when it comes back
+        if self.shot_detector is not None:
+            if not self.shot_detector.update(frame_idx, frame):
+                self.tracks = []
+                self.radar_tracks = []
+                result = FrameResult(frame_idx=frame_idx, time=frame_idx / self.fps, frame=frame, tracks=[],
+                                     radar_tracks=[], court_positions={}, in_rally=False, main_shot=False)
+                if s.render:
+                    self._render(result, quality)
+                return result
+            if self.shot_detector.returned:
+                self.tracker.reset()
+                if self.smoother is not None:
+                    self.smoother.reset()
+
+        # 1. Rally gating
+        in_rally = True
+        if self.rally_labels is not None:
+            in_rally = frame_idx >= len(self.rally_labels) or bool(self.rally_labels[frame_idx])
+        elif self.rally_detector is not None:
+            in_rally = self.rally_detector.update(frame_idx, frame=frame, tracks=self.tracks)
+
+        run_detection = in_rally or frame_idx % s.rally_stride == 0
+        if self.scheduler is not None:
+            run_detection = run_detection and self.scheduler.should_detect()
+
+        # 2. Detection and per-track stages
+        events = []
+        if run_detection:
+            if detections is not None:
+                self.tracks = self.tracker.associate(detections, frame)
+            else:
+                self.tracks = self.tracker.detect_and_track(frame, conf_threshold=s.conf_threshold, imgsz=quality["imgsz"],
+                                                         frame_idx=frame_idx)
+            # Team colours (embeddings cached per track, refreshed only occasionally)
+            self.team_classifier.assign(frame, self.tracks, frame_idx)
+            self.radar_view.assign_court_positions(self.tracks)
+            if self.pose_scheduler is not None:
+                self.pose_scheduler.update(frame, self.tracks, frame_idx, refresh=quality["optional_stages"])
+            if self.action_recognizer is not None:
+                events = self.action_recognizer.update(frame_idx, self.tracks)
+            if self.track_writer is not None:
+                self.track_writer.write(frame_idx, self.tracks)
+
+            # Radar shows smoothed positions (delayed by the smoother lag)
+            self.radar_tracks = self.tracks
+            if self.smoother is not None:
+                _, self.radar_tracks = self.smoother.update(frame_idx, self.tracks)
+
+        result = FrameResult(
+            frame_idx=frame_idx,
+            time=frame_idx / self.fps,
+            frame=frame,
+            tracks=self.tracks,
+            radar_tracks=self.radar_tracks,
+            court_positions={t.track_id: t.court_xy for t in self.tracks if getattr(t, 'court_xy', None) is not None},
+            events=events,
+            in_rally=in_rally,
+            detected=run_detection
+        )
+        if self.radar_view.M is not None:
+            result.occupancy = zone_occupancy([getattr(t, 'zone', OUTSIDE) for t in self.tracks])
+
+        if self.checkpointer is not None and self.checkpointer.due(frame_idx):
+            self.save_checkpoint(frame_idx + 1)
+
+        if s.render:
+            self._render(result, quality)
+        return result
+
+    def _render(self, result, quality):
+        """
+        Draws the annotated view (cached static layer + dynamic parts) and the radar.
+        """
+        view = self.compositor.compose(result.frame, detect_lines=quality["optional_stages"])
+        view = self._ensure_tracker().draw_tracks(view, result.tracks)
+        if self.pose_scheduler is not None:
+            view = draw_poses(view, result.tracks)
+
+        minutes = int(result.time // 60)
+        seconds = int(result.time % 60)
+        cv2.putText(view, f"Time: {minutes:02d}:{seconds:02d}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        if not result.main_shot:
+            cv2.putText(view, "OTHER SHOT", (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        elif self.settings.rally_stride > 1:
+            rally_text = "RALLY" if result.in_rally else "DEAD TIME"
+            cv2.putText(view, rally_text, (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        if self.latency_stats is not None:
+            cv2.putText(view, f"Latency: {self.latency_stats.mean_ms():.0f} ms  Dropped: {self.cap.drop_rate():.0%}",
+                        (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        if self.scheduler is not None:
+            cv2.putText(view, self.scheduler.hud_text(), (10, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        result.view = view
+
+        render_radar = self.scheduler is None or self.scheduler.should_render_radar()
+        if self.detector.manual_points and render_radar and result.main_shot:
+            radar_img = self.radar_view.get_warped_frame(result.frame, self.detector.manual_points)
+            if radar_img is not None:
+                result.radar = self.radar_view.update_player_positions(radar_img, result.radar_tracks)
+
+    def run(self):
+        """
+        Generator over the source, yielding one FrameResult per processed frame.
+
+        Timing feedback (quality scheduler, live latency) is taken when the caller
+        asks for the next result, so it includes the caller's own display time.
+        """
+        if not self.open():
+            print(f"Error: Could not open source {self.source}")
+            return
+        if self.settings.resume and not self.is_live:
+            resume_state = self._load_resume_state()
+            if resume_state is not None:
+                self._start(resume_state)
+                self.seek(resume_state["next_frame"])
+                print(f"Resuming from the checkpoint at frame {resume_state['next_frame']}.")
+        if self.settings.inference_workers > 0 and not self.is_live:
+            yield from self._run_parallel()
+            return
+
+        self._stop = False
+        last_start = None
+        last_frame_time = None
+        try:
+            while not self._stop:
+                loop_start = time.perf_counter()
+                if last_start is not None and self._started:
+                    if self.scheduler is not None:
+                        self.scheduler.record(loop_start - last_start)
+                    if self.latency_stats is not None and last_frame_time is not None:
+                        # Capture-to-radar latency of the previous frame
+                        self.latency_stats.record(time.monotonic() - last_frame_time)
+                last_start = loop_start
+
+                if not self.is_live:
+                    frame_idx = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+                ret, frame = self.cap.read()
+                if not ret:
+                    self._finished()
+                    break
+                if self.is_live:
+                    # Sequence number of the newest frame (skipped numbers are dropped frames)
+                    frame_idx = self.cap.frame_index
+                    last_frame_time = self.cap.frame_time
+
+                yield self.process_frame(frame, frame_idx)
+        finally:
+            self.close()
+
+    def _run_parallel(self):
+        """
+        run() for offline jobs with inference_workers > 0: frames are decoded into
+        shared memory and detected by worker processes (src.parallel); association,
+        the per-track stages and rendering stay here, in frame order. Seeking is not
+        supported while it runs.
+        """
+        from src.parallel import ParallelDetector
+
+        s = self.settings
+        start = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+        first = self.peek_frame()
+        if first is None:
+            self.close()
+            return
+        options = {'source': self.source} if s.detector == 'synthetic' else {}
+        source = get_proxy_path(self.source) if s.proxy_width > 0 else self.source
+        detector = ParallelDetector(source, first.shape, s.inference_workers, s.model_path, s.detector, options,
+                                    s.conf_threshold, QualityScheduler.FULL_QUALITY["imgsz"], start=start)
+        self._stop = False
+        last_start = None
+        frames = detector.run()
+        try:
+            for frame_idx, frame, detections in frames:
+                loop_start = time.perf_counter()
+                if last_start is not None and self.scheduler is not None:
+                    self.scheduler.record(loop_start - last_start)
+                last_start = loop_start
+                yield self.process_frame(frame, frame_idx, detections)
+                if self._stop:
+                    break
+            else:
+                self._finished()
+        finally:
+            frames.close()
+            self.close()
+
+    def _finished(self):
+        # The source was read to the end: the checkpoint is no longer needed
+        if self._started and self.checkpointer is not None:
+            self.checkpointer.clear()
+
+    def __iter__(self):
+        return self.run()
+
+    def seek(self, frame_idx):
+        """
+        Moves a file source to the given frame (no-op for live sources).
+        """
+        if self.cap is not None:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+
+    def stop(self):
+        """
+        Requests an early stop: the generator ends before reading the next frame.
+        """
+        self._stop = True
+
+    def close(self):
+        """
+        Releases the source and flushes the outputs. Safe to call more than once.
+        """
+        if self.cap is not None:
+            if self._started and self.shot_detector is not None:
+                print(f"Shots: {self.shot_detector.summary()}")
+            if self.latency_stats is not None and self.is_live:
+                print(f"Live: {self.latency_stats.summary()}, dropped {self.cap.frames_dropped}/"
+                      f"{self.cap.frames_read} frames ({self.cap.drop_rate():.1%})")
+            self.cap.release()
+            self.cap = None
+        if self._started and self.track_writer is not None:
+            self.track_writer.close()
+            self.track_writer = None
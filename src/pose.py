@@ -0,0 +1,192 @@
+import time
+
+import cv2
+import numpy as np
+
+from src.startup import timed_import
+
+# MediaPipe Pose landmark indices used for the skeleton (33-landmark model)
+POSE_CONNECTIONS = [
+    (11, 12),                     # Shoulders
+    (11, 13), (13, 15),           # Left arm
+    (12, 14), (14, 16),           # Right arm
+    (11, 23), (12, 24), (23, 24), # Torso
+    (23, 25), (25, 27),           # Left leg
+    (24, 26), (26, 28)            # Right leg
+]
+
+# Court y (metres) of the net in the radar layout
+NET_Y_METERS = 9.0
+
+class PoseEstimator:
+    """
+    Thin wrapper around MediaPipe Pose, run on single player crops.
+    static_image_mode is used because consecutive calls see different players.
+    """
+    def __init__(self, model_complexity=0, min_detection_confidence=0.5):
+        mp = timed_import("mediapipe") # Optional dependency, loaded only when pose is enabled
+
+        self.pose = mp.solutions.pose.Pose(
+            static_image_mode=True,
+            model_complexity=model_complexity,
+            min_detection_confidence=min_detection_confidence
+        )
+
+    def estimate(self, crop):
+        """
+        Returns a (33, 3) array of (u, v, visibility), u/v normalized to the crop,
+        or None if no person is found.
+        """
+        rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        result = self.pose.process(rgb)
+        if result.pose_landmarks is None:
+            return None
+        return np.array([[lm.x, lm.y, lm.visibility] for lm in result.pose_landmarks.landmark], dtype=np.float32)
+
+    def close(self):
+        self.pose.close()
+
+class PoseScheduler:
+    """
+    Runs pose estimation on at most 'budget' tracks per frame.
+
+    Candidates are the tracks that already passed the ROI filter and whose feet are
+    inside the court. Each candidate gets a priority from the age of its cached pose
+    (round robin) optionally boosted near the net, where spikes and blocks happen.
+    The effective budget also shrinks when the measured pose time would exceed
+    'time_budget_ms', so skeletons never push the loop below the target frame rate.
+
+    Results are cached per track, normalized to the box, and re-attached to the
+    current box on every frame as 'track.pose' ((33, 3) in image coordinates).
+    """
+    def __init__(self, estimator=None, budget=2, policy='priority', time_budget_ms=15.0,
+                 net_weight=2.0, padding=0.1, forget_after=150):
+        """
+        Args:
+            estimator (PoseEstimator): Pose backend (created lazily if None).
+            budget (int): Maximum poses per frame.
+            policy (str): 'round_robin' (oldest first) or 'priority' (oldest first, boosted near the net).
+            time_budget_ms (float): Per-frame time allowed for pose estimation.
+            net_weight (float): Priority boost for players close to the net.
+            padding (float): Relative padding added around the box crop.
+            forget_after (int): Frames after which an unseen track is dropped from the cache.
+        """
+        self.estimator = estimator
+        self.budget = budget
+        self.policy = policy
+        self.time_budget_ms = time_budget_ms
+        self.net_weight = net_weight
+        self.padding = padding
+        self.forget_after = forget_after
+
+        # track_id -> (frame_idx of last pose, keypoints normalized to the padded box)
+        self.cache = {}
+        self.last_seen = {}
+
+        # Moving average of the cost of one pose call
+        self.avg_pose_ms = None
+
+    def __getstate__(self):
+        # The MediaPipe estimator cannot be pickled (checkpoints): it is recreated on use
+        state = self.__dict__.copy()
+        state["estimator"] = None
+        return state
+
+    def _padded_box(self, ltrb, frame_shape):
+        x1, y1, x2, y2 = ltrb
+        pw, ph = (x2 - x1) * self.padding, (y2 - y1) * self.padding
+        h, w = frame_shape[:2]
+        return (int(max(0, x1 - pw)), int(max(0, y1 - ph)), int(min(w, x2 + pw)), int(min(h, y2 + ph)))
+
+    def _is_candidate(self, track):
+        court_xy = getattr(track, 'court_xy', None)
+        if court_xy is None:
+            return True # No calibration: the ROI filter is the only gate
+        x, y = court_xy
+        return 0 <= x <= 9 and 0 <= y <= 18
+
+    def _select(self, tracks, frame_idx):
+        """
+        Returns the tracks to refresh this frame, highest priority first.
+        """
+        candidates = [t for t in tracks if self._is_candidate(t)]
+        if not candidates:
+            return []
+
+        # Effective budget: count limit and time limit
+        budget = self.budget
+        if self.avg_pose_ms:
+            budget = min(budget, max(1, int(self.time_budget_ms / self.avg_pose_ms)))
+
+        ages = np.array([frame_idx - self.cache[t.track_id][0] if t.track_id in self.cache else 1e6
+                         for t in candidates], dtype=np.float64)
+        priority = ages
+        if self.policy == 'priority':
+            net_dist = np.array([abs(t.court_xy[1] - NET_Y_METERS) if getattr(t, 'court_xy', None) is not None else 9.0
+                                 for t in candidates])
+            priority = ages * (1.0 + self.net_weight * np.exp(-net_dist / 2.0))
+
+        order = np.argsort(-priority, kind="stable")[:budget]
+        return [candidates[i] for i in order]
+
+    def update(self, frame, tracks, frame_idx, refresh=True):
+        """
+        Refreshes the poses of the selected tracks and attaches the cached poses
+        to all tracks. With refresh=False only the cached poses are attached.
+        Returns the tracks.
+        """
+        if refresh and self.budget > 0:
+            if self.estimator is None:
+                self.estimator = PoseEstimator()
+
+            for track in self._select(tracks, frame_idx):
+                bx1, by1, bx2, by2 = self._padded_box(track.to_ltrb(), frame.shape)
+                if bx2 - bx1 < 8 or by2 - by1 < 8:
+                    continue
+
+                start = time.perf_counter()
+                keypoints = self.estimator.estimate(frame[by1:by2, bx1:bx2])
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                self.avg_pose_ms = elapsed_ms if self.avg_pose_ms is None else 0.9 * self.avg_pose_ms + 0.1 * elapsed_ms
+
+                if keypoints is not None:
+                    self.cache[track.track_id] = (frame_idx, keypoints)
+                else:
+                    # Remember the attempt so the track does not stay at the top of the queue
+                    # (an older pose, if any, is kept until a new one is found)
+                    previous = self.cache.get(track.track_id)
+                    self.cache[track.track_id] = (frame_idx, previous[1] if previous is not None else None)
+
+        # Re-attach cached poses to the current boxes
+        for track in tracks:
+            self.last_seen[track.track_id] = frame_idx
+            cached = self.cache.get(track.track_id)
+            track.pose = None
+            if cached is not None and cached[1] is not None:
+                bx1, by1, bx2, by2 = self._padded_box(track.to_ltrb(), frame.shape)
+                kp = cached[1].copy()
+                kp[:, 0] = bx1 + kp[:, 0] * (bx2 - bx1)
+                kp[:, 1] = by1 + kp[:, 1] * (by2 - by1)
+                track.pose = kp
+
+        self._forget(frame_idx)
+        return tracks
+
+    def _forget(self, frame_idx):
+        stale = [tid for tid, seen in self.last_seen.items() if abs(frame_idx - seen) > self.forget_after]
+        for tid in stale:
+            self.last_seen.pop(tid, None)
+            self.cache.pop(tid, None)
+
+def draw_poses(frame, tracks, min_visibility=0.5):
+    """
+    Draws the cached skeleton of each track (if any).
+    """
+    for track in tracks:
+        kp = getattr(track, 'pose', None)
+        if kp is None:
+            continue
+        for a, b in POSE_CONNECTIONS:
+            if kp[a, 2] >= min_visibility and kp[b, 2] >= min_visibility:
+                cv2.line(frame, (int(kp[a, 0]), int(kp[a, 1])), (int(kp[b, 0]), int(kp[b, 1])), (255, 0, 255), 2)
+    return frame
@@ -0,0 +1,189 @@
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from src.checkpoint import source_fingerprint
+
+PROXY_VERSION = 1
+PROXY_MAGIC = b"VCVPROXY"
+HEADER_SIZE = 4096 # Magic + JSON header, zero padded; the frames start page aligned
+
+def get_proxy_path(video_path):
+    return video_path + ".proxy"
+
+def read_proxy_header(path):
+    """
+    Header of a proxy file as a dict, or None if the file is missing, not a proxy
+    or incomplete (the header is written last).
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(HEADER_SIZE)
+    except OSError:
+        return None
+    if not data.startswith(PROXY_MAGIC):
+        return None
+    try:
+        header = json.loads(data[len(PROXY_MAGIC):].rstrip(b"\0").decode("utf-8"))
+    except ValueError:
+        return None
+    if header.get("version") != PROXY_VERSION:
+        return None
+    return header
+
+def build_proxy(video_path, width=960, path=None):
+    """
+    Decodes the video once into a proxy file: a fixed-size header followed by every
+    frame, downscaled to 'width' (aspect kept, never upscaled), as raw uint8 BGR.
+
+    Frames are appended as they are decoded and the header goes in last, through a
+    temporary file renamed at the end, so an interrupted build never looks valid.
+    Returns the header, or None if the video cannot be opened.
+    """
+    path = path or get_proxy_path(video_path)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video {video_path}")
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    src_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    src_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    out_w = min(int(width), src_w)
+    scale = out_w / float(src_w)
+    out_h = int(round(src_h * scale))
+
+    t0 = time.perf_counter()
+    tmp_path = path + ".tmp"
+    count = 0
+    small = np.empty((out_h, out_w, 3), dtype=np.uint8)
+    with open(tmp_path, 'wb') as f:
+        f.write(b"\0" * HEADER_SIZE)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if frame.shape[:2] != (src_h, src_w):
+                print(f"Proxy: frame size changed at frame {count}, stopping there")
+                break
+            if scale == 1.0:
+                small = frame
+            else:
+                cv2.resize(frame, (out_w, out_h), dst=small, interpolation=cv2.INTER_AREA)
+            f.write(small.data)
+            count += 1
+
+        header = {
+            "version": PROXY_VERSION,
+            "fingerprint": list(source_fingerprint(video_path) or []),
+            "fps": fps,
+            "scale": scale,
+            "source_size": [src_w, src_h],
+            "shape": [count, out_h, out_w, 3]
+        }
+        encoded = PROXY_MAGIC + json.dumps(header).encode("utf-8")
+        if len(encoded) > HEADER_SIZE:
+            raise ValueError("Proxy header too large")
+        f.seek(0)
+        f.write(encoded)
+    cap.release()
+    os.replace(tmp_path, path)
+
+    elapsed = time.perf_counter() - t0
+    size_mb = count * out_h * out_w * 3 / 1e6
+    print(f"Proxy: {count} frames at {out_w}x{out_h} ({size_mb:.0f} MB) written to {path} in {elapsed:.1f} s")
+    return header
+
+class ProxyCapture:
+    """
+    cv2.VideoCapture look-alike over a proxy file (see build_proxy).
+
+    The frames are one read-only np.memmap, so read() returns a view straight into
+    the page cache: no decode and no copy, and CAP_PROP_POS_FRAMES seeks are free.
+    Pass an 'image' buffer to read() to get a copy instead. The frames are smaller
+    than the source by 'scale': image coordinates measured on them are divided by
+    it to get back to the original resolution (calibration, track log).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.header = read_proxy_header(path)
+        self.frames = None
+        self.pos = 0
+        if self.header is not None:
+            shape = tuple(self.header["shape"])
+            if shape[0] > 0:
+                self.frames = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER_SIZE, shape=shape)
+
+    @property
+    def scale(self):
+        return self.header["scale"] if self.header is not None else 1.0
+
+    @property
+    def frame_count(self):
+        return len(self.frames) if self.frames is not None else 0
+
+    def isOpened(self):
+        return self.frames is not None
+
+    def grab(self):
+        if self.pos >= self.frame_count:
+            return False
+        self.pos += 1
+        return True
+
+    def retrieve(self, image=None):
+        if self.frames is None or self.pos == 0:
+            return False, None
+        frame = self.frames[self.pos - 1]
+        if image is None:
+            return True, frame
+        np.copyto(image, frame)
+        return True, image
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def get(self, prop):
+        if self.header is None:
+            return 0.0
+        count, height, width = self.header["shape"][:3]
+        values = {
+            cv2.CAP_PROP_POS_FRAMES: self.pos,
+            cv2.CAP_PROP_FRAME_COUNT: count,
+            cv2.CAP_PROP_FPS: self.header["fps"],
+            cv2.CAP_PROP_FRAME_WIDTH: width,
+            cv2.CAP_PROP_FRAME_HEIGHT: height,
+        }
+        return float(values.get(prop, 0.0))
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES or self.frames is None:
+            return False
+        self.pos = int(min(max(0, value), self.frame_count))
+        return True
+
+    def release(self):
+        self.frames = None # Drops the mapping once no returned view references it
+
+def is_proxy_file(path):
+    return read_proxy_header(str(path)) is not None
+
+def open_proxy(video_path, width=960):
+    """
+    ProxyCapture for a video, building (or rebuilding) the proxy when it is missing,
+    was made from a different file (size/mtime fingerprint) or at another width.
+    """
+    path = get_proxy_path(video_path)
+    header = read_proxy_header(path)
+    src_w = header["source_size"][0] if header is not None else None
+    expected_w = min(int(width), src_w) if src_w else None
+    if header is None or header["fingerprint"] != list(source_fingerprint(video_path) or []) or \
+            header["shape"][2] != expected_w:
+        print(f"Building the decoded proxy of {video_path} (width {width})...")
+        if build_proxy(video_path, width, path) is None:
+            return None
+    return ProxyCapture(path)
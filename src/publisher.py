@@ -0,0 +1,321 @@
+import json
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from src.teams import TEAM_COLORS, DEFAULT_TRACK_COLOR
+from src.zones import COURT_WIDTH, COURT_LENGTH
+
+def encode_delta(sent, state, min_move=0.05, keyframe=False):
+    """
+    Delta message between what a client already has and the current state.
+
+    Args:
+        sent (dict): track_id -> (x, y, team) last sent to the client (updated in place).
+        state (dict): track_id -> (x, y, team) of the current frame.
+        min_move (float): Metres a player must move to be sent again.
+        keyframe (bool): Send every player (first message).
+
+    Returns:
+        dict: {"u": [[id, x_cm, y_cm, team], ...], "r": [id, ...]} (empty lists
+        omitted), or None if nothing changed.
+    """
+    updates = []
+    for tid, (x, y, team) in state.items():
+        old = sent.get(tid)
+        if keyframe or old is None or old[2] != team or abs(x - old[0]) > min_move or abs(y - old[1]) > min_move:
+            updates.append([tid, int(round(x * 100)), int(round(y * 100)), team])
+            sent[tid] = (x, y, team)
+    removed = [tid for tid in sent if tid not in state]
+    for tid in removed:
+        del sent[tid]
+
+    message = {}
+    if updates:
+        message["u"] = updates
+    if removed:
+        message["r"] = removed
+    return message or None
+
+class PositionPublisher:
+    """
+    Publishes the radar positions to any number of clients over HTTP (stdlib only).
+
+    - GET /stream: Server-Sent Events, one compact JSON message per update:
+      {"f": frame, "t": seconds, "u": [[id, x_cm, y_cm, team], ...], "r": [ids]}.
+      The first message ("k": 1) carries every player; the next ones only the
+      players that moved more than 'min_move' metres, changed team, appeared or left.
+      '?rate=N' lowers the client's rate (capped at 'max_rate' messages/s).
+    - GET /snapshot: the full current state as JSON.
+    - GET /: a small page that draws the radar in the browser (tablets courtside).
+
+    publish() only swaps the latest state and wakes the client threads, so its cost
+    does not grow with the number of clients' messages: each client thread waits,
+    applies its own rate limit, and encodes its delta against what it was last
+    sent. A slow client skips intermediate frames (latest state wins) instead of
+    holding back the processing loop.
+    """
+    def __init__(self, host="0.0.0.0", port=8765, max_rate=10.0, min_move=0.05, keepalive=15.0):
+        """
+        Args:
+            host (str): Interface to listen on.
+            port (int): TCP port (0 = any free port, see .port).
+            max_rate (float): Maximum messages per second per client.
+            min_move (float): Movement threshold of the delta encoding (metres).
+            keepalive (float): Seconds without updates after which a comment is sent.
+        """
+        self.max_rate = max_rate
+        self.min_move = min_move
+        self.keepalive = keepalive
+
+        self.cond = threading.Condition()
+        self.version = 0
+        self.snapshot = (0, -1, 0.0, {}) # (version, frame_idx, time, state)
+        self.running = True
+
+        self.stats_lock = threading.Lock()
+        self.clients = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+
+        self.server = ThreadingHTTPServer((host, port), _PublisherHandler)
+        self.server.daemon_threads = True
+        self.server.publisher = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="PositionPublisher", daemon=True)
+        self.thread.start()
+
+    def publish(self, frame_idx, time_s, tracks):
+        """
+        Makes the court positions of one frame the current state.
+        Tracks need 'court_xy' (others are ignored); 'team' is optional.
+        """
+        state = {}
+        for track in tracks:
+            court_xy = getattr(track, 'court_xy', None)
+            if court_xy is None:
+                continue
+            state[int(track.track_id)] = (float(court_xy[0]), float(court_xy[1]), getattr(track, 'team', None))
+        with self.cond:
+            self.version += 1
+            self.snapshot = (self.version, frame_idx, time_s, state)
+            self.cond.notify_all()
+
+    def wait_for_update(self, last_version, timeout):
+        """
+        Blocks until a state newer than 'last_version' is published (or timeout).
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != last_version or not self.running, timeout)
+            return self.snapshot
+
+    def _count(self, clients=0, messages=0, size=0):
+        with self.stats_lock:
+            self.clients += clients
+            self.messages_sent += messages
+            self.bytes_sent += size
+
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+class _PublisherHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass # No per-request logging on the console
+
+    def do_GET(self):
+        publisher = self.server.publisher
+        url = urlparse(self.path)
+        if url.path == "/stream":
+            self._stream(publisher, parse_qs(url.query))
+        elif url.path == "/snapshot":
+            _, frame_idx, time_s, state = publisher.snapshot
+            body = json.dumps({"f": frame_idx, "t": round(time_s, 3),
+                               "u": [[tid, int(round(x * 100)), int(round(y * 100)), team]
+                                     for tid, (x, y, team) in state.items()]}, separators=(",", ":")).encode()
+            self._send(200, "application/json", body)
+        elif url.path == "/":
+            self._send(200, "text/html; charset=utf-8", _radar_page().encode())
+        else:
+            self._send(404, "text/plain", b"Not found")
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, publisher, query):
+        try:
+            rate = min(publisher.max_rate, float(query.get("rate", [publisher.max_rate])[0]))
+        except ValueError:
+            rate = publisher.max_rate
+        interval = 1.0 / rate if rate > 0 else 0.0
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+
+        publisher._count(clients=1)
+        sent = {}
+        last_version = None
+        next_send = 0.0
+        last_write = time.monotonic()
+        try:
+            while publisher.running:
+                version, frame_idx, time_s, state = publisher.wait_for_update(last_version, publisher.keepalive)
+                now = time.monotonic()
+                if version == last_version:
+                    if now - last_write >= publisher.keepalive:
+                        self.wfile.write(b": ping\n\n")
+                        self.wfile.flush()
+                        last_write = now
+                    continue
+                if now < next_send:
+                    # Rate limit: sleep, then send the newest state (frames in between are merged)
+                    time.sleep(next_send - now)
+                    version, frame_idx, time_s, state = publisher.snapshot
+
+                keyframe = last_version is None
+                last_version = version
+                delta = encode_delta(sent, state, publisher.min_move, keyframe)
+                if delta is None and not keyframe:
+                    continue
+                message = {"f": frame_idx, "t": round(time_s, 3)}
+                if keyframe:
+                    message["k"] = 1
+                message.update(delta or {})
+                data = b"data: " + json.dumps(message, separators=(",", ":")).encode() + b"\n\n"
+                self.wfile.write(data)
+                self.wfile.flush()
+                publisher._count(messages=1, size=len(data))
+                last_write = next_send = time.monotonic()
+                next_send += interval
+        except (BrokenPipeError, ConnectionResetError):
+            pass # Client went away
+        finally:
+            publisher._count(clients=-1)
+
+def _css_color(bgr):
+    return f"rgb({bgr[2]},{bgr[1]},{bgr[0]})"
+
+def _radar_page():
+    colors = {str(team): _css_color(bgr) for team, bgr in TEAM_COLORS.items()}
+    return _PAGE.replace("%COLORS%", json.dumps(colors)).replace("%DEFAULT%", _css_color(DEFAULT_TRACK_COLOR)) \
+        .replace("%W%", str(COURT_WIDTH)).replace("%L%", str(COURT_LENGTH))
+
+_PAGE = """<!DOCTYPE html>
+<html><head><meta name="viewport" content="width=device-width, initial-scale=1"><title>Volley_CV Radar</title>
+<style>body{margin:0;background:#222;display:flex;justify-content:center}canvas{height:100vh}</style></head>
+<body><canvas id="c" width="520" height="880"></canvas><script>
+const W = %W%, L = %L%, M = 2, S = 40, colors = %COLORS%, players = new Map();
+const ctx = document.getElementById("c").getContext("2d");
+function draw() {
+  ctx.fillStyle = "#3c8c50"; ctx.fillRect(0, 0, 520, 880);
+  ctx.strokeStyle = "#fff"; ctx.lineWidth = 2; ctx.strokeRect(M * S, M * S, W * S, L * S);
+  for (const y of [L / 2 - 3, L / 2, L / 2 + 3]) { ctx.beginPath(); ctx.moveTo(M * S, (M + y) * S); ctx.lineTo((M + W) * S, (M + y) * S); ctx.stroke(); }
+  for (const [id, p] of players) {
+    ctx.fillStyle = colors[p[2]] || "%DEFAULT%";
+    ctx.beginPath(); ctx.arc((M + p[0] / 100) * S, (M + p[1] / 100) * S, 10, 0, 7); ctx.fill();
+    ctx.fillStyle = "#fff"; ctx.fillText(id, (M + p[0] / 100) * S + 12, (M + p[1] / 100) * S);
+  }
+}
+const source = new EventSource("stream" + location.search);
+source.onmessage = (e) => {
+  const m = JSON.parse(e.data);
+  if (m.k) players.clear();
+  for (const u of m.u || []) players.set(u[0], [u[1], u[2], u[3]]);
+  for (const id of m.r || []) players.delete(id);
+  draw();
+};
+draw();
+</script></body></html>
+"""
+
+def measure_fanout(clients=20, frames=300, players=12, fps=30.0, max_rate=10.0):
+    """
+    Test harness: publishes 'frames' synthetic frames at 'fps' to 'clients' local
+    SSE subscribers and reports the cost seen by the processing loop (publish()
+    time) and what the clients received.
+    """
+    from src.detectors import SyntheticBackend
+    from src.tracker import TrackWrapper
+
+    publisher = PositionPublisher("127.0.0.1", 0, max_rate=max_rate)
+    received = [[0, 0] for _ in range(clients)] # messages, bytes
+    stop = threading.Event()
+
+    def client(i):
+        sock = socket.create_connection(("127.0.0.1", publisher.port))
+        sock.sendall(b"GET /stream HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        sock.settimeout(0.5)
+        buffer = b""
+        while not stop.is_set():
+            try:
+                chunk = sock.recv(65536)
+            except socket.timeout:
+                continue
+            if not chunk:
+                break
+            buffer += chunk
+            *events, buffer = buffer.split(b"\n\n")
+            for event in events:
+                if event.startswith(b"data: "):
+                    received[i][0] += 1
+                    received[i][1] += len(event) + 2
+        sock.close()
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for t in threads:
+        t.start()
+    while publisher.clients < clients:
+        time.sleep(0.01)
+
+    backend = SyntheticBackend(players=players, fps=fps)
+    publish_times = []
+    full_size = 0
+    start = time.perf_counter()
+    for frame_idx in range(frames):
+        tracks = []
+        for tid, (x, y) in enumerate(backend.court_positions(frame_idx), start=1):
+            track = TrackWrapper(tid, [0, 0, 0, 0])
+            track.court_xy = (x, y)
+            track.team = tid % 2
+            tracks.append(track)
+        t0 = time.perf_counter()
+        publisher.publish(frame_idx, frame_idx / fps, tracks)
+        publish_times.append(time.perf_counter() - t0)
+        # Size of the same frame sent without delta encoding
+        full = {"f": frame_idx, "t": round(frame_idx / fps, 3), **encode_delta({}, publisher.snapshot[3], keyframe=True)}
+        full_size += len(b"data: " + json.dumps(full, separators=(",", ":")).encode()) + 2
+        # Real-time pacing, as a live run would publish
+        delay = start + (frame_idx + 1) / fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    time.sleep(0.5)
+    stop.set()
+    publisher.close()
+    for t in threads:
+        t.join(timeout=1.0)
+
+    messages = sum(r[0] for r in received)
+    size = sum(r[1] for r in received)
+    return {
+        "clients": clients,
+        "publish_ms_mean": 1000 * sum(publish_times) / len(publish_times),
+        "publish_ms_max": 1000 * max(publish_times),
+        "messages_per_client": messages / clients,
+        "bytes_per_client": size / clients,
+        "full_state_bytes_per_frame": full_size / frames,
+        "bytes_per_message": size / max(1, messages)
+    }
@@ -1,15 +1,20 @@
 import cv2
 import numpy as np
+from src.teams import TEAM_COLORS, DEFAULT_TRACK_COLOR
+from src.zones import ZoneMap
 
 class RadarView:
-    def __init__(self):
+    def __init__(self, pixels_per_meter=40, team_colors=None):
         # Configuration for the Radar View
         self.court_width_meters = 9
         self.court_length_meters = 18
         self.free_zone_meters = 2 # Margin around the court
         
         # Pixel scale (pixels per meter)
-        self.pixels_per_meter = 40 
+        self.pixels_per_meter = pixels_per_meter
+
+        # Player dot colours per team (DEFAULT_TRACK_COLOR if not assigned)
+        self.team_colors = team_colors if team_colors is not None else TEAM_COLORS
         
         # Calculate dimensions
         self.total_width_meters = self.court_width_meters + (2 * self.free_zone_meters)
@@ -40,16 +45,36 @@ class RadarView:
         self.mirror_lr = False
         # Mirror Button rect: x, y, w, h
         self.mirror_button_rect = (140, 10, 120, 30)
+
+        # Interactive buttons (disabled for rendered output, e.g. replay)
+        self.show_buttons = True
         
         # Cache for static court image
         self.static_court_img = None
 
+        # Precomputed rasters: zone labels and active-zone mask (radar pixels)
+        self.zone_map = None
+        self.active_mask = None
+
+        # Real bird's-eye view: video remapped under the court lines every N radar
+        # frames (0 = synthetic court only). Grids are cached per homography.
+        self.birdseye_every = 0
+        self.homography_key = None
+        self.remap_grids = None
+        self.remap_key = None
+        self.birdseye_img = None
+        self.birdseye_count = 0
+
+        # Lens distortion (src.distortion.LensDistortion); None = pinhole camera
+        self.lens = None
+
     def set_active_zone(self, zone):
         """
         Sets the active tracking zone.
         zone: 'all', 'left', 'right'
         """
         self.active_zone = zone
+        self.active_mask = None
 
     def set_orientation(self, orientation):
         """
@@ -57,11 +82,15 @@ class RadarView:
         orientation: 'vertical' or 'horizontal'
         """
         self.orientation = orientation
+        self.active_mask = None
         
     def draw_buttons(self, img):
         """
         Draws the interface buttons on the radar view.
         """
+        if not self.show_buttons:
+            return img
+
         # 1. Swap Sides Button
         x, y, w, h = self.button_rect
         color = (0, 255, 0) if self.invert_sides else (200, 200, 200)
@@ -152,14 +181,24 @@ class RadarView:
         self.static_court_img = radar_img
         return radar_img.copy()
 
+    def set_lens(self, lens):
+        """
+        Sets the lens distortion model; the homography is refitted on undistorted corners.
+        """
+        self.lens = lens
+        if self.homography_key is not None:
+            self.update_homography(self.homography_key[0])
+
     def update_homography(self, points):
         """
         Calculates and updates the homography matrix M based on the provided court points.
+        With a lens model, M maps undistorted image points to the radar.
         """
         if not points or len(points) < 4:
             return
 
-        src_pts = self._order_points(points[:4])
+        corners = points[:4] if self.lens is None else self.lens.undistort_points(points[:4])
+        src_pts = self._order_points(corners)
         
         # Define Corner Coordinates of the Radar Court (inside margins)
         # Standard Vertical Layout:
@@ -200,53 +239,152 @@ class RadarView:
 
         self.M = cv2.getPerspectiveTransform(src_pts, dst_pts)
 
-    def is_in_bounds(self, image_point):
+        # Recalibration: the cached grids depend on M
+        self.homography_key = ([tuple(pt) for pt in points], self.orientation)
+        self.remap_grids = None
+        self.birdseye_img = None
+
+    def image_to_radar(self, image_points):
         """
-        Checks if a point (x, y) in the original image space corresponds to a location
-        within the defined radar view (Court + Free Zone) AND matches the active zone.
+        Projects image points (N, 2) to radar pixel coordinates (N, 2) with the homography.
+        Display corrections (invert_sides, mirror_lr) are NOT applied.
         """
-        if self.M is None:
-            return True # If no calibration, assume everything is valid to avoid breaking tracking
+        pts = np.asarray(image_points, dtype="float32").reshape(-1, 1, 2)
+        if len(pts) == 0:
+            return np.zeros((0, 2), dtype="float32")
+        if self.lens is not None:
+            # Only the query points are undistorted, never the whole frame
+            pts = self.lens.undistort_points(pts).reshape(-1, 1, 2).astype("float32")
+        return cv2.perspectiveTransform(pts, self.M).reshape(-1, 2)
+
+    def radar_to_image(self, radar_points):
+        """
+        Projects radar pixel coordinates (N, 2) back to (distorted) image points (N, 2).
+        """
+        pts = np.asarray(radar_points, dtype="float32").reshape(-1, 1, 2)
+        image = cv2.perspectiveTransform(pts, np.linalg.inv(self.M)).reshape(-1, 2)
+        if self.lens is not None:
+            image = self.lens.distort_points(image)
+        return image
+
+    def image_to_court_matrix(self):
+        """
+        Homography from (undistorted) image points straight to court metres.
+        """
+        to_court = np.array([
+            [1.0 / self.pixels_per_meter, 0, -self.margin_x / self.pixels_per_meter],
+            [0, 1.0 / self.pixels_per_meter, -self.margin_y / self.pixels_per_meter],
+            [0, 0, 1]
+        ])
+        return to_court @ self.M
+
+    def radar_to_court(self, radar_points):
+        """
+        Converts radar pixel coordinates (N, 2) to court metres (N, 2).
+        Origin is the top-left court corner of the radar layout: x across the
+        9m width, y along the 18m length (the free zone is negative / beyond the lines).
+        """
+        pts = np.asarray(radar_points, dtype="float32").reshape(-1, 2)
+        origin = np.array([self.margin_x, self.margin_y], dtype="float32")
+        return (pts - origin) / self.pixels_per_meter
+
+    def court_to_radar(self, court_points):
+        """
+        Converts court metres (N, 2) back to radar pixel coordinates (N, 2).
+        """
+        pts = np.asarray(court_points, dtype="float32").reshape(-1, 2)
+        origin = np.array([self.margin_x, self.margin_y], dtype="float32")
+        return pts * self.pixels_per_meter + origin
+
+    def image_to_court(self, image_points):
+        """
+        Projects image points (N, 2) straight to court metres (N, 2).
+        """
+        return self.radar_to_court(self.image_to_radar(image_points))
+
+    def assign_court_positions(self, tracks):
+        """
+        Sets 'track.court_xy' (court metres of the feet point) on every track,
+        using one batched perspective transform for the whole frame.
+        """
+        if self.M is None or not tracks:
+            return tracks
+
+        feet = []
+        for track in tracks:
+            x1, y1, x2, y2 = track.to_ltrb()
+            feet.append([(x1 + x2) / 2, y2])
+
+        radar = self.image_to_radar(feet)
+        court = self.radar_to_court(radar)
+        zones = self.get_zone_map().lookup_radar(radar)
+        for track, xy, zone in zip(tracks, court, zones):
+            track.court_xy = (float(xy[0]), float(xy[1]))
+            track.zone = int(zone)
+        return tracks
+
+    def get_zone_map(self):
+        """
+        Zone label raster (positions 1-6 per side, service and free zone), built once.
+        """
+        if self.zone_map is None:
+            self.zone_map = ZoneMap(self)
+        return self.zone_map
+
+    def _build_active_mask(self):
+        """
+        Boolean raster of the radar pixels inside the active tracking zone.
+        """
+        mask = np.ones((self.img_height, self.img_width), dtype=bool)
+        # Pixel centres compared with the centre line, as in the original per-point test
+        centre_y = self.img_height / 2
+        centre_x = self.img_width / 2
+        rows = np.arange(self.img_height) + 0.5
+        cols = np.arange(self.img_width) + 0.5
 
-        x, y = image_point
-        
-        # Transform point
-        # cv2.perspectiveTransform expects shape (N, 1, 2)
-        pt = np.array([[[x, y]]], dtype="float32")
-        dst_pt = cv2.perspectiveTransform(pt, self.M)
-        
-        dx = dst_pt[0][0][0]
-        dy = dst_pt[0][0][1]
-        
-        # 1. Check Global Bounds (Radar Image Dimensions)
-        if not ((0 <= dx < self.img_width) and (0 <= dy < self.img_height)):
-            return False
-            
-        # 2. Check Active Zone
-        center_x = self.img_width / 2
-        center_y = self.img_height / 2
-        
         if self.orientation == 'horizontal':
-            # Sideline View Mapping
-            # Screen Left -> Radar Top (0 to H/2)
-            # Screen Right -> Radar Bottom (H/2 to H)
-            
+            # Sideline View Mapping: Screen Left -> Radar Top, Screen Right -> Radar Bottom
             if self.active_zone == 'left':
-                # User wants Left Half of Screen -> Keep Radar Top Half
-                if dy >= center_y: return False
+                mask[rows >= centre_y, :] = False
             elif self.active_zone == 'right':
-                # User wants Right Half of Screen -> Keep Radar Bottom Half
-                if dy <= center_y: return False
+                mask[rows <= centre_y, :] = False
         else:
             # Standard Vertical Mapping
             if self.active_zone == 'left':
-                if dx >= center_x:
-                    return False
+                mask[:, cols >= centre_x] = False
             elif self.active_zone == 'right':
-                if dx <= center_x:
-                    return False
-                
-        return True
+                mask[:, cols <= centre_x] = False
+        return mask
+
+    def in_bounds_mask(self, image_points):
+        """
+        Vectorized is_in_bounds for image points (N, 2): one projection and one
+        lookup in the precomputed active-zone raster.
+        """
+        pts = np.asarray(image_points, dtype="float32").reshape(-1, 2)
+        if self.M is None:
+            return np.ones(len(pts), dtype=bool)
+        if self.active_mask is None:
+            self.active_mask = self._build_active_mask()
+
+        radar = self.image_to_radar(pts)
+        with np.errstate(invalid='ignore'):
+            px = np.floor(radar[:, 0])
+            py = np.floor(radar[:, 1])
+            valid = (px >= 0) & (px < self.img_width) & (py >= 0) & (py < self.img_height)
+        result = np.zeros(len(pts), dtype=bool)
+        result[valid] = self.active_mask[py[valid].astype(np.int64), px[valid].astype(np.int64)]
+        return result
+
+    def is_in_bounds(self, image_point):
+        """
+        Checks if a point (x, y) in the original image space corresponds to a location
+        within the defined radar view (Court + Free Zone) AND matches the active zone.
+        """
+        if self.M is None:
+            return True # If no calibration, assume everything is valid to avoid breaking tracking
+
+        return bool(self.in_bounds_mask([image_point])[0])
 
     def get_radar_guide(self, phase_idx, point_idx):
         """
@@ -315,19 +453,54 @@ class RadarView:
 
     def get_warped_frame(self, frame, points):
         """
-        Generates a synthetic radar view of the court.
-        Calculates the homography matrix M for future tracking projections.
+        Generates the radar background: the synthetic court, or (birdseye_every > 0)
+        the frame remapped to a top-down view with the court lines drawn on top.
+        The homography is only recomputed when the points or the orientation change.
         """
         if not points or len(points) < 4:
             return None
 
         # 1. Calculate Homography Matrix (needed for future tracking)
-        self.update_homography(points)
+        if self.M is None or self.homography_key != ([tuple(pt) for pt in points], self.orientation):
+            self.update_homography(points)
         
         # 2. Create Synthetic Background
         radar_img = self._draw_static_court()
-        
-        return radar_img
+        if self.birdseye_every <= 0 or frame is None:
+            return radar_img
+
+        # 3. Real footage, refreshed every 'birdseye_every' radar frames
+        if self.birdseye_img is None or self.birdseye_count % self.birdseye_every == 0:
+            map1, map2 = self._get_remap_grids()
+            # Pixels that fall outside the frame keep the synthetic background
+            cv2.remap(frame, map1, map2, cv2.INTER_LINEAR, dst=radar_img, borderMode=cv2.BORDER_TRANSPARENT)
+            self.birdseye_img = self.draw_court_overlay(radar_img)
+        self.birdseye_count += 1
+        return self.birdseye_img.copy()
+
+    def _get_remap_grids(self):
+        """
+        Fixed-point remap grids (radar pixel -> source image pixel), computed once per
+        homography and display flip state with a single perspective transform.
+        """
+        key = (self.invert_sides, self.mirror_lr)
+        if self.remap_grids is not None and self.remap_key == key:
+            return self.remap_grids
+
+        ys, xs = np.mgrid[0:self.img_height, 0:self.img_width].astype("float32")
+        # Same display flips as the player dots
+        if self.invert_sides:
+            xs = self.img_width - xs
+            ys = self.img_height - ys
+        if self.mirror_lr:
+            xs = self.img_width - xs
+
+        # Lens distortion is folded into the grids: no per-frame undistort of the footage
+        src = self.radar_to_image(np.stack([xs, ys], axis=-1)).reshape(self.img_height, self.img_width, 2)
+        self.remap_grids = cv2.convertMaps(src[..., 0], src[..., 1], cv2.CV_16SC2)
+        self.remap_key = key
+        self.birdseye_img = None
+        return self.remap_grids
 
     def draw_court_overlay(self, img):
         """
@@ -380,14 +553,18 @@ class RadarView:
     def update_player_positions(self, radar_img, tracks):
         """
         Projects tracked players onto the radar view using the homography matrix.
+        Tracks that already carry court_xy (smoothed, or replayed from a track log)
+        are drawn from it, so no homography is needed for them.
         """
-        if self.M is None:
+        if self.M is None and not any(getattr(t, 'court_xy', None) is not None for t in tracks):
             return radar_img
 
         # Prepare points for transformation
         # We need a list of (x, y) coordinates representing the feet of each player
         points_to_transform = []
+        court_points = [] # Court metres if already computed (e.g. smoothed), else None
         track_ids = []
+        colors = []
 
         for track in tracks:
             if not track.is_confirmed():
@@ -401,7 +578,10 @@ class RadarView:
             feet_y = y2 
             
             points_to_transform.append([feet_x, feet_y])
+            court_points.append(getattr(track, 'court_xy', None))
             track_ids.append(track.track_id)
+            # Team colour, same neutral default as the video overlay if not assigned
+            colors.append(self.team_colors.get(getattr(track, 'team', None), DEFAULT_TRACK_COLOR))
 
         if not points_to_transform:
             # Even if no players, draw the buttons
@@ -411,8 +591,16 @@ class RadarView:
         # Format for cv2.perspectiveTransform: (N, 1, 2)
         src_pts_players = np.array(points_to_transform, dtype="float32").reshape(-1, 1, 2)
         
-        # Apply Homography
-        dst_pts_players = cv2.perspectiveTransform(src_pts_players, self.M)
+        # Apply Homography (off-radar placeholder for tracks without court_xy if uncalibrated)
+        if self.M is not None:
+            dst_pts_players = self.image_to_radar(src_pts_players).reshape(-1, 1, 2)
+        else:
+            dst_pts_players = np.full_like(src_pts_players, -1.0)
+
+        # Prefer court positions already attached to the tracks (e.g. smoothed trajectories)
+        for i, court_xy in enumerate(court_points):
+            if court_xy is not None:
+                dst_pts_players[i, 0] = self.court_to_radar([court_xy])[0]
 
         # Draw points on radar
         for i, pt in enumerate(dst_pts_players):
@@ -431,8 +619,8 @@ class RadarView:
             
             # Draw player ONLY if projected coordinates are within radar image bounds
             if (0 <= x < self.img_width and 0 <= y < self.img_height):
-                # Draw Player Position (Red Circle)
-                cv2.circle(radar_img, (x, y), 8, (0, 0, 255), -1)
+                # Draw Player Position (Team-coloured Circle)
+                cv2.circle(radar_img, (x, y), 8, colors[i], -1)
                 
                 # Draw Player ID
                 # Put text slightly above the dot
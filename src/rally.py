@@ -0,0 +1,270 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+class RallyDetector:
+    """
+    Labels each frame as 'in rally' or 'dead time' from cheap signals:
+    - frame differencing on a downscaled grayscale image, restricted to the court ROI
+    - aggregate player motion from the tracks (when available)
+    - optional ball presence
+    The combined score is smoothed and passed through a hysteresis, then the raw
+    labels are cleaned into a segment list (short gaps merged, short rallies dropped).
+    """
+    def __init__(self, fps=30.0, downscale_width=160, pixel_threshold=20,
+                 enter_threshold=0.04, exit_threshold=0.02, smoothing=0.2,
+                 min_rally_seconds=3.0, min_gap_seconds=2.0, pre_roll_seconds=1.0):
+        """
+        Args:
+            fps (float): Source frame rate, used to convert seconds to frames.
+            downscale_width (int): Width of the grayscale image used for differencing.
+            pixel_threshold (int): Gray-level change that counts a pixel as moving.
+            enter_threshold (float): Smoothed score above which a rally starts.
+            exit_threshold (float): Smoothed score below which a rally ends.
+            smoothing (float): EMA factor for the motion score (0..1, higher = faster).
+            min_rally_seconds (float): Segments shorter than this are discarded.
+            min_gap_seconds (float): Gaps shorter than this are merged into the rally.
+            pre_roll_seconds (float): Offline padding before each segment (the serve).
+        """
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.downscale_width = downscale_width
+        self.pixel_threshold = pixel_threshold
+        self.enter_threshold = enter_threshold
+        self.exit_threshold = exit_threshold
+        self.smoothing = smoothing
+        self.min_rally_frames = int(min_rally_seconds * self.fps)
+        self.min_gap_frames = int(min_gap_seconds * self.fps)
+        self.pre_roll_frames = int(pre_roll_seconds * self.fps)
+
+        # Court ROI (in image coordinates) and its downscaled mask
+        self.roi_polygon = None
+        self.roi_mask = None
+        self.roi_area = 0
+
+        # Running state
+        self.prev_gray = None
+        self.prev_feet = {}
+        self.score = 0.0
+        self.in_rally = False
+
+        # One byte per processed frame: 1 = rally, 0 = dead time
+        self.labels = bytearray()
+
+    def set_court_roi(self, radar_view):
+        """
+        Restricts differencing to the court + free zone, back-projected from the radar.
+        Without a homography the whole frame is used.
+        """
+        if radar_view.M is None:
+            self.roi_polygon = None
+        else:
+            radar_corners = np.array([[
+                [0, 0],
+                [radar_view.img_width, 0],
+                [radar_view.img_width, radar_view.img_height],
+                [0, radar_view.img_height]
+            ]], dtype="float32")
+            self.roi_polygon = radar_view.radar_to_image(radar_corners[0])
+        self.roi_mask = None
+        self.prev_gray = None
+
+    def _downscale(self, frame):
+        """
+        Converts a frame to the small grayscale image used for differencing.
+        """
+        h, w = frame.shape[:2]
+        scale = self.downscale_width / float(w)
+        small = cv2.resize(frame, (self.downscale_width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        if self.roi_mask is None or self.roi_mask.shape != gray.shape:
+            self.roi_mask = np.zeros(gray.shape, dtype=np.uint8)
+            if self.roi_polygon is not None:
+                poly = np.round(self.roi_polygon * scale).astype(np.int32)
+                cv2.fillPoly(self.roi_mask, [poly], 255)
+            else:
+                self.roi_mask[:] = 255
+            self.roi_area = max(1, cv2.countNonZero(self.roi_mask))
+
+        return gray
+
+    def frame_motion(self, frame):
+        """
+        Fraction of court ROI pixels that changed since the previous frame.
+        """
+        gray = self._downscale(frame)
+        if self.prev_gray is None:
+            self.prev_gray = gray
+            return 0.0
+
+        diff = cv2.absdiff(gray, self.prev_gray)
+        self.prev_gray = gray
+        _, moving = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        moving = cv2.bitwise_and(moving, self.roi_mask)
+        return cv2.countNonZero(moving) / self.roi_area
+
+    def track_motion(self, tracks):
+        """
+        Mean feet displacement of the tracks seen in the previous frame,
+        normalized by each box height (so near and far players weigh the same).
+        """
+        feet = {}
+        speeds = []
+        for track in tracks:
+            x1, y1, x2, y2 = track.to_ltrb()
+            fx, fy = (x1 + x2) / 2, y2
+            feet[track.track_id] = (fx, fy)
+            prev = self.prev_feet.get(track.track_id)
+            if prev is not None:
+                height = max(1.0, y2 - y1)
+                speeds.append(np.hypot(fx - prev[0], fy - prev[1]) / height)
+        self.prev_feet = feet
+        return float(np.mean(speeds)) if speeds else 0.0
+
+    def update(self, frame_idx, frame=None, tracks=None, ball_present=None):
+        """
+        Feeds one frame of signals and returns True if the frame is inside a rally.
+        Any signal may be omitted; frames skipped between calls inherit the current label.
+        """
+        score = 0.0
+        if frame is not None:
+            score += self.frame_motion(frame)
+        if tracks is not None:
+            score += self.track_motion(tracks)
+        if ball_present:
+            score += self.enter_threshold
+
+        self.score = (1 - self.smoothing) * self.score + self.smoothing * score
+
+        # Hysteresis between entering and leaving a rally
+        if self.in_rally:
+            if self.score < self.exit_threshold:
+                self.in_rally = False
+        elif self.score > self.enter_threshold:
+            self.in_rally = True
+
+        # Fill labels up to this frame (supports strided calls)
+        if frame_idx >= len(self.labels):
+            self.labels.extend([int(self.in_rally)] * (frame_idx + 1 - len(self.labels)))
+        else:
+            self.labels[frame_idx] = int(self.in_rally)
+
+        return self.in_rally
+
+    def segments(self):
+        """
+        Cleans the raw labels and returns a list of (start_frame, end_frame) rallies,
+        end inclusive.
+        """
+        return labels_to_segments(np.frombuffer(bytes(self.labels), dtype=np.uint8),
+                                  self.min_rally_frames, self.min_gap_frames, self.pre_roll_frames)
+
+def labels_to_segments(labels, min_rally_frames=0, min_gap_frames=0, pre_roll_frames=0):
+    """
+    Turns a per-frame 0/1 label array into a list of (start, end) segments, end inclusive.
+    Gaps shorter than min_gap_frames are merged, segments shorter than min_rally_frames
+    are dropped and each kept segment is extended backwards by pre_roll_frames.
+    """
+    if len(labels) == 0:
+        return []
+
+    padded = np.concatenate(([0], np.asarray(labels, dtype=np.int8) > 0, [0])).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+
+    if len(starts) == 0:
+        return []
+
+    # 1. Merge short gaps
+    keep_break = (starts[1:] - ends[:-1] - 1) >= min_gap_frames
+    starts = np.concatenate(([starts[0]], starts[1:][keep_break]))
+    ends = np.concatenate((ends[:-1][keep_break], [ends[-1]]))
+
+    # 2. Drop short segments
+    long_enough = (ends - starts + 1) >= min_rally_frames
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    # 3. Pre-roll (the serve starts before motion peaks)
+    starts = np.maximum(0, starts - pre_roll_frames)
+
+    return [(int(s), int(e)) for s, e in zip(starts, ends)]
+
+def segments_to_labels(segments, num_frames):
+    """
+    Expands a segment list back into a per-frame boolean array.
+    """
+    labels = np.zeros(num_frames, dtype=bool)
+    for start, end in segments:
+        labels[start:end + 1] = True
+    return labels
+
+def get_segments_path(video_path):
+    return video_path + ".rallies.json"
+
+def save_segments(video_path, segments, fps):
+    """
+    Saves the rally segments next to the video (same convention as the calibration file).
+    """
+    path = get_segments_path(video_path)
+    try:
+        with open(path, 'w') as f:
+            json.dump({"fps": fps, "segments": segments}, f, indent=4)
+        print(f"Rally segments saved to {path}")
+    except Exception as e:
+        print(f"Error saving rally segments: {e}")
+
+def load_segments(video_path):
+    """
+    Loads the rally segments saved for a video. Returns a list of (start, end) or None.
+    """
+    path = get_segments_path(video_path)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            return [tuple(s) for s in data["segments"]]
+        except Exception as e:
+            print(f"Error loading rally segments: {e}")
+    return None
+
+def scan_video(video_path, radar_view=None, stride=2, **detector_kwargs):
+    """
+    Cheap offline pre-pass: runs only frame differencing (no detector) over the
+    whole video and returns the rally segments.
+
+    Args:
+        video_path (str): Input video.
+        radar_view (RadarView): Calibrated radar, used to restrict motion to the court.
+        stride (int): Decode one frame every 'stride' (skipped frames are only grabbed).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video {video_path}")
+        return []
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    rally = RallyDetector(fps=fps, **detector_kwargs)
+    if radar_view is not None:
+        rally.set_court_roi(radar_view)
+
+    frame_idx = 0
+    while True:
+        if frame_idx % stride == 0:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            rally.update(frame_idx, frame=frame)
+        elif not cap.grab():
+            break
+        frame_idx += 1
+
+    cap.release()
+
+    # Strided calls leave the tail unfilled
+    if frame_idx > len(rally.labels):
+        rally.labels.extend([int(rally.in_rally)] * (frame_idx - len(rally.labels)))
+
+    return rally.segments()
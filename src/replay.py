@@ -0,0 +1,192 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+
+import cv2
+import numpy as np
+
+from src.radar import RadarView
+from src.tracker import TrackWrapper
+from src.track_log import NO_TEAM
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+class RadarReplay:
+    """
+    Renders the radar from a stored track log: no video decode, no inference.
+
+    Positions come from the court_x/court_y columns, so display settings
+    (invert_sides, mirror_lr, pixels_per_meter, team colours) can be changed and the
+    radar re-rendered at a fraction of the cost of a full run. Frames without log
+    rows (e.g. dead time with --rally-stride) keep the last positions for up to
+    'max_hold' frames, as the live radar does.
+    """
+    def __init__(self, log, fps, pixels_per_meter=40, invert_sides=False, mirror_lr=False,
+                 team_colors=None, max_hold=None):
+        """
+        Args:
+            log (np.ndarray): Track log with court positions (TRACK_LOG_DTYPE).
+            fps (float): Source frame rate (output video rate).
+            pixels_per_meter (int): Radar scale.
+            invert_sides (bool): Swap the two halves (180 degree rotation).
+            mirror_lr (bool): Mirror left-right.
+            team_colors (dict): Team -> BGR colour (TEAM_COLORS if None).
+            max_hold (int): Frames a logged position is held (default: 1 second).
+        """
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.max_hold = max_hold if max_hold is not None else int(self.fps)
+
+        log = log[np.isfinite(log["court_x"]) & np.isfinite(log["court_y"])]
+        self.log = log[np.argsort(log["frame"], kind="stable")]
+        self.logged_frames, self.starts = np.unique(self.log["frame"], return_index=True)
+        self.ends = np.r_[self.starts[1:], len(self.log)]
+
+        self.radar_view = RadarView(pixels_per_meter=pixels_per_meter, team_colors=team_colors)
+        self.radar_view.invert_sides = invert_sides
+        self.radar_view.mirror_lr = mirror_lr
+        self.radar_view.show_buttons = False
+
+    @property
+    def frame_range(self):
+        """
+        (first, last) frame covered by the log, or None if it is empty.
+        """
+        if len(self.logged_frames) == 0:
+            return None
+        return int(self.logged_frames[0]), int(self.logged_frames[-1])
+
+    def tracks_at(self, frame_idx):
+        """
+        Track objects (TrackWrapper with court_xy and team) to draw at a frame.
+        """
+        i = self._source_index(frame_idx)
+        if i < 0:
+            return []
+        tracks = []
+        for row in self.log[self.starts[i]:self.ends[i]]:
+            track = TrackWrapper(row["track_id"], [row["x1"], row["y1"], row["x2"], row["y2"]], row["conf"])
+            track.court_xy = (float(row["court_x"]), float(row["court_y"]))
+            track.team = None if row["team"] == NO_TEAM else int(row["team"])
+            tracks.append(track)
+        return tracks
+
+    def _source_index(self, frame_idx):
+        # Index of the logged frame drawn at frame_idx (-1 = nothing to draw)
+        i = np.searchsorted(self.logged_frames, frame_idx, side="right") - 1
+        if i < 0 or frame_idx - self.logged_frames[i] > self.max_hold:
+            return -1
+        return i
+
+    def render(self, frame_idx):
+        radar_img = self.radar_view._draw_static_court()
+        return self.radar_view.update_player_positions(radar_img, self.tracks_at(frame_idx))
+
+    def render_range(self, output, start, end):
+        """
+        Renders frames [start, end) to a video file or an image directory.
+        """
+        writer = None
+        if output.lower().endswith(VIDEO_EXTENSIONS):
+            size = (self.radar_view.img_width, self.radar_view.img_height)
+            writer = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, size)
+        else:
+            os.makedirs(output, exist_ok=True)
+
+        img = None
+        last_source = None
+        for frame_idx in range(start, end):
+            # Held frames show the same positions: reuse the last image
+            source = self._source_index(frame_idx)
+            if img is None or source != last_source:
+                img = self.render(frame_idx)
+                last_source = source
+            if writer is not None:
+                writer.write(img)
+            else:
+                # RLE suits the flat-colour radar and encodes faster than the default
+                cv2.imwrite(os.path.join(output, f"radar_{frame_idx:06d}.png"), img,
+                            [cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_RLE])
+
+        if writer is not None:
+            writer.release()
+        return end - start
+
+def _render_chunk(args):
+    """
+    Worker entry point (top level so it can be pickled by multiprocessing).
+    """
+    log, fps, options, output, start, end = args
+    return RadarReplay(log, fps, **options).render_range(output, start, end)
+
+def render_replay(log, fps, output, workers=1, start=None, end=None, **options):
+    """
+    Renders the radar for a whole track log (or frames [start, end)).
+
+    With workers > 1 the frame range is split into contiguous chunks rendered by
+    separate processes. Image sequences are written directly by the workers; for a
+    video each worker writes a part file and the parts are joined in order by
+    ffmpeg stream copy (without ffmpeg on the PATH a video is rendered in one
+    process). Returns the number of rendered frames.
+    """
+    replay = RadarReplay(log, fps, **options)
+    if replay.frame_range is None:
+        print("Replay: the track log has no court positions.")
+        return 0
+    first, last = replay.frame_range
+    start = first if start is None else start
+    end = last + 1 if end is None else end
+
+    is_video = output.lower().endswith(VIDEO_EXTENSIONS)
+    if workers > 1 and is_video and shutil.which("ffmpeg") is None:
+        # Without ffmpeg the parts could only be joined by decoding and re-encoding
+        # them, which costs more than the parallel rendering saves
+        print("Replay: ffmpeg not found, rendering the video in one process "
+              "(--replay-workers still applies to image directories).")
+        workers = 1
+
+    t0 = time.perf_counter()
+    if workers <= 1 or end - start < 2 * workers:
+        count = replay.render_range(output, start, end)
+    else:
+        bounds = np.linspace(start, end, workers + 1).astype(int)
+        root, ext = os.path.splitext(output)
+        part_outputs = [f"{root}.part{i}{ext}" if is_video else output for i in range(workers)]
+
+        # Each worker only receives the rows it can draw (its chunk plus the hold window)
+        jobs = []
+        for i in range(workers):
+            lo, hi = bounds[i], bounds[i + 1]
+            rows = replay.log[(replay.log["frame"] >= lo - replay.max_hold) & (replay.log["frame"] < hi)]
+            jobs.append((rows, replay.fps, options, part_outputs[i], lo, hi))
+
+        with multiprocessing.Pool(workers) as pool:
+            count = sum(pool.map(_render_chunk, jobs))
+
+        if is_video:
+            _join_videos(part_outputs, output)
+
+    elapsed = time.perf_counter() - t0
+    print(f"Replay: {count} frames rendered to {output} in {elapsed:.1f} s "
+          f"({count / max(elapsed, 1e-9) / replay.fps:.0f}x real time)")
+    return count
+
+def _join_videos(parts, output):
+    """
+    Concatenates the part videos (same size and codec) into 'output' with ffmpeg's
+    concat demuxer and stream copy (no decode, no second lossy encode), then removes them.
+    """
+    list_path = output + ".parts.txt"
+    with open(list_path, 'w') as f:
+        for part in parts:
+            # Paths are quoted for the concat demuxer (single quotes escaped)
+            f.write("file '{}'\n".format(os.path.abspath(part).replace("'", "'\\''")))
+    try:
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                        "-i", list_path, "-c", "copy", output], check=True)
+    finally:
+        os.remove(list_path)
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
@@ -0,0 +1,106 @@
+# Degradation ladder, from full quality (level 0) down.
+# Order: detection stride, inference size, optional stages (Hough lines, pose), radar rate.
+QUALITY_LEVELS = [
+    {"detect_stride": 1, "imgsz": 640, "optional_stages": True, "radar_every": 1},
+    {"detect_stride": 2, "imgsz": 640, "optional_stages": True, "radar_every": 1},
+    {"detect_stride": 3, "imgsz": 640, "optional_stages": True, "radar_every": 1},
+    {"detect_stride": 3, "imgsz": 480, "optional_stages": True, "radar_every": 1},
+    {"detect_stride": 3, "imgsz": 320, "optional_stages": True, "radar_every": 1},
+    {"detect_stride": 3, "imgsz": 320, "optional_stages": False, "radar_every": 1},
+    {"detect_stride": 3, "imgsz": 320, "optional_stages": False, "radar_every": 2},
+    {"detect_stride": 3, "imgsz": 320, "optional_stages": False, "radar_every": 4},
+]
+
+class QualityScheduler:
+    """
+    Holds a target frame rate by trading quality for time.
+
+    The per-frame processing time is tracked with an EMA and compared to the
+    frame deadline (1 / target_fps). Sustained overload steps one level down the
+    QUALITY_LEVELS ladder; sustained headroom steps one level back up. A cooldown
+    after each change lets the EMA settle on the new level before deciding again.
+    """
+    # Settings used when the scheduler is disabled
+    FULL_QUALITY = QUALITY_LEVELS[0]
+
+    def __init__(self, target_fps, levels=None, smoothing=0.1, headroom=0.7,
+                 down_after=5, up_after=60, cooldown=30):
+        """
+        Args:
+            target_fps (float): Frame rate to hold (usually the source fps).
+            levels (list): Quality ladder (QUALITY_LEVELS if None).
+            smoothing (float): EMA factor for the frame time.
+            headroom (float): Step up only if the EMA is below headroom * deadline.
+            down_after (int): Consecutive overloaded frames before stepping down.
+            up_after (int): Consecutive frames with headroom before stepping up.
+            cooldown (int): Frames after a change during which no new change happens.
+        """
+        self.deadline = 1.0 / target_fps if target_fps and target_fps > 0 else 1.0 / 30
+        self.levels = levels if levels is not None else QUALITY_LEVELS
+        self.smoothing = smoothing
+        self.headroom = headroom
+        self.down_after = down_after
+        self.up_after = up_after
+        self.cooldown = cooldown
+
+        self.level = 0
+        self.ema = None
+        self.over = 0
+        self.under = 0
+        self.hold = 0
+        self.frame_count = 0
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def record(self, frame_time):
+        """
+        Feeds the processing time (seconds) of the last frame and adapts the level.
+        Returns True if the level changed.
+        """
+        self.frame_count += 1
+        self.ema = frame_time if self.ema is None else (1 - self.smoothing) * self.ema + self.smoothing * frame_time
+
+        if self.hold > 0:
+            self.hold -= 1
+            return False
+
+        if self.ema > self.deadline:
+            self.over += 1
+            self.under = 0
+        elif self.ema < self.headroom * self.deadline:
+            self.under += 1
+            self.over = 0
+        else:
+            self.over = self.under = 0
+
+        if self.over >= self.down_after and self.level < len(self.levels) - 1:
+            self._set_level(self.level + 1)
+            return True
+        if self.under >= self.up_after and self.level > 0:
+            self._set_level(self.level - 1)
+            return True
+        return False
+
+    def _set_level(self, level):
+        self.level = level
+        self.over = self.under = 0
+        self.hold = self.cooldown
+
+    def should_detect(self):
+        """
+        True if detection should run on the current frame (call before record()).
+        """
+        return self.frame_count % self.settings["detect_stride"] == 0
+
+    def should_render_radar(self):
+        return self.frame_count % self.settings["radar_every"] == 0
+
+    def hud_text(self):
+        s = self.settings
+        fps = 1.0 / self.ema if self.ema else 0.0
+        return (f"Quality L{self.level}: stride {s['detect_stride']}, {s['imgsz']}px"
+                f"{'' if s['optional_stages'] else ', no extras'}"
+                f"{'' if s['radar_every'] == 1 else ', radar 1/' + str(s['radar_every'])}"
+                f" ({fps:.0f} fps)")
@@ -0,0 +1,150 @@
+import cv2
+import numpy as np
+
+from src.zones import COURT_WIDTH, COURT_LENGTH, NET_Y, ATTACK_LINE
+
+# Court lines (court metres) whose image must show up as edges in the main shot
+COURT_LINES = [((0, 0), (0, COURT_LENGTH)), ((COURT_WIDTH, 0), (COURT_WIDTH, COURT_LENGTH))] + \
+              [((0, y), (COURT_WIDTH, y)) for y in (0, NET_Y - ATTACK_LINE, NET_Y, NET_Y + ATTACK_LINE, COURT_LENGTH)]
+
+class ShotDetector:
+    """
+    Tells the calibrated main camera apart from everything else a broadcast cuts to
+    (close-ups, replays, graphics), so inference and radar updates can be skipped.
+
+    Works on a small downscaled copy of each frame:
+    - shot boundaries: colour histogram distance between consecutive frames
+    - shot class, decided at each boundary and re-checked every 'recheck' frames
+      (dissolves and slow wipes have no sharp boundary):
+      * line score: fraction of the calibrated court lines that lie on image edges,
+        relative to the score of the reference (main camera) frame
+      * colour: histogram distance to the reference, which follows slow lighting
+        changes while the main shot is on screen
+    Between checks the shot keeps its class, so a player covering a line does not
+    make the label flicker.
+    """
+    def __init__(self, downscale_width=160, cut_threshold=0.35, line_ratio=0.5,
+                 max_reference_distance=0.45, recheck=30, reference_rate=0.02):
+        """
+        Args:
+            downscale_width (int): Width of the analysis image.
+            cut_threshold (float): Histogram distance between consecutive frames that marks a cut.
+            line_ratio (float): Minimum line score, relative to the reference frame's.
+            max_reference_distance (float): Maximum histogram distance to the reference.
+            recheck (int): Frames between re-classifications inside a shot.
+            reference_rate (float): EMA factor of the reference histogram in the main shot.
+        """
+        self.downscale_width = downscale_width
+        self.cut_threshold = cut_threshold
+        self.line_ratio = line_ratio
+        self.max_reference_distance = max_reference_distance
+        self.recheck = recheck
+        self.reference_rate = reference_rate
+
+        # Court line template (image coordinates) and its downscaled sample points
+        self.line_points = None
+        self.sample_points = None
+
+        self.reference_hist = None
+        self.reference_score = None
+
+        # Running state
+        self.prev_hist = None
+        self.is_main = True
+        self.cut = False       # Shot boundary on the last frame
+        self.returned = False  # Main shot back on the last frame (after another shot)
+        self.last_check = None
+        self.frames_seen = 0
+        self.frames_skipped = 0
+
+    def set_court_lines(self, radar_view):
+        """
+        Samples the court lines and projects them into the image (distorted, like the
+        frame). Without a homography the detector only relies on colour.
+        """
+        self.line_points = None
+        self.sample_points = None
+        if radar_view.M is None:
+            return
+        samples = []
+        for (x0, y0), (x1, y1) in COURT_LINES:
+            t = np.linspace(0, 1, 40)[:, None]
+            samples.append(np.array([x0, y0]) + t * np.array([x1 - x0, y1 - y0]))
+        court = np.vstack(samples)
+        self.line_points = radar_view.radar_to_image(radar_view.court_to_radar(court))
+        self.reference_score = None
+
+    def _downscale(self, frame):
+        h, w = frame.shape[:2]
+        scale = self.downscale_width / float(w)
+        small = cv2.resize(frame, (self.downscale_width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        if self.line_points is not None and self.sample_points is None:
+            pts = np.round(self.line_points * scale).astype(np.int64)
+            inside = (pts[:, 0] >= 0) & (pts[:, 0] < small.shape[1]) & (pts[:, 1] >= 0) & (pts[:, 1] < small.shape[0])
+            self.sample_points = pts[inside]
+        return small
+
+    @staticmethod
+    def _histogram(small):
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, [16, 8], [0, 180, 0, 256])
+        return cv2.normalize(hist, hist).astype(np.float32)
+
+    def line_score(self, small):
+        """
+        Fraction of court line samples that fall on (dilated) edges.
+        """
+        if self.sample_points is None or len(self.sample_points) == 0:
+            return None
+        edges = cv2.Canny(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), 50, 150)
+        edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+        return float(np.count_nonzero(edges[self.sample_points[:, 1], self.sample_points[:, 0]])) / len(self.sample_points)
+
+    def set_reference(self, frame):
+        """
+        Uses a frame of the main camera (e.g. the calibration frame) as reference.
+        """
+        small = self._downscale(frame)
+        self.reference_hist = self._histogram(small)
+        self.reference_score = self.line_score(small)
+
+    def _classify(self, small, hist):
+        distance = cv2.compareHist(self.reference_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+        if distance > self.max_reference_distance:
+            return False
+        score = self.line_score(small)
+        if score is None or not self.reference_score:
+            return True
+        return score >= self.line_ratio * self.reference_score
+
+    def update(self, frame_idx, frame):
+        """
+        Processes one frame. Returns True while the main camera is on screen.
+        """
+        small = self._downscale(frame)
+        hist = self._histogram(small)
+        if self.reference_hist is None:
+            # No reference given: the first frame is taken as the main camera
+            self.reference_hist = hist.copy()
+            self.reference_score = self.line_score(small)
+
+        self.cut = self.prev_hist is not None and \
+            cv2.compareHist(self.prev_hist, hist, cv2.HISTCMP_BHATTACHARYYA) > self.cut_threshold
+        self.prev_hist = hist
+
+        was_main = self.is_main
+        if self.cut or self.last_check is None or frame_idx - self.last_check >= self.recheck or frame_idx < self.last_check:
+            self.is_main = self._classify(small, hist)
+            self.last_check = frame_idx
+        self.returned = self.is_main and not was_main
+
+        if self.is_main:
+            cv2.accumulateWeighted(hist, self.reference_hist, self.reference_rate)
+        else:
+            self.frames_skipped += 1
+        self.frames_seen += 1
+        return self.is_main
+
+    def summary(self):
+        share = self.frames_skipped / max(1, self.frames_seen)
+        return f"{self.frames_skipped}/{self.frames_seen} frames outside the main shot ({share:.0%})"
@@ -0,0 +1,291 @@
+from collections import deque
+
+import numpy as np
+
+# Constant-velocity model: state [x, y, vx, vy] in court metres, measurement [x, y]
+STATE_DIM = 4
+
+def _transition(dt):
+    F = np.eye(STATE_DIM)
+    F[0, 2] = dt
+    F[1, 3] = dt
+    return F
+
+def _process_noise(dt, accel_std):
+    """
+    White-noise acceleration model (same for both axes).
+    """
+    q = accel_std ** 2
+    Q = np.zeros((STATE_DIM, STATE_DIM))
+    Q[0, 0] = Q[1, 1] = q * dt ** 4 / 4
+    Q[0, 2] = Q[2, 0] = Q[1, 3] = Q[3, 1] = q * dt ** 3 / 2
+    Q[2, 2] = Q[3, 3] = q * dt ** 2
+    return Q
+
+def _predict(x, P, F, Q):
+    """
+    Batched Kalman prediction. x: (N, 4), P: (N, 4, 4).
+    """
+    x = x @ F.T
+    P = F @ P @ F.T + Q
+    return x, P
+
+def _update(x, P, z, R, mask):
+    """
+    Batched Kalman update for the rows where mask is True.
+    z: (N, 2) measurements, R: (N,) isotropic measurement variances.
+    """
+    if not mask.any():
+        return x, P
+
+    x = x.copy()
+    P = P.copy()
+    xm, Pm = x[mask], P[mask]
+
+    S = Pm[:, :2, :2] + R[mask, None, None] * np.eye(2)
+    K = Pm[:, :, :2] @ np.linalg.inv(S)             # (M, 4, 2)
+    innovation = z[mask] - xm[:, :2]
+    x[mask] = xm + (K @ innovation[:, :, None])[:, :, 0]
+    P[mask] = Pm - K @ Pm[:, :2, :]
+    return x, P
+
+def _rts_step(xf, Pf, xp_next, Pp_next, xs_next, Ps_next, F):
+    """
+    One batched Rauch-Tung-Striebel backward step.
+    """
+    C = Pf @ F.T @ np.linalg.inv(Pp_next)
+    xs = xf + (C @ (xs_next - xp_next)[:, :, None])[:, :, 0]
+    Ps = Pf + C @ (Ps_next - Pp_next) @ np.transpose(C, (0, 2, 1))
+    return xs, Ps
+
+def _measurement_variance(heights, meas_std, ref_height):
+    """
+    Far players have small boxes and a larger metres-per-pixel error, so the
+    measurement variance grows with (ref_height / box_height)^2.
+    """
+    heights = np.maximum(np.asarray(heights, dtype=np.float64), 1.0)
+    return (meas_std ** 2) * (ref_height / heights) ** 2
+
+class TrajectorySmoother:
+    """
+    Live fixed-lag smoother of court positions.
+
+    All tracks live in slots of shared state arrays, so each frame is one batched
+    predict/update (no per-track filter objects). The last 'lag' frames of filter
+    history are kept and an RTS pass over that window yields the smoothed position
+    of the frame 'lag' frames ago. With lag=0 the output is the filtered estimate.
+    """
+    def __init__(self, fps=30.0, lag=5, accel_std=3.0, meas_std=0.15, ref_height=200.0,
+                 max_missing=15, initial_capacity=32):
+        """
+        Args:
+            fps (float): Source frame rate.
+            lag (int): Output delay in frames (0 = filter only).
+            accel_std (float): Process noise, player acceleration in m/s^2.
+            meas_std (float): Feet measurement noise in metres for a box of ref_height pixels.
+            ref_height (float): Box height (pixels) at which meas_std applies.
+            max_missing (int): Frames without a detection after which a slot is freed.
+            initial_capacity (int): Initial number of slots (grows as needed).
+        """
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.lag = lag
+        self.accel_std = accel_std
+        self.meas_std = meas_std
+        self.ref_height = ref_height
+        self.max_missing = max_missing
+
+        self.x = np.zeros((initial_capacity, STATE_DIM))
+        self.P = np.tile(np.eye(STATE_DIM), (initial_capacity, 1, 1))
+        self.slot_of = {}          # track_id -> slot
+        self.last_seen = {}        # track_id -> frame index
+        self.free_slots = list(range(initial_capacity - 1, -1, -1))
+        self.quarantine = deque()  # (frame_idx, slot): freed slots not reusable until out of the window
+
+        self.last_frame = None
+
+        # Window of (frame_idx, tracks, slots, xf, Pf, xp, Pp, F)
+        self.history = deque(maxlen=lag + 1)
+
+    def _grow(self):
+        old = len(self.x)
+        self.x = np.concatenate([self.x, np.zeros((old, STATE_DIM))])
+        self.P = np.concatenate([self.P, np.tile(np.eye(STATE_DIM), (old, 1, 1))])
+        self.free_slots.extend(range(2 * old - 1, old - 1, -1))
+
+    def _allocate(self, track_id):
+        if not self.free_slots:
+            self._grow()
+        slot = self.free_slots.pop()
+        self.slot_of[track_id] = slot
+        return slot
+
+    def _release_stale(self, frame_idx):
+        for tid in [t for t, seen in self.last_seen.items() if frame_idx - seen > self.max_missing]:
+            self.quarantine.append((frame_idx, self.slot_of.pop(tid)))
+            del self.last_seen[tid]
+        while self.quarantine and frame_idx - self.quarantine[0][0] > self.lag:
+            self.free_slots.append(self.quarantine.popleft()[1])
+
+    def reset(self):
+        """
+        Drops all tracks (e.g. after a seek or a scene cut).
+        """
+        self.__init__(self.fps, self.lag, self.accel_std, self.meas_std, self.ref_height,
+                      self.max_missing, len(self.x))
+
+    def update(self, frame_idx, tracks):
+        """
+        Feeds the tracks of one frame (their raw 'court_xy' must be set).
+
+        Returns:
+            (frame_idx, tracks): the frame 'lag' frames ago and its tracks, with
+            'court_xy' replaced by the smoothed position. Before the window fills,
+            the oldest available frame is returned.
+        """
+        # A seek backwards invalidates the whole state
+        if self.last_frame is not None and frame_idx <= self.last_frame:
+            self.reset()
+
+        dt = (frame_idx - self.last_frame) / self.fps if self.last_frame is not None else 1.0 / self.fps
+        self.last_frame = frame_idx
+        self._release_stale(frame_idx)
+
+        # 1. Measurements for this frame
+        measured = [t for t in tracks if getattr(t, 'court_xy', None) is not None]
+        new_slots = []
+        slots = np.empty(len(measured), dtype=np.int64)
+        for i, track in enumerate(measured):
+            slot = self.slot_of.get(track.track_id)
+            if slot is None:
+                slot = self._allocate(track.track_id)
+                new_slots.append(i)
+            slots[i] = slot
+            self.last_seen[track.track_id] = frame_idx
+
+        n = len(self.x)
+        z = np.zeros((n, 2))
+        R = np.ones(n)
+        mask = np.zeros(n, dtype=bool)
+        if len(measured):
+            z[slots] = np.array([t.court_xy for t in measured], dtype=np.float64)
+            heights = [t.to_ltrb()[3] - t.to_ltrb()[1] for t in measured]
+            R[slots] = _measurement_variance(heights, self.meas_std, self.ref_height)
+            mask[slots] = True
+
+        # 2. Batched predict for all slots, fresh initialization for new tracks
+        F = _transition(dt)
+        xp, Pp = _predict(self.x, self.P, F, _process_noise(dt, self.accel_std))
+        for i in new_slots:
+            s = slots[i]
+            xp[s] = [z[s, 0], z[s, 1], 0.0, 0.0]
+            Pp[s] = np.diag([R[s], R[s], 4.0, 4.0])
+
+        # 3. Batched update
+        self.x, self.P = _update(xp, Pp, z, R, mask)
+        self.history.append((frame_idx, measured, slots, self.x, self.P, xp, Pp, F))
+
+        # 4. Fixed-lag RTS over the window (newest -> oldest)
+        xs, Ps = self.x, self.P
+        for k in range(len(self.history) - 2, -1, -1):
+            _, _, _, xf, Pf, _, _, _ = self.history[k]
+            _, _, _, _, _, xp_next, Pp_next, F_next = self.history[k + 1]
+            m = min(len(xf), len(xs))
+            xs, Ps = _rts_step(xf[:m], Pf[:m], xp_next[:m], Pp_next[:m], xs[:m], Ps[:m], F_next)
+
+        out_frame, out_tracks, out_slots, _, _, _, _, _ = self.history[0]
+        for track, slot in zip(out_tracks, out_slots):
+            track.court_xy = (float(xs[slot, 0]), float(xs[slot, 1]))
+        return out_frame, out_tracks
+
+def smooth_track_log(log, fps, accel_std=3.0, meas_std=0.15, ref_height=200.0, max_cells=200_000):
+    """
+    Offline RTS smoothing of full trajectories in a track log.
+
+    Tracks are processed in batches of similar length: each batch is laid out on
+    its own local timeline (T, N), filtered forward and smoothed backward with the
+    batched Kalman/RTS steps. Missing frames inside a track are predicted only.
+    Only the filtered states are stored; the predictions the RTS pass needs are
+    recomputed from them (cheap), which halves the per-batch memory.
+
+    Args:
+        log (np.ndarray): Structured array from load_track_log.
+        fps (float): Source frame rate.
+        max_cells (int): Upper bound on T * N per batch (about 200 bytes per cell).
+
+    Returns:
+        np.ndarray: Copy of the log with court_x/court_y smoothed.
+    """
+    out = log.copy()
+    fps = fps if fps and fps > 0 else 30.0
+    valid = np.isfinite(log["court_x"]) & np.isfinite(log["court_y"])
+    if not valid.any():
+        return out
+
+    rows = np.flatnonzero(valid)
+    order = rows[np.lexsort((log["frame"][rows], log["track_id"][rows]))]
+    ids, first, counts = np.unique(log["track_id"][order], return_index=True, return_counts=True)
+    starts = log["frame"][order[first]]
+    ends = log["frame"][order[first + counts - 1]]
+    lengths = ends - starts + 1
+
+    dt = 1.0 / fps
+    F = _transition(dt)
+    Q = _process_noise(dt, accel_std)
+
+    # Batches of tracks sorted by timeline length
+    by_length = np.argsort(lengths)
+    batch = []
+    batches = []
+    for t in by_length:
+        if batch and lengths[t] * (len(batch) + 1) > max_cells:
+            batches.append(batch)
+            batch = []
+        batch.append(t)
+    if batch:
+        batches.append(batch)
+
+    for batch in batches:
+        batch = np.array(batch)
+        T = int(lengths[batch].max())
+        N = len(batch)
+
+        # Scatter measurements on the (T, N) local timeline
+        z = np.zeros((T, N, 2))
+        R = np.ones((T, N))
+        has = np.zeros((T, N), dtype=bool)
+        row_map = np.full((T, N), -1, dtype=np.int64)
+        for j, t in enumerate(batch):
+            r = order[first[t]:first[t] + counts[t]]
+            local = log["frame"][r] - starts[t]
+            z[local, j, 0] = log["court_x"][r]
+            z[local, j, 1] = log["court_y"][r]
+            R[local, j] = _measurement_variance(log["y2"][r] - log["y1"][r], meas_std, ref_height)
+            has[local, j] = True
+            row_map[local, j] = r
+
+        # Forward pass (first frame of each track is always a measurement)
+        xf = np.zeros((T, N, STATE_DIM))
+        Pf = np.zeros((T, N, STATE_DIM, STATE_DIM))
+        xf[0, :, :2] = z[0]
+        Pf[0] = np.eye(STATE_DIM) * 4.0
+        Pf[0, :, 0, 0] = R[0]
+        Pf[0, :, 1, 1] = R[0]
+        for k in range(1, T):
+            xp, Pp = _predict(xf[k - 1], Pf[k - 1], F, Q)
+            xf[k], Pf[k] = _update(xp, Pp, z[k], R[k], has[k])
+
+        # Backward RTS pass
+        xs, Ps = xf[T - 1], Pf[T - 1]
+        smoothed = np.zeros((T, N, 2))
+        smoothed[T - 1] = xs[:, :2]
+        for k in range(T - 2, -1, -1):
+            xp, Pp = _predict(xf[k], Pf[k], F, Q)
+            xs, Ps = _rts_step(xf[k], Pf[k], xp, Pp, xs, Ps, F)
+            smoothed[k] = xs[:, :2]
+
+        # Gather back to the log rows
+        sel = row_map >= 0
+        out["court_x"][row_map[sel]] = smoothed[sel][:, 0]
+        out["court_y"][row_map[sel]] = smoothed[sel][:, 1]
+
+    return out
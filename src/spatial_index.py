@@ -0,0 +1,232 @@
+import os
+
+import numpy as np
+
+from src.track_log import load_track_log, get_track_log_path
+from src.stitching import load_relabel, apply_relabel, get_stitch_path
+from src.zones import COURT_WIDTH, COURT_LENGTH, FREE_ZONE, NET_Y, ATTACK_LINE
+
+# Named rectangles (x0, y0, x1, y1) in court metres. "far" is the top half of the
+# radar, "near" the bottom half. In sideline (horizontal) videos the screen left
+# half is the far half, so "the left 3 m zone" is 'far_front'.
+ZONES = {
+    "court": (0.0, 0.0, COURT_WIDTH, COURT_LENGTH),
+    "far_half": (0.0, 0.0, COURT_WIDTH, NET_Y),
+    "near_half": (0.0, NET_Y, COURT_WIDTH, COURT_LENGTH),
+    "far_front": (0.0, NET_Y - ATTACK_LINE, COURT_WIDTH, NET_Y),
+    "near_front": (0.0, NET_Y, COURT_WIDTH, NET_Y + ATTACK_LINE),
+    "far_back": (0.0, 0.0, COURT_WIDTH, NET_Y - ATTACK_LINE),
+    "near_back": (0.0, NET_Y + ATTACK_LINE, COURT_WIDTH, COURT_LENGTH),
+}
+
+INDEX_DTYPE = np.dtype([
+    ("frame", np.int64),
+    ("track_id", np.int64),
+    ("court_x", np.float32),
+    ("court_y", np.float32),
+    ("team", np.int64)
+])
+
+def parse_time(value):
+    """
+    Seconds from a float or a "mm:ss" / "hh:mm:ss" string (None stays None).
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    seconds = 0.0
+    for part in str(value).split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def get_index_path(video_path):
+    return video_path + ".tracks.index.npz"
+
+class CourtIndex:
+    """
+    Spatio-temporal index over the court positions of a match.
+
+    Rows are sorted by (time bucket, grid cell) over a uniform grid that covers the
+    radar layout (court + free zone), with a CSR offset table per (bucket, cell).
+    A query only touches the buckets in its time range and the cell rows crossing
+    its rectangle, gathers those contiguous slices and filters them exactly, so a
+    full match is answered in milliseconds without rescanning the track log.
+    """
+    def __init__(self, log, fps, bucket_seconds=1.0, cell_meters=1.0):
+        """
+        Args:
+            log (np.ndarray): Track log (TRACK_LOG_DTYPE or INDEX_DTYPE fields).
+            fps (float): Source frame rate (time queries are in seconds).
+            bucket_seconds (float): Time bucket length.
+            cell_meters (float): Grid cell size.
+        """
+        fps = fps if fps and fps > 0 else 30.0
+        self._init_grid(fps, max(1, int(round(bucket_seconds * fps))), cell_meters)
+
+        rows = np.empty(len(log), dtype=INDEX_DTYPE)
+        for name in INDEX_DTYPE.names:
+            rows[name] = log[name]
+        rows = rows[np.isfinite(rows["court_x"]) & np.isfinite(rows["court_y"])]
+
+        cx, cy = self._cell_xy(rows["court_x"], rows["court_y"])
+        buckets = rows["frame"] // self.bucket_frames
+        keys = buckets * self.cells + cy * self.nx + cx
+        order = np.argsort(keys, kind="stable")
+
+        self.rows = rows[order]
+        self.num_buckets = int(buckets.max()) + 1 if len(rows) else 0
+        self.offsets = np.searchsorted(keys[order], np.arange(self.num_buckets * self.cells + 1))
+
+    def _init_grid(self, fps, bucket_frames, cell):
+        self.fps = fps
+        self.bucket_frames = bucket_frames
+        self.cell = cell
+        self.x0 = self.y0 = -FREE_ZONE
+        self.nx = int(np.ceil((COURT_WIDTH + 2 * FREE_ZONE) / cell))
+        self.ny = int(np.ceil((COURT_LENGTH + 2 * FREE_ZONE) / cell))
+        self.cells = self.nx * self.ny
+
+    def _cell_xy(self, x, y):
+        # Positions outside the layout fall into the border cells (filtered exactly later)
+        cx = np.clip(np.floor((np.asarray(x) - self.x0) / self.cell), 0, self.nx - 1).astype(np.int64)
+        cy = np.clip(np.floor((np.asarray(y) - self.y0) / self.cell), 0, self.ny - 1).astype(np.int64)
+        return cx, cy
+
+    def _frame_range(self, t0, t1):
+        t0, t1 = parse_time(t0), parse_time(t1)
+        # Small tolerance so that t = frame / fps maps back to the same frame
+        f0 = 0 if t0 is None else int(np.ceil(t0 * self.fps - 1e-6))
+        f1 = self.num_buckets * self.bucket_frames - 1 if t1 is None else int(np.floor(t1 * self.fps + 1e-6))
+        return f0, f1
+
+    # --- Queries ---------------------------------------------------------------
+
+    def query_box(self, x0, y0, x1, y1, t0=None, t1=None, team=None):
+        """
+        Rows (INDEX_DTYPE) with x0 <= x <= x1 and y0 <= y <= y1 between t0 and t1
+        (seconds or "mm:ss", inclusive), optionally of one team.
+        """
+        f0, f1 = self._frame_range(t0, t1)
+        return self._query(x0, y0, x1, y1, f0, f1, team)
+
+    def _query(self, x0, y0, x1, y1, f0, f1, team=None):
+        b0 = max(0, f0 // self.bucket_frames)
+        b1 = min(self.num_buckets - 1, f1 // self.bucket_frames)
+        if b1 < b0:
+            return self.rows[:0]
+
+        (cx0, cx1), (cy0, cy1) = self._cell_xy([x0, x1], [y0, y1])
+        # One contiguous slice per (bucket, cell row)
+        bases = (np.arange(b0, b1 + 1)[:, None] * self.cells + np.arange(cy0, cy1 + 1)[None, :] * self.nx).ravel()
+        starts = self.offsets[bases + cx0]
+        lengths = self.offsets[bases + cx1 + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return self.rows[:0]
+        idx = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+
+        rows = self.rows[idx]
+        mask = (rows["frame"] >= f0) & (rows["frame"] <= f1) & \
+               (rows["court_x"] >= x0) & (rows["court_x"] <= x1) & \
+               (rows["court_y"] >= y0) & (rows["court_y"] <= y1)
+        if team is not None:
+            mask &= rows["team"] == team
+        rows = rows[mask]
+        return rows[np.argsort(rows["frame"], kind="stable")]
+
+    def query_zone(self, zone, t0=None, t1=None, team=None):
+        """
+        Rows inside a named zone (see ZONES) or an (x0, y0, x1, y1) rectangle.
+        """
+        x0, y0, x1, y1 = ZONES[zone] if isinstance(zone, str) else zone
+        return self.query_box(x0, y0, x1, y1, t0, t1, team)
+
+    def query_near(self, x, y, radius, t0=None, t1=None, team=None):
+        """
+        Rows within 'radius' metres of (x, y).
+        """
+        rows = self.query_box(x - radius, y - radius, x + radius, y + radius, t0, t1, team)
+        dist2 = (rows["court_x"] - x) ** 2 + (rows["court_y"] - y) ** 2
+        return rows[dist2 <= radius * radius]
+
+    def at_frame(self, frame_idx):
+        """
+        All positions of one frame.
+        """
+        return self._query(-np.inf, -np.inf, np.inf, np.inf, frame_idx, frame_idx)
+
+    def tracks_in(self, zone, t0=None, t1=None, team=None):
+        """
+        {track_id: seconds spent inside the zone} between t0 and t1.
+        """
+        rows = self.query_zone(zone, t0, t1, team)
+        ids, counts = np.unique(rows["track_id"], return_counts=True)
+        return {int(tid): round(float(count) / self.fps, 2) for tid, count in zip(ids, counts)}
+
+    def count_per_frame(self, zone, t0=None, t1=None, team=None):
+        """
+        (frames, counts): number of players inside the zone on every frame that has any.
+        """
+        rows = self.query_zone(zone, t0, t1, team)
+        if len(rows) == 0:
+            return rows["frame"], np.zeros(0, dtype=np.int64)
+        # Rows are sorted by frame: count the runs
+        frames = rows["frame"]
+        starts = np.flatnonzero(np.r_[True, frames[1:] != frames[:-1]])
+        return frames[starts], np.diff(np.r_[starts, len(frames)])
+
+    def frames_with_count(self, zone, min_count, t0=None, t1=None, team=None):
+        """
+        Frames with at least 'min_count' players inside the zone.
+        """
+        frames, counts = self.count_per_frame(zone, t0, t1, team)
+        return frames[counts >= min_count]
+
+    # --- Persistence -----------------------------------------------------------
+
+    def save(self, path):
+        np.savez(path, rows=self.rows, offsets=self.offsets,
+                 params=np.array([self.fps, self.bucket_frames, self.cell]))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        index = cls.__new__(cls)
+        fps, bucket_frames, cell = data["params"]
+        index._init_grid(float(fps), int(bucket_frames), float(cell))
+        index.rows = data["rows"]
+        index.offsets = data["offsets"]
+        index.num_buckets = (len(index.offsets) - 1) // index.cells
+        return index
+
+    @classmethod
+    def for_video(cls, video_path, fps):
+        """
+        Index of a video's saved track log (stitched ids if a relabelling map exists).
+        Cached in <video>.tracks.index.npz and rebuilt when the log or the map is newer.
+        Returns None if there is no track log.
+        """
+        log_path = get_track_log_path(video_path)
+        if not os.path.exists(log_path):
+            return None
+
+        index_path = get_index_path(video_path)
+        sources = [log_path, get_stitch_path(video_path)]
+        newest = max(os.path.getmtime(p) for p in sources if os.path.exists(p))
+        if os.path.exists(index_path) and os.path.getmtime(index_path) >= newest:
+            try:
+                return cls.load(index_path)
+            except Exception as e:
+                print(f"Error loading track index, rebuilding: {e}")
+
+        log = load_track_log(log_path)
+        if log is None:
+            return None
+        relabel = load_relabel(video_path)
+        if relabel:
+            log = apply_relabel(log, relabel)
+        index = cls(log, fps)
+        try:
+            index.save(index_path)
+        except Exception as e:
+            print(f"Error saving track index: {e}")
+        return index
@@ -0,0 +1,32 @@
+import importlib
+import sys
+import time
+
+# Seconds spent importing each heavy dependency (filled by timed_import)
+IMPORT_TIMES = {}
+
+def timed_import(name):
+    """
+    Imports a module on first use and records how long the import took.
+    Heavy dependencies (torch, ultralytics, mediapipe) go through here so they are
+    only loaded when the stage that needs them is actually created.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES[name] = time.perf_counter() - start
+    return module
+
+def record(name, seconds):
+    IMPORT_TIMES[name] = seconds
+
+def report():
+    """
+    Prints the recorded import times, slowest first.
+    """
+    if not IMPORT_TIMES:
+        return
+    print("Import times:")
+    for name, seconds in sorted(IMPORT_TIMES.items(), key=lambda item: -item[1]):
+        print(f"  {name:<24} {1000 * seconds:8.0f} ms")
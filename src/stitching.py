@@ -0,0 +1,187 @@
+import json
+import os
+
+import numpy as np
+
+from src.track_log import NO_TEAM
+
+def get_stitch_path(video_path):
+    return video_path + ".stitch.json"
+
+def summarize_tracks(log, radar_view=None):
+    """
+    Reduces a track log to one row per track id: first/last frame and the
+    court position (metres) at both ends.
+
+    If a calibrated radar_view is given, court positions are recomputed from the
+    box feet with its homography; otherwise the stored court_x/court_y are used.
+
+    Returns a dict of arrays: ids, start, end, start_xy, end_xy, team.
+    """
+    if radar_view is not None and radar_view.M is not None:
+        feet = np.stack([(log["x1"] + log["x2"]) / 2, log["y2"]], axis=1)
+        court = radar_view.image_to_court(feet)
+    else:
+        court = np.stack([log["court_x"], log["court_y"]], axis=1)
+
+    # Sort by (track_id, frame) once; the first/last row of each id block are the ends
+    order = np.lexsort((log["frame"], log["track_id"]))
+    ids_sorted = log["track_id"][order]
+    ids, first_idx, counts = np.unique(ids_sorted, return_index=True, return_counts=True)
+    last_idx = first_idx + counts - 1
+
+    first_rows = order[first_idx]
+    last_rows = order[last_idx]
+
+    # Majority team per track (ignoring unassigned rows)
+    teams = np.full(len(ids), NO_TEAM, dtype=np.int64)
+    team_sorted = log["team"][order]
+    for i, (a, b) in enumerate(zip(first_idx, last_idx + 1)):
+        values = team_sorted[a:b]
+        values = values[values != NO_TEAM]
+        if len(values):
+            uniq, cnt = np.unique(values, return_counts=True)
+            teams[i] = uniq[np.argmax(cnt)]
+
+    return {
+        "ids": ids,
+        "start": log["frame"][first_rows],
+        "end": log["frame"][last_rows],
+        "start_xy": court[first_rows],
+        "end_xy": court[last_rows],
+        "team": teams
+    }
+
+def stitch_tracks(log, fps, radar_view=None, max_speed=8.0, max_gap_seconds=2.0, slack_meters=0.75):
+    """
+    Offline pass that joins fragmented ByteTrack ids (typically broken by occlusions at the net).
+
+    A track 'a' may continue as track 'b' if 'b' starts after 'a' ends, within
+    max_gap_seconds, and the court distance between the end of 'a' and the start of 'b'
+    is reachable at max_speed (plus slack for feet jitter). Teams must agree when both are known.
+    Candidate pairs come from a sorted-by-start window search (sparse, linear in the
+    number of candidates), then the one-to-one assignment is solved with the LAP
+    solver (lapx) per connected component.
+
+    Args:
+        log (np.ndarray): Structured array from load_track_log.
+        fps (float): Source frame rate.
+        radar_view (RadarView): Optional calibrated radar to recompute court metres.
+        max_speed (float): Maximum plausible player speed in m/s.
+        max_gap_seconds (float): Maximum time a player can be lost.
+        slack_meters (float): Distance tolerance added to the speed gate.
+
+    Returns:
+        dict: {old_id: new_id} for every id in the log (new_id is the first id of the chain).
+    """
+    import lap # lapx
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    if log is None or len(log) == 0:
+        return {}
+
+    fps = fps if fps and fps > 0 else 30.0
+    summary = summarize_tracks(log, radar_view)
+    ids = summary["ids"]
+    n = len(ids)
+
+    # 1. Sparse gating: with the tracks sorted by start frame, each ending track is only
+    # compared with the tracks starting within max_gap_seconds after it (searchsorted),
+    # so memory and time grow with the number of candidate pairs, not ids squared
+    by_start = np.argsort(summary["start"], kind="stable")
+    sorted_starts = summary["start"][by_start]
+    lo = np.searchsorted(sorted_starts, summary["end"], side="right")
+    hi = np.searchsorted(sorted_starts, summary["end"] + max_gap_seconds * fps, side="right")
+    counts = hi - lo
+    a = np.repeat(np.arange(n), counts)
+    b = by_start[np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(int(counts.sum()))]
+
+    gap = ((summary["start"][b] - summary["end"][a]) / fps).astype(np.float32)
+    start_xy = summary["start_xy"][b].astype(np.float32)
+    end_xy = summary["end_xy"][a].astype(np.float32)
+    dist = np.hypot(start_xy[:, 0] - end_xy[:, 0], start_xy[:, 1] - end_xy[:, 1])
+    reach = max_speed * gap + slack_meters
+
+    team_a = summary["team"][a]
+    team_b = summary["team"][b]
+    team_ok = (team_a == NO_TEAM) | (team_b == NO_TEAM) | (team_a == team_b)
+
+    feasible = (gap > 0) & (gap <= max_gap_seconds) & np.isfinite(dist) & (dist <= reach) & team_ok
+    a, b = a[feasible], b[feasible]
+
+    relabel = {int(tid): int(tid) for tid in ids}
+    if len(a) == 0:
+        return relabel
+
+    # 2. Cost of each candidate pair: normalized distance plus a small penalty for long gaps
+    cost = dist[feasible] / reach[feasible] + 0.5 * gap[feasible] / max_gap_seconds
+
+    # 3. Assignment per connected component of the candidate graph (nodes: n ending
+    # tracks, then n starting tracks): joins are local in time, so each LAP stays small
+    graph = coo_matrix((np.ones(len(a), dtype=np.int8), (a, n + b)), shape=(2 * n, 2 * n))
+    _, component = connected_components(graph, directed=False)
+    pair_comp = component[a]
+    pair_order = np.argsort(pair_comp, kind="stable")
+    _, comp_start, comp_count = np.unique(pair_comp[pair_order], return_index=True, return_counts=True)
+
+    successor = np.full(n, -1, dtype=np.int64)
+    for ps, pc in zip(comp_start, comp_count):
+        sel = pair_order[ps:ps + pc]
+        if pc == 1:
+            successor[a[sel[0]]] = b[sel[0]]
+            continue
+
+        # Small dense problem over the tracks of this component; unmatched rows and
+        # columns are allowed via cost_limit
+        r_ids, r_local = np.unique(a[sel], return_inverse=True)
+        c_ids, c_local = np.unique(b[sel], return_inverse=True)
+        sub_cost = np.full((len(r_ids), len(c_ids)), 1e6)
+        sub_cost[r_local, c_local] = cost[sel]
+        _, x, _ = lap.lapjv(sub_cost, extend_cost=True, cost_limit=1e5)
+        for r, c in enumerate(x):
+            if c >= 0 and sub_cost[r, c] < 1e6:
+                successor[r_ids[r]] = c_ids[c]
+
+    # 4. Follow chains from their heads (tracks that are nobody's successor)
+    has_pred = np.zeros(n, dtype=bool)
+    has_pred[successor[successor >= 0]] = True
+    for head in np.flatnonzero(~has_pred):
+        root = int(ids[head])
+        cur = head
+        while cur >= 0:
+            relabel[int(ids[cur])] = root
+            cur = successor[cur]
+
+    return relabel
+
+def apply_relabel(log, relabel):
+    """
+    Returns a copy of the track log with stitched ids.
+    """
+    out = log.copy()
+    lookup_keys = np.array(list(relabel.keys()), dtype=np.int64)
+    lookup_vals = np.array(list(relabel.values()), dtype=np.int64)
+    order = np.argsort(lookup_keys)
+    pos = np.searchsorted(lookup_keys[order], out["track_id"])
+    out["track_id"] = lookup_vals[order][pos]
+    return out
+
+def save_relabel(video_path, relabel):
+    path = get_stitch_path(video_path)
+    try:
+        with open(path, 'w') as f:
+            json.dump({str(k): v for k, v in relabel.items()}, f, indent=4)
+        print(f"Track relabelling map saved to {path}")
+    except Exception as e:
+        print(f"Error saving relabelling map: {e}")
+
+def load_relabel(video_path):
+    path = get_stitch_path(video_path)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                return {int(k): int(v) for k, v in json.load(f).items()}
+        except Exception as e:
+            print(f"Error loading relabelling map: {e}")
+    return None
@@ -0,0 +1,192 @@
+import cv2
+import numpy as np
+
+# Team labels
+TEAM_A = 0
+TEAM_B = 1
+TEAM_OTHER = -1 # Referee, libero or anything that fits neither jersey
+
+# Drawing colours per team (BGR). Unassigned tracks keep the default green (video and radar).
+TEAM_COLORS = {
+    TEAM_A: (0, 0, 255),      # Red
+    TEAM_B: (255, 0, 0),      # Blue
+    TEAM_OTHER: (0, 255, 255) # Yellow
+}
+DEFAULT_TRACK_COLOR = (0, 255, 0)
+
+def team_color(track):
+    """
+    Returns the drawing colour for a track based on its team (if assigned).
+    """
+    return TEAM_COLORS.get(getattr(track, 'team', None), DEFAULT_TRACK_COLOR)
+
+class TeamClassifier:
+    """
+    Assigns tracks to teams from the colour statistics of the torso region.
+
+    A colour embedding (HSV histogram of the torso crop) is computed once when a track
+    appears and then refreshed only every 'refresh_interval' frames, or sooner when the
+    assignment is ambiguous. The cached embeddings are clustered into two teams every
+    'recluster_interval' frames; tracks far from both centres are labelled TEAM_OTHER.
+    On the other frames the cost is a dictionary lookup per track.
+    """
+    def __init__(self, refresh_interval=60, low_conf_interval=10, recluster_interval=30,
+                 outlier_factor=2.5, min_margin=0.15, forget_after=300, hist_bins=(8, 4, 4)):
+        """
+        Args:
+            refresh_interval (int): Frames between embedding refreshes of a confident track.
+            low_conf_interval (int): Frames between refreshes of an ambiguous track.
+            recluster_interval (int): Frames between k-means runs over the cached embeddings.
+            outlier_factor (float): Distance (relative to the median in-cluster distance)
+                beyond which a track is labelled TEAM_OTHER.
+            min_margin (float): Relative distance margin between the two centres below
+                which an assignment is considered low confidence.
+            forget_after (int): Frames after which an unseen track is dropped from the cache.
+            hist_bins (tuple): Histogram bins for H, S and V.
+        """
+        self.refresh_interval = refresh_interval
+        self.low_conf_interval = low_conf_interval
+        self.recluster_interval = recluster_interval
+        self.outlier_factor = outlier_factor
+        self.min_margin = min_margin
+        self.forget_after = forget_after
+        self.hist_bins = list(hist_bins)
+
+        # Per-track cache
+        self.embeddings = {}   # track_id -> embedding
+        self.last_refresh = {} # track_id -> frame index of last embedding
+        self.last_seen = {}    # track_id -> frame index
+        self.team_of = {}      # track_id -> TEAM_A / TEAM_B / TEAM_OTHER
+        self.low_conf = set()  # track_ids with an ambiguous assignment
+
+        # Cluster state
+        self.centers = None
+        self.outlier_dist = None
+        self.last_recluster = None
+
+    def _torso_crop(self, frame, ltrb):
+        """
+        Returns the torso region of a box: central half in width, 20%-50% in height
+        (skips the head and the shorts).
+        """
+        x1, y1, x2, y2 = ltrb
+        w, h = x2 - x1, y2 - y1
+        fh, fw = frame.shape[:2]
+        cx1 = int(max(0, x1 + 0.25 * w))
+        cx2 = int(min(fw, x2 - 0.25 * w))
+        cy1 = int(max(0, y1 + 0.2 * h))
+        cy2 = int(min(fh, y1 + 0.5 * h))
+        if cx2 - cx1 < 2 or cy2 - cy1 < 2:
+            return None
+        return frame[cy1:cy2, cx1:cx2]
+
+    def compute_embedding(self, crop):
+        """
+        Normalized HSV histogram of the crop. The square root (Hellinger mapping) makes
+        Euclidean distance meaningful for k-means.
+        """
+        hsv = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1, 2], None, self.hist_bins, [0, 180, 0, 256, 0, 256])
+        hist = hist.flatten()
+        total = hist.sum()
+        if total <= 0:
+            return None
+        return np.sqrt(hist / total).astype(np.float32)
+
+    def _classify(self, embedding):
+        """
+        Returns (team, low_confidence) for an embedding against the current centres.
+        """
+        d = np.linalg.norm(self.centers - embedding, axis=1)
+        best = int(np.argmin(d))
+        if d[best] > self.outlier_dist:
+            return TEAM_OTHER, False
+        margin = abs(d[0] - d[1]) / max(1e-6, d[0] + d[1])
+        return best, margin < self.min_margin
+
+    def _recluster(self):
+        """
+        Runs k-means (k=2) over the cached embeddings and relabels all tracks.
+        Cluster indices are aligned with the previous centres so teams do not swap.
+        """
+        ids = list(self.embeddings.keys())
+        if len(ids) < 2:
+            return
+
+        data = np.stack([self.embeddings[tid] for tid in ids])
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1e-3)
+        # Fixed k-means++ seed: the same embeddings always give the same teams
+        # (reruns, and runs resumed from a checkpoint)
+        cv2.setRNGSeed(len(ids))
+        _, labels, centers = cv2.kmeans(data, 2, None, criteria, 3, cv2.KMEANS_PP_CENTERS)
+        labels = labels.flatten()
+
+        if self.centers is not None:
+            keep = np.linalg.norm(centers - self.centers, axis=1).sum()
+            swap = np.linalg.norm(centers[::-1] - self.centers, axis=1).sum()
+            if swap < keep:
+                centers = centers[::-1].copy()
+                labels = 1 - labels
+
+        # Outlier radius from the spread of each point around its own centre
+        dists = np.linalg.norm(data - centers[labels], axis=1)
+        self.outlier_dist = self.outlier_factor * max(1e-3, float(np.median(dists)))
+        self.centers = centers
+
+        for tid in ids:
+            team, low = self._classify(self.embeddings[tid])
+            self.team_of[tid] = team
+            if low:
+                self.low_conf.add(tid)
+            else:
+                self.low_conf.discard(tid)
+
+    def assign(self, frame, tracks, frame_idx):
+        """
+        Updates the cache for the given tracks and sets 'track.team' on each of them.
+        """
+        for track in tracks:
+            tid = track.track_id
+            self.last_seen[tid] = frame_idx
+
+            last = self.last_refresh.get(tid)
+            interval = self.low_conf_interval if tid in self.low_conf else self.refresh_interval
+            if last is None or frame_idx - last >= interval or frame_idx < last:
+                crop = self._torso_crop(frame, track.to_ltrb())
+                embedding = self.compute_embedding(crop) if crop is not None else None
+                if embedding is not None:
+                    old = self.embeddings.get(tid)
+                    # Blend with the previous embedding to absorb lighting changes
+                    self.embeddings[tid] = embedding if old is None else 0.7 * old + 0.3 * embedding
+                    self.last_refresh[tid] = frame_idx
+
+                    if self.centers is not None:
+                        team, low = self._classify(self.embeddings[tid])
+                        self.team_of[tid] = team
+                        if low:
+                            self.low_conf.add(tid)
+                        else:
+                            self.low_conf.discard(tid)
+
+            track.team = self.team_of.get(tid)
+
+        if self.last_recluster is None or abs(frame_idx - self.last_recluster) >= self.recluster_interval:
+            self._forget(frame_idx)
+            self._recluster()
+            self.last_recluster = frame_idx
+            for track in tracks:
+                track.team = self.team_of.get(track.track_id)
+
+        return tracks
+
+    def _forget(self, frame_idx):
+        """
+        Drops tracks not seen for a while, so the cache is bounded by the active tracks.
+        """
+        stale = [tid for tid, seen in self.last_seen.items() if abs(frame_idx - seen) > self.forget_after]
+        for tid in stale:
+            self.last_seen.pop(tid, None)
+            self.embeddings.pop(tid, None)
+            self.last_refresh.pop(tid, None)
+            self.team_of.pop(tid, None)
+            self.low_conf.discard(tid)
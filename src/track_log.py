@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+
+# Team value written for tracks without an assignment
+NO_TEAM = -2
+
+# One row per track per processed frame
+TRACK_LOG_COLUMNS = ["frame", "track_id", "x1", "y1", "x2", "y2", "conf", "court_x", "court_y", "team"]
+TRACK_LOG_DTYPE = np.dtype([
+    ("frame", np.int64),
+    ("track_id", np.int64),
+    ("x1", np.float32),
+    ("y1", np.float32),
+    ("x2", np.float32),
+    ("y2", np.float32),
+    ("conf", np.float32),
+    ("court_x", np.float32), # Court metres (NaN if not calibrated)
+    ("court_y", np.float32),
+    ("team", np.int64)
+])
+
+def get_track_log_path(video_path):
+    return video_path + ".tracks.csv"
+
+class TrackLogWriter:
+    """
+    Appends per-frame tracks to a CSV file next to the video.
+    The file is plain text so it can be opened in pandas/spreadsheets and
+    truncated at any row boundary (used by resume).
+    Boxes are multiplied by 'box_scale' (frames read from a downscaled proxy are
+    logged in the original resolution).
+    """
+    def __init__(self, path, append=False, box_scale=1.0):
+        self.path = path
+        self.box_scale = box_scale
+        is_new = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a' if append else 'w')
+        if is_new:
+            self.file.write(",".join(TRACK_LOG_COLUMNS) + "\n")
+
+    def write(self, frame_idx, tracks):
+        """
+        Writes the tracks of one frame (a single write call per frame).
+        """
+        rows = []
+        for track in tracks:
+            x1, y1, x2, y2 = (v * self.box_scale for v in track.to_ltrb())
+            conf = track.conf if getattr(track, 'conf', None) is not None else 1.0
+            court_xy = getattr(track, 'court_xy', None)
+            cx, cy = court_xy if court_xy is not None else (float('nan'), float('nan'))
+            team = getattr(track, 'team', None)
+            team = NO_TEAM if team is None else team
+            rows.append(f"{frame_idx},{track.track_id},{x1:.1f},{y1:.1f},{x2:.1f},{y2:.1f},"
+                        f"{conf:.3f},{cx:.3f},{cy:.3f},{team}\n")
+        if rows:
+            self.file.write("".join(rows))
+
+    def tell(self):
+        """
+        Flushes and returns the current byte offset (a row boundary).
+        """
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def load_track_log(path):
+    """
+    Loads a track log into a structured numpy array (fields: TRACK_LOG_COLUMNS).
+    Returns None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        return np.atleast_1d(np.loadtxt(path, delimiter=",", skiprows=1, dtype=TRACK_LOG_DTYPE, ndmin=1))
+    except Exception as e:
+        print(f"Error loading track log: {e}")
+        return None
+
+def save_track_log(path, log):
+    """
+    Writes a structured track log array back to CSV (same format as TrackLogWriter).
+    """
+    try:
+        np.savetxt(path, log, delimiter=",", header=",".join(TRACK_LOG_COLUMNS), comments="",
+                   fmt=["%d", "%d", "%.1f", "%.1f", "%.1f", "%.1f", "%.3f", "%.3f", "%.3f", "%d"])
+        print(f"Track log saved to {path}")
+    except Exception as e:
+        print(f"Error saving track log: {e}")
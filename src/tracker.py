@@ -1,7 +1,9 @@
-from ultralytics import YOLO
+import threading
+import time
 import cv2
 import numpy as np
-import torch
+from src.teams import team_color
+from src.detectors import create_backend
 
 class TrackWrapper:
     """
@@ -12,6 +14,10 @@ class TrackWrapper:
         self.track_id = int(track_id)
         self._ltrb = ltrb # [left, top, right, bottom]
         self.conf = conf
+        self.team = None # Set by TeamClassifier
+        self.court_xy = None # Court metres of the feet, set by RadarView.assign_court_positions
+        self.pose = None # (33, 3) keypoints, set by PoseScheduler
+        self.zone = None # Zone label (src.zones), set by RadarView.assign_court_positions
 
     def is_confirmed(self):
         # Native tracking results are generally considered confirmed if they have an ID
@@ -21,111 +27,191 @@ class TrackWrapper:
         return self._ltrb
 
 class PlayerTracker:
-    def __init__(self, model_path='yolov8n.pt'):
+    def __init__(self, model_path='yolov8n.pt', backend='yolo', **backend_options):
         """
-        Initializes the YOLOv8 detector with native tracking (ByteTrack).
-        
+        Player detection + tracking through a pluggable backend (src.detectors).
+
         Args:
-            model_path (str): Path to the YOLO model.
-        """
-        print(f"Initializing YOLOv8 model: {model_path}...")
-        
-        # Check and print device
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        print(f"Using device: {device.upper()}")
-        
-        self.model = YOLO(model_path)
-        
-        # Volleyball player class ID in COCO dataset is 0 (person)
-        self.target_class_id = 0 
-        
+            model_path (str): Path to the YOLO model (yolo backend).
+            backend (str | DetectorBackend): 'yolo' (YOLOv8 + ByteTrack), 'synthetic'
+                                             (deterministic, no model) or an instance.
+            backend_options: Passed to the backend (see create_backend).
+        """
+        if isinstance(backend, str):
+            backend = create_backend(backend, model_path, **backend_options)
+        self.backend = backend
+
         # Filter function for ROI (Region of Interest)
         self.roi_filter = None
+        self.roi_filter_batch = False
 
-    def set_roi_filter(self, filter_func):
+    def set_roi_filter(self, filter_func, batch=False):
         """
         Sets a callback function to filter detections based on position.
+        With batch=True it receives all feet points (N, 2) at once and returns a bool mask.
         """
         self.roi_filter = filter_func
+        self.roi_filter_batch = batch
+
+    def warmup(self, imgsz=640):
+        """
+        One dummy inference so the first real frame does not pay for lazy initialization.
+        """
+        self.backend.warmup(imgsz)
 
-    def detect_and_track(self, frame, conf_threshold=0.3):
+    def detect_and_track(self, frame, conf_threshold=0.3, imgsz=640, frame_idx=None):
         """
-        Performs detection and tracking using YOLOv8 native ByteTrack.
+        Performs detection and tracking with the backend.
 
         Args:
             frame (np.array): Input video frame.
             conf_threshold (float): Confidence threshold.
+            imgsz (int): Inference size (lowered by the quality scheduler under load).
+            frame_idx (int): Source frame index (used by the synthetic backend).
 
         Returns:
             list: List of TrackWrapper objects.
         """
-        # Run YOLOv8 tracking
-        # persist=True is essential for tracking continuity
-        # tracker="bytetrack.yaml" uses the lightweight ByteTrack algorithm
-        results = self.model.track(
-            frame, 
-            persist=True, 
-            tracker="bytetrack.yaml", 
-            classes=[self.target_class_id], 
-            conf=conf_threshold, 
-            verbose=False,
-            imgsz=640
-        )
-        
+        return self._wrap(*self.backend.track(frame, conf_threshold=conf_threshold, imgsz=imgsz, frame_idx=frame_idx))
+
+    def detect(self, frame, conf_threshold=0.3, imgsz=640, frame_idx=None):
+        """
+        Detection only (no tracker state): (boxes, track_ids or None, confs).
+        Safe to run on any process, in any frame order (see src.parallel).
+        """
+        return self.backend.detect(frame, conf_threshold=conf_threshold, imgsz=imgsz, frame_idx=frame_idx)
+
+    def associate(self, detections, frame=None):
+        """
+        Tracking of detections from detect(): must be called in frame order.
+        Returns TrackWrapper objects (ROI filter applied), as detect_and_track().
+        """
+        return self._wrap(*self.backend.associate(*detections, frame=frame))
+
+    def reset(self):
+        """
+        Forgets the tracked players (see DetectorBackend.reset).
+        """
+        self.backend.reset()
+
+    def get_state(self):
+        """
+        Picklable tracker state (checkpoints).
+        """
+        return self.backend.get_state()
+
+    def set_state(self, state):
+        self.backend.set_state(state)
+
+    def _wrap(self, boxes, track_ids, confs):
         tracks = []
-        
-        if results and len(results) > 0:
-            r = results[0] # We only process the first (and only) frame
-            
-            if r.boxes and r.boxes.id is not None:
-                # Get boxes, confidences, and IDs
-                # boxes.xyxy is [x1, y1, x2, y2]
-                boxes = r.boxes.xyxy.cpu().numpy()
-                track_ids = r.boxes.id.cpu().numpy()
-                confs = r.boxes.conf.cpu().numpy()
-                
-                for i, box in enumerate(boxes):
-                    x1, y1, x2, y2 = box
-                    track_id = track_ids[i]
-                    conf = confs[i]
-                    
-                    # Apply ROI Filter if set
-                    # Calculate feet position (bottom center)
-                    feet_x = (x1 + x2) / 2
-                    feet_y = y2
-                    
-                    if self.roi_filter is not None:
-                        if not self.roi_filter((feet_x, feet_y)):
-                            continue
-                            
-                    # Create wrapper
-                    t = TrackWrapper(track_id, [x1, y1, x2, y2], conf)
-                    tracks.append(t)
-                    
+        if len(boxes) == 0:
+            return tracks
+
+        # Feet positions (bottom center) of all boxes, filtered in one call
+        keep = None
+        if self.roi_filter is not None and self.roi_filter_batch:
+            feet = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1)
+            keep = self.roi_filter(feet)
+
+        for i, box in enumerate(boxes):
+            x1, y1, x2, y2 = box
+
+            # Apply ROI Filter if set
+            if keep is not None:
+                if not keep[i]:
+                    continue
+            elif self.roi_filter is not None:
+                if not self.roi_filter(((x1 + x2) / 2, y2)):
+                    continue
+
+            # Create wrapper
+            tracks.append(TrackWrapper(track_ids[i], [x1, y1, x2, y2], confs[i]))
+
         return tracks
 
     def draw_tracks(self, frame, tracks):
         """
         Draws bounding boxes and IDs on the frame.
         """
-        for track in tracks:
-            if not track.is_confirmed():
-                continue
-            
-            track_id = track.track_id
-            ltrb = track.to_ltrb() # left, top, right, bottom
-            
-            x1, y1, x2, y2 = int(ltrb[0]), int(ltrb[1]), int(ltrb[2]), int(ltrb[3])
-            
-            # Draw Bounding Box
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            
-            # Draw ID background
-            label = f"ID: {track_id}"
-            (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-            cv2.rectangle(frame, (x1, y1 - 20), (x1 + w, y1), (0, 255, 0), -1)
-            
-            # Draw ID text
-            cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
-            
-        return frame
+        return draw_tracks(frame, tracks)
+
+def draw_tracks(frame, tracks):
+    """
+    Draws bounding boxes and IDs on the frame (no tracker needed, e.g. for stored tracks).
+    """
+    for track in tracks:
+        if not track.is_confirmed():
+            continue
+
+        track_id = track.track_id
+        ltrb = track.to_ltrb() # left, top, right, bottom
+
+        x1, y1, x2, y2 = int(ltrb[0]), int(ltrb[1]), int(ltrb[2]), int(ltrb[3])
+
+        # Team colour (green if not yet assigned)
+        color = team_color(track)
+
+        # Draw Bounding Box
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+
+        # Draw ID background
+        label = f"ID: {track_id}"
+        (w, h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
+        cv2.rectangle(frame, (x1, y1 - 20), (x1 + w, y1), color, -1)
+
+        # Draw ID text
+        cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+
+    return frame
+
+class TrackerLoader:
+    """
+    Builds and warms up a PlayerTracker on a background thread.
+
+    Started before the calibration UI so the model load and the first inference
+    overlap with the time the user spends clicking points. The thread never touches
+    the OpenCV GUI (all windows stay on the main thread); a failure is stored and
+    re-raised by result() on the main thread.
+    """
+    def __init__(self, model_path='yolov8n.pt', warmup=True, imgsz=640, backend='yolo', **backend_options):
+        self.model_path = model_path
+        self.backend = backend
+        self.backend_options = backend_options
+        self.warmup = warmup
+        self.imgsz = imgsz
+
+        self.tracker = None
+        self.error = None
+        self.load_time = None
+        self.done = threading.Event()
+
+        self.thread = threading.Thread(target=self._run, name="TrackerLoader", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            tracker = PlayerTracker(self.model_path, self.backend, **self.backend_options)
+            if self.warmup:
+                tracker.warmup(self.imgsz)
+            self.tracker = tracker
+        except Exception as e:
+            self.error = e
+        finally:
+            self.load_time = time.perf_counter() - start
+            self.done.set()
+
+    def ready(self):
+        return self.done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Waits for the loader and returns the tracker.
+        Raises RuntimeError if loading failed or the timeout expired.
+        """
+        if not self.done.wait(timeout):
+            raise RuntimeError(f"Model {self.model_path} still loading after {timeout} s")
+        if self.error is not None:
+            raise RuntimeError(f"Could not load model {self.model_path}: {self.error}") from self.error
+        return self.tracker
@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+def parse_source(spec):
+    """
+    Converts a CLI source into what cv2.VideoCapture expects:
+    a device index ("0" -> 0), or the string itself (file, URL, named pipe).
+    """
+    if isinstance(spec, str) and spec.isdigit():
+        return int(spec)
+    return spec
+
+def is_live_source(spec):
+    """
+    True for devices and stream URLs (sources without a seekable file behind them).
+    """
+    return isinstance(spec, int) or (isinstance(spec, str) and (spec.isdigit() or "://" in spec))
+
+class LatestFrameReader:
+    """
+    Reads a live source on a background thread and always hands out the newest frame.
+
+    If the consumer is slower than the source, frames that were never consumed are
+    overwritten (dropped) instead of queueing up, so latency stays bounded.
+    With realtime=True a local file is replayed at its native frame rate, which makes
+    it a reproducible stand-in for a camera.
+
+    The capture thread only starts with the first read(), so time spent before
+    processing (e.g. interactive calibration on a peek() frame) neither advances a
+    realtime replay nor counts as dropped frames. A stall longer than the read
+    timeout is reported and waited out; only the end of the source or release()
+    ends the stream.
+
+    Exposes the subset of the cv2.VideoCapture interface used by main.py
+    (read, get, set, isOpened, release), plus:
+    - frame_index: sequence number of the last frame returned by read()
+    - frame_time: time.monotonic() at which that frame was captured
+    """
+    def __init__(self, source, realtime=False):
+        self.cap = cv2.VideoCapture(parse_source(source))
+        self.realtime = realtime
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+
+        self.cond = threading.Condition()
+        self.frame = None
+        self.seq = -1
+        self.capture_time = None
+        self.consumed_seq = -1
+        self.eof = False
+        self.stopped = False
+
+        # Statistics
+        self.frames_read = 0
+        self.frames_dropped = 0
+
+        # Last frame handed to the consumer
+        self.frame_index = -1
+        self.frame_time = None
+        self.stalls = 0 # Consecutive read timeouts of the current stall
+
+        self.thread = None
+
+    def start(self):
+        """
+        Starts the capture thread (done by the first read()).
+        """
+        if self.thread is None and self.cap.isOpened():
+            self.thread = threading.Thread(target=self._run, name="LatestFrameReader", daemon=True)
+            self.thread.start()
+
+    def peek(self):
+        """
+        One frame read directly, before the capture thread runs (e.g. for calibration).
+        Not counted in the statistics. Returns (ret, frame).
+        """
+        if self.thread is not None:
+            return self.read()
+        return self.cap.read()
+
+    def _run(self):
+        start = time.monotonic()
+        while not self.stopped:
+            ret, frame = self.cap.read()
+            if not ret:
+                with self.cond:
+                    self.eof = True
+                    self.cond.notify_all()
+                return
+
+            # File replay: release each frame at its presentation time
+            if self.realtime and self.fps > 0:
+                delay = start + (self.frames_read / self.fps) - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            now = time.monotonic()
+            with self.cond:
+                if self.seq > self.consumed_seq:
+                    self.frames_dropped += 1 # Previous frame was never consumed
+                self.frame = frame
+                self.seq += 1
+                self.capture_time = now
+                self.frames_read += 1
+                self.cond.notify_all()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, timeout=5.0):
+        """
+        Blocks until a frame newer than the last one returned is available.
+        Returns (ret, frame) like cv2.VideoCapture.read; ret is False only at the
+        end of the source or after release(). Every 'timeout' seconds without a
+        frame is reported as a stall and the wait goes on.
+        """
+        self.start()
+        with self.cond:
+            while not self.cond.wait_for(lambda: self.seq > self.consumed_seq or self.eof or self.stopped, timeout):
+                self.stalls += 1
+                print(f"Live: no frame for {self.stalls * timeout:.0f} s, still waiting for the source...")
+            if self.seq <= self.consumed_seq:
+                return False, None
+            if self.stalls:
+                print("Live: source resumed.")
+                self.stalls = 0
+            self.consumed_seq = self.seq
+            self.frame_index = self.seq
+            self.frame_time = self.capture_time
+            return True, self.frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.frame_index + 1
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return 0 # Unknown / unbounded for live sources
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        # Live sources cannot seek
+        return False
+
+    def drop_rate(self):
+        return self.frames_dropped / self.frames_read if self.frames_read else 0.0
+
+    def release(self):
+        self.stopped = True
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+        self.cap.release()
+
+class LatencyStats:
+    """
+    Rolling statistics of the capture-to-display latency (seconds).
+    """
+    def __init__(self, window=300):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, latency):
+        self.samples.append(latency)
+        self.count += 1
+        self.max = max(self.max, latency)
+
+    def mean_ms(self):
+        return 1000 * float(np.mean(self.samples)) if self.samples else 0.0
+
+    def p95_ms(self):
+        return 1000 * float(np.percentile(self.samples, 95)) if self.samples else 0.0
+
+    def summary(self):
+        return f"latency mean {self.mean_ms():.0f} ms, p95 {self.p95_ms():.0f} ms, max {1000 * self.max:.0f} ms"
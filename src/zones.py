@@ -0,0 +1,157 @@
+import numpy as np
+
+# Court layout of RadarView in metres: x across the 9 m width, y along the 18 m
+# length, net at y = 9, 3 m lines at y = 6 and y = 12, 2 m free zone around.
+COURT_WIDTH = 9.0
+COURT_LENGTH = 18.0
+FREE_ZONE = 2.0
+NET_Y = 9.0
+ATTACK_LINE = 3.0
+
+# Zone labels of the raster. Positions use the volleyball numbering seen by the
+# team on that side, facing the net: 1 back right, 2 front right, 3 front centre,
+# 4 front left, 5 back left, 6 back centre. "far" is the top half of the radar,
+# "near" the bottom half (in sideline videos: screen left / screen right).
+OUTSIDE = 0       # Beyond the radar (court + free zone)
+FREE = 1          # Free zone
+FAR_SERVICE = 2   # Behind the far end line, within the court width
+NEAR_SERVICE = 3  # Behind the near end line, within the court width
+FAR_BASE = 10     # FAR_BASE + position (11..16)
+NEAR_BASE = 20    # NEAR_BASE + position (21..26)
+NUM_LABELS = 27
+
+SIDES = ("far", "near")
+
+def label_name(label):
+    if label == OUTSIDE:
+        return "outside"
+    if label == FREE:
+        return "free_zone"
+    if label in (FAR_SERVICE, NEAR_SERVICE):
+        return f"{SIDES[label - FAR_SERVICE]}_service"
+    return f"{SIDES[label // 10 - 1]}_{label % 10}"
+
+def label_side(labels):
+    """
+    0 = far, 1 = near, -1 = neither (vectorized).
+    """
+    labels = np.asarray(labels)
+    side = np.full(labels.shape, -1, dtype=np.int64)
+    side[(labels > FAR_BASE) & (labels <= FAR_BASE + 6)] = 0
+    side[(labels > NEAR_BASE) & (labels <= NEAR_BASE + 6)] = 1
+    return side
+
+def label_position(labels):
+    """
+    Position 1..6 inside the court, 0 elsewhere (vectorized).
+    """
+    labels = np.asarray(labels)
+    return np.where(label_side(labels) >= 0, labels % 10, 0)
+
+def is_front_row(labels):
+    return np.isin(label_position(labels), (2, 3, 4))
+
+def classify_court_points(court_points):
+    """
+    Exact zone label of court-metre points (N, 2). Used to build the raster.
+    """
+    pts = np.asarray(court_points, dtype=np.float64).reshape(-1, 2)
+    x, y = pts[:, 0], pts[:, 1]
+    labels = np.full(len(pts), OUTSIDE, dtype=np.uint8)
+
+    in_radar = (x >= -FREE_ZONE) & (x < COURT_WIDTH + FREE_ZONE) & \
+               (y >= -FREE_ZONE) & (y < COURT_LENGTH + FREE_ZONE)
+    labels[in_radar] = FREE
+
+    in_width = (x >= 0) & (x < COURT_WIDTH)
+    labels[in_radar & in_width & (y < 0)] = FAR_SERVICE
+    labels[in_radar & in_width & (y >= COURT_LENGTH)] = NEAR_SERVICE
+
+    in_court = in_width & (y >= 0) & (y < COURT_LENGTH)
+    third = np.clip((x // (COURT_WIDTH / 3)).astype(np.int64), 0, 2) # 0 = radar left
+    near = y >= NET_Y
+    front = np.abs(y - NET_Y) < ATTACK_LINE
+
+    # Facing the net, the near team's right is radar right, the far team's is radar left
+    front_pos = np.array([4, 3, 2])
+    back_pos = np.array([5, 6, 1])
+    own_third = np.where(near, third, 2 - third)
+    position = np.where(front, front_pos[own_third], back_pos[own_third])
+    labels[in_court] = np.where(near, NEAR_BASE, FAR_BASE)[in_court] + position[in_court]
+    return labels
+
+class ZoneMap:
+    """
+    Precomputed zone label raster in radar pixel coordinates.
+
+    Every radar pixel stores the label of its centre (court positions 1-6 per side,
+    service zones, free zone), so classifying any number of points is one
+    vectorized lookup instead of per-point comparisons.
+    """
+    def __init__(self, radar_view):
+        self.radar_view = radar_view
+        h, w = radar_view.img_height, radar_view.img_width
+        ys, xs = np.mgrid[0:h, 0:w]
+        centres = np.stack([xs.ravel() + 0.5, ys.ravel() + 0.5], axis=1)
+        self.raster = classify_court_points(radar_view.radar_to_court(centres)).reshape(h, w)
+
+    def lookup_radar(self, radar_points):
+        """
+        Labels of radar pixel coordinates (N, 2); OUTSIDE beyond the raster.
+        """
+        pts = np.asarray(radar_points, dtype=np.float64).reshape(-1, 2)
+        h, w = self.raster.shape
+        with np.errstate(invalid='ignore'):
+            px = np.floor(pts[:, 0])
+            py = np.floor(pts[:, 1])
+            valid = (px >= 0) & (px < w) & (py >= 0) & (py < h)
+        labels = np.full(len(pts), OUTSIDE, dtype=np.uint8)
+        labels[valid] = self.raster[py[valid].astype(np.int64), px[valid].astype(np.int64)]
+        return labels
+
+    def lookup_court(self, court_points):
+        """
+        Labels of court-metre points (N, 2).
+        """
+        return self.lookup_radar(self.radar_view.court_to_radar(court_points))
+
+    def lookup_image(self, image_points):
+        """
+        Labels of image points (N, 2) through the homography (OUTSIDE if uncalibrated).
+        """
+        if self.radar_view.M is None:
+            return np.full(len(image_points), OUTSIDE, dtype=np.uint8)
+        return self.lookup_radar(self.radar_view.image_to_radar(image_points))
+
+def zone_occupancy(labels):
+    """
+    Number of points per label (array of NUM_LABELS counts).
+    """
+    return np.bincount(np.asarray(labels, dtype=np.int64), minlength=NUM_LABELS)
+
+def rotation_snapshot(track_ids, labels, teams):
+    """
+    Court positions of each team at one instant (e.g. the serve).
+
+    Returns {team: {"side": "far" | "near", "positions": {1..6: [track_id, ...]}}}.
+    A team's side is where most of its in-court players are; players on the other
+    side (or outside the court) are left out.
+    """
+    track_ids = np.asarray(track_ids)
+    labels = np.asarray(labels)
+    teams = np.asarray(teams)
+    sides = label_side(labels)
+    positions = label_position(labels)
+
+    snapshot = {}
+    for team in np.unique(teams):
+        on_court = (teams == team) & (sides >= 0)
+        if not on_court.any():
+            continue
+        side = int(np.bincount(sides[on_court], minlength=2).argmax())
+        members = on_court & (sides == side)
+        per_position = {p: [] for p in range(1, 7)}
+        for tid, pos in zip(track_ids[members], positions[members]):
+            per_position[int(pos)].append(int(tid))
+        snapshot[int(team)] = {"side": SIDES[side], "positions": per_position}
+    return snapshot